@@ -0,0 +1,277 @@
+import json
+import math
+import os
+import sys
+from array import array
+from collections import defaultdict
+
+from plots2 import MapParseError, iter_json_items
+
+# Same threshold as PlotService.verifyPlotsAreAdjacent
+ADJACENCY_THRESHOLD = 25
+
+ADJACENCY_FORMAT_VERSION = 1
+
+def plot_geometry(items):
+    """
+    Extract plot ids and geometry from map items.
+
+    Missing or zero sizes fall back to 1 and a missing y to 0, as in
+    PlotService.
+
+    Args:
+        items (iterable): Item dictionaries (only category == "plot" is used).
+
+    Returns:
+        tuple: (ids, center_x, center_y, reach) where reach is half of
+            width + height, the distance the adjacency rule subtracts.
+    """
+    ids = []
+    center_x = array('d')
+    center_y = array('d')
+    reach = array('d')
+    for item in items:
+        if item.get('category') != 'plot':
+            continue
+        width = item.get('width') or 1
+        height = item.get('height') or 1
+        ids.append(item['id'])
+        center_x.append(item['x'] + width / 2)
+        center_y.append((item.get('y') or 0) + height / 2)
+        reach.append((width + height) / 2)
+    return ids, center_x, center_y, reach
+
+# Neighbouring cells scanned from each cell so every pair of cells is visited once
+_FORWARD_CELLS = ((0, 1), (1, -1), (1, 0), (1, 1))
+
+def _box_pairs(indices, center_x, center_y, reach, threshold):
+    """
+    Find adjacent pairs among plots of any size by box-covering a grid.
+
+    Every plot is inserted into each cell its search box covers, and a pair
+    is only tested in the cell holding the corner of the overlap of the two
+    boxes, so each candidate pair is tested once.
+
+    Args:
+        indices (list): Plot indices to pair up.
+        center_x (list): Plot center x coordinates.
+        center_y (list): Plot center y coordinates.
+        reach (list): Half of width + height for each plot.
+        threshold (float): Maximum edge distance for adjacency.
+
+    Returns:
+        list: Adjacent (i, j) index pairs.
+    """
+    if len(indices) < 2:
+        return []
+    half = {i: reach[i] + threshold / 2 for i in indices}
+    cell = 2 * sorted(half.values())[len(indices) // 2]
+
+    grid = defaultdict(list)
+    for i in indices:
+        for col in range(math.floor((center_x[i] - half[i]) / cell), math.floor((center_x[i] + half[i]) / cell) + 1):
+            for row in range(math.floor((center_y[i] - half[i]) / cell), math.floor((center_y[i] + half[i]) / cell) + 1):
+                grid[(col, row)].append(i)
+
+    pairs = []
+    for (col, row), members in grid.items():
+        for position, i in enumerate(members):
+            for j in members[position + 1:]:
+                # Only the cell containing the overlap corner tests the pair
+                if (math.floor(max(center_x[i] - half[i], center_x[j] - half[j]) / cell) != col
+                        or math.floor(max(center_y[i] - half[i], center_y[j] - half[j]) / cell) != row):
+                    continue
+                if abs(center_x[i] - center_x[j]) + abs(center_y[i] - center_y[j]) - reach[i] - reach[j] <= threshold:
+                    pairs.append((i, j))
+    return pairs
+
+def build_adjacency(center_x, center_y, reach, threshold=ADJACENCY_THRESHOLD):
+    """
+    Build the adjacency lists of all plots using a uniform grid.
+
+    Two plots are adjacent when the Manhattan distance between their
+    centers, minus half of both widths and heights, is at most `threshold`.
+    Plots are bucketed by center into cells as wide as the largest search
+    distance between two typical plots, so adjacent plots are always in the
+    same or a neighbouring cell. The few oversized plots (e.g. a park-sized
+    lot) are handled separately so they do not inflate the cell size.
+
+    Args:
+        center_x (array): Plot center x coordinates.
+        center_y (array): Plot center y coordinates.
+        reach (array): Half of width + height for each plot.
+        threshold (float): Maximum edge distance for adjacency.
+
+    Returns:
+        list: For each plot, the sorted indices of its neighbours.
+    """
+    count = len(center_x)
+    neighbours = [[] for _ in range(count)]
+    if count < 2:
+        return neighbours
+    center_x = list(center_x)
+    center_y = list(center_y)
+    reach = list(reach)
+
+    # Plots up to the 95th percentile reach are "small"; two small plots can
+    # only be adjacent if their centers are within one cell on both axes.
+    small_reach = sorted(reach)[min(count - 1, count * 95 // 100)]
+    cell = 2 * small_reach + threshold or 1
+    small = []
+    large = []
+    grid = defaultdict(list)
+    for index in range(count):
+        if reach[index] <= small_reach:
+            small.append(index)
+            key = (math.floor(center_x[index] / cell), math.floor(center_y[index] / cell))
+            grid[key].append((index, center_x[index], center_y[index], reach[index]))
+        else:
+            large.append(index)
+
+    def link(i, j):
+        neighbours[i].append(j)
+        neighbours[j].append(i)
+
+    for (col, row), members in grid.items():
+        forward = []
+        for d_col, d_row in _FORWARD_CELLS:
+            forward.extend(grid.get((col + d_col, row + d_row), ()))
+        for position, (i, xi, yi, ri) in enumerate(members):
+            limit = threshold + ri
+            for candidates in (members[position + 1:], forward):
+                for j, xj, yj, rj in candidates:
+                    if abs(xi - xj) + abs(yi - yj) - rj <= limit:
+                        link(i, j)
+
+    # Large plots against small ones: scan the cells their search box covers
+    for i in large:
+        xi, yi = center_x[i], center_y[i]
+        limit = threshold + reach[i]
+        span = limit + small_reach
+        for col in range(math.floor((xi - span) / cell), math.floor((xi + span) / cell) + 1):
+            for row in range(math.floor((yi - span) / cell), math.floor((yi + span) / cell) + 1):
+                for j, xj, yj, rj in grid.get((col, row), ()):
+                    if abs(xi - xj) + abs(yi - yj) - rj <= limit:
+                        link(i, j)
+
+    for i, j in _box_pairs(large, center_x, center_y, reach, threshold):
+        link(i, j)
+
+    for adjacent in neighbours:
+        adjacent.sort()
+    return neighbours
+
+def connected_components(neighbours):
+    """
+    Label the connected components of the adjacency graph.
+
+    Args:
+        neighbours (list): Adjacency lists from build_adjacency.
+
+    Returns:
+        array: Component number of each plot, numbered in order of first plot.
+    """
+    component = array('i', [-1]) * len(neighbours)
+    current = 0
+    for start in range(len(neighbours)):
+        if component[start] != -1:
+            continue
+        component[start] = current
+        stack = [start]
+        while stack:
+            node = stack.pop()
+            for neighbour in neighbours[node]:
+                if component[neighbour] == -1:
+                    component[neighbour] = current
+                    stack.append(neighbour)
+        current += 1
+    return component
+
+def build_adjacency_graph(items, threshold=ADJACENCY_THRESHOLD):
+    """
+    Build the adjacency sidecar for the plots of a map.
+
+    The graph is stored in compressed sparse row form: the neighbours of
+    plot `i` are `neighbors[offsets[i]:offsets[i + 1]]`, as indices into
+    `ids`. `components[i]` is the connected component of plot `i`, so two
+    sets of plots can only be joined if they share a component.
+
+    Args:
+        items (iterable): Item dictionaries of the map.
+        threshold (float): Maximum edge distance for adjacency.
+
+    Returns:
+        dict: The sidecar artifact.
+    """
+    ids, center_x, center_y, reach = plot_geometry(items)
+    neighbours = build_adjacency(center_x, center_y, reach, threshold)
+    components = connected_components(neighbours)
+
+    offsets = [0]
+    flat = []
+    for adjacent in neighbours:
+        flat.extend(adjacent)
+        offsets.append(len(flat))
+
+    return {
+        'version': ADJACENCY_FORMAT_VERSION,
+        'threshold': threshold,
+        'ids': ids,
+        'offsets': offsets,
+        'neighbors': flat,
+        'components': components.tolist(),
+        'componentCount': max(components) + 1 if ids else 0
+    }
+
+def save_adjacency_graph(graph, file_path):
+    """
+    Save the adjacency sidecar as compact JSON.
+
+    Args:
+        graph (dict): Output of build_adjacency_graph.
+        file_path (str): Path to save the file.
+
+    Returns:
+        bool: True if successful, False otherwise.
+    """
+    try:
+        with open(file_path, 'w') as file:
+            json.dump(graph, file, separators=(',', ':'))
+        return True
+    except OSError as e:
+        print(f"Error saving file: {e}")
+        return False
+
+def main():
+    print("Plot Adjacency Graph Builder")
+    print("============================")
+
+    if len(sys.argv) < 2:
+        print("Usage: python map_adjacency.py <map.json> [output.json] [threshold]")
+        return
+
+    input_file = sys.argv[1]
+    output_file = sys.argv[2] if len(sys.argv) > 2 else f"{os.path.splitext(input_file)[0]}_adjacency.json"
+    threshold = float(sys.argv[3]) if len(sys.argv) > 3 else ADJACENCY_THRESHOLD
+
+    if not os.path.exists(input_file):
+        print(f"File not found: {input_file}")
+        return
+
+    try:
+        graph = build_adjacency_graph(iter_json_items(input_file), threshold)
+    except MapParseError as e:
+        print(f"Failed to parse {input_file}: {e}")
+        return
+
+    print(f"Plots: {len(graph['ids'])}")
+    print(f"Adjacent pairs: {len(graph['neighbors']) // 2}")
+    print(f"Connected components: {graph['componentCount']}")
+
+    if save_adjacency_graph(graph, output_file):
+        print(f"Saved adjacency graph to {output_file}")
+    else:
+        print("Failed to save the adjacency graph.")
+
+if __name__ == "__main__":
+    main()
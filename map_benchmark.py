@@ -0,0 +1,307 @@
+import argparse
+import gc
+import json
+import os
+import platform
+import random
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import plots
+import plots2
+
+BENCHMARK_FORMAT_VERSION = 1
+
+DEFAULT_SIZES = (1_000, 10_000, 100_000)
+
+ALL_SIZES = (1_000, 10_000, 100_000, 1_000_000)
+
+# Input dialects: plain JSON (C scanner fast path), the leading-comma output
+# of save_file, and hand-edited leading commas with // and /* */ comments and
+# trailing commas inside every item, which only the tolerant parser accepts
+DIALECTS = ('json', 'leading_commas', 'comments')
+
+# Results committed alongside the harness, used by --baseline without a file
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'map_benchmark_baseline.json')
+
+# Allowed slowdown (or memory growth) relative to the baseline, as a fraction
+DEFAULT_THRESHOLD = 0.25
+
+# Timings below this are too noisy to compare against a baseline
+MIN_COMPARABLE_SECONDS = 0.005
+
+# Items per row and rows per block of the synthetic maps
+_ROW_LENGTH = 20
+_BLOCK_SIDE = 5
+
+def synthetic_map(count, seed=0):
+    """
+    Build a map that looks like the production ones.
+
+    Items come in grids of blocks ('block-<i>-<j>-plot-<n>') and straight
+    rows ('street-<k>-lamp-<n>'), with about one item in ten removed so
+    the pattern detector has gaps to fill.
+
+    Args:
+        count (int): Approximate number of items.
+        seed (int): Seed for the removed items and sizes.
+
+    Returns:
+        dict: The map.
+    """
+    rng = random.Random(seed)
+    items = []
+    layer_id = "9b7e32b3-0f4f-43a5-a73d-93d73a5206cf"
+
+    def add(item_id, x, y, item_type, category, width, height, name):
+        if rng.random() < 0.1:
+            return
+        items.append({
+            "id": item_id,
+            "type": item_type,
+            "category": category,
+            "x": x,
+            "y": y,
+            "width": width,
+            "height": height,
+            "rotation": 0,
+            "scale": 1,
+            "color": "#d5e8d4",
+            "layerId": layer_id,
+            "elevationOffset": 0,
+            "properties": {"name": name}
+        })
+
+    # Half the items in block grids, half in street rows
+    per_block = _ROW_LENGTH
+    grid_items = count // 2
+    grids = max(1, grid_items // (per_block * _BLOCK_SIDE * _BLOCK_SIDE))
+    for grid in range(grids):
+        for i in range(_BLOCK_SIDE):
+            for j in range(_BLOCK_SIDE):
+                origin_x = grid * 2000 + i * 300
+                origin_y = j * 300
+                for n in range(1, per_block + 1):
+                    add(f"g{grid}-block-{i}-{j}-plot-{n}", origin_x + (n - 1) % 10 * 12, origin_y + (n - 1) // 10 * 12,
+                        "plot-standard", "plot", 10, 10, f"Plot B{i}{j}-{n}")
+
+    street = 0
+    while len(items) < count * 0.9:
+        y = 5000 + street * 20
+        for n in range(1, _ROW_LENGTH + 1):
+            add(f"street-{street}-lamp-{n}", n * 15, y, "decorative-lamp", "decorative", 0.5, 2, f"Lamp {street}-{n}")
+        street += 1
+    return {"id": "benchmark", "name": f"Synthetic {count}", "width": 1000, "height": 800, "items": items}
+
+def write_map(data, file_path, dialect):
+    """
+    Write a map in one of the input dialects.
+
+    Args:
+        data (dict): The map.
+        file_path (str): Path to save the file.
+        dialect (str): One of DIALECTS.
+    """
+    with open(file_path, 'w', encoding='utf-8') as file:
+        if dialect == 'json':
+            plots2.write_json(data, file)
+        elif dialect == 'leading_commas':
+            plots2.write_leading_comma_items(data['items'], file)
+        elif dialect == 'comments':
+            write = file.write
+            write("// Synthetic benchmark map\n{\n  \"items\": [ /* generated */")
+            separator = "\n    "
+            for index, item in enumerate(data['items']):
+                if index % 100 == 0:
+                    write(f"\n    // items {index}+")
+                write(separator)
+                # A comment and a trailing comma inside the item itself
+                body = json.dumps(item, indent=2)
+                body = f"{{ /* item {index} */{body[1:-2]}, // edited\n}}"
+                write(body.replace("\n", "\n    "))
+                separator = "\n    ,"
+            write("\n  ], // end of items\n}\n")
+        else:
+            raise ValueError(f"Unknown dialect {dialect!r}; expected one of {', '.join(DIALECTS)}")
+
+def measure(function, repeat=1, memory=True):
+    """
+    Time a call and record its peak traced memory.
+
+    The best of `repeat` untraced runs is reported as the time, then one
+    extra run under tracemalloc gives the peak, so tracing does not
+    distort the timing.
+
+    Args:
+        function (callable): The stage to run.
+        repeat (int): Number of timed runs.
+        memory (bool): Whether to do the traced run.
+
+    Returns:
+        tuple: (result of the last run, {'seconds': ..., 'peak_bytes': ...})
+    """
+    best = None
+    result = None
+    for _ in range(repeat):
+        result = None
+        gc.collect()
+        start = time.perf_counter()
+        result = function()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+
+    measurement = {'seconds': best}
+    if memory:
+        result = None
+        gc.collect()
+        tracemalloc.start()
+        try:
+            result = function()
+            measurement['peak_bytes'] = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    return result, measurement
+
+def run_benchmarks(sizes=DEFAULT_SIZES, repeat=1, memory=True, work_dir=None, log=print):
+    """
+    Benchmark every pipeline stage at each map size.
+
+    Args:
+        sizes (iterable): Synthetic map sizes.
+        repeat (int): Timed runs per stage (the best is kept).
+        memory (bool): Whether to record peak memory.
+        work_dir (str): Directory for the generated input files; a
+            temporary one is used and removed by default.
+        log (callable): Progress output, or None.
+
+    Returns:
+        dict: {"version", "environment", "results"} where results maps
+            "<stage>/<size>" keys to measurements.
+    """
+    results = {}
+    own_dir = work_dir is None
+    if own_dir:
+        work_dir = tempfile.mkdtemp(prefix='map-benchmark-')
+    try:
+        for size in sizes:
+            data = synthetic_map(size)
+
+            def record(stage, function):
+                result, measurement = measure(function, repeat, memory)
+                key = f"{stage}/{size}"
+                results[key] = measurement
+                if log:
+                    peak = measurement.get('peak_bytes')
+                    peak = f", peak {peak / 1e6:.1f} MB" if peak is not None else ""
+                    log(f"  {key}: {measurement['seconds']:.4f}s{peak}")
+                return result
+
+            for dialect in DIALECTS:
+                path = os.path.join(work_dir, f"map_{size}_{dialect}.json")
+                write_map(data, path, dialect)
+                stats = {}
+                loaded = record(f"load_json_file[{dialect}]",
+                                lambda path=path, stats=stats: plots2.load_json_file(path, stats=stats))
+                if loaded is None or len(loaded['items']) != len(data['items']) or loaded['items'] != data['items']:
+                    raise RuntimeError(f"Benchmark input {path} did not load back")
+                # Make sure each dialect still takes the parser path it is meant to time
+                tolerant = stats['approaches']['tolerant']
+                if (dialect == 'comments') != (tolerant > 0):
+                    raise RuntimeError(f"Benchmark input {path} used the tolerant parser for {tolerant} items")
+                os.remove(path)
+
+            patterns = record("analyze_patterns", lambda: plots2.analyze_patterns(data['items']))
+            new_items = record("generate_missing_items", lambda: plots2.generate_missing_items(patterns))
+            merged = record("merge_items", lambda: plots2.merge_items(data, new_items))
+            record("format_output_file", lambda: plots2.format_output_file(merged))
+            record("generate_items", lambda: plots.generate_items(
+                "layer", start_value=0, end_value=size * 12, num_items=size, seed=0
+            ))
+    finally:
+        if own_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    return {
+        'version': BENCHMARK_FORMAT_VERSION,
+        'environment': {
+            'python': platform.python_version(),
+            'implementation': platform.python_implementation(),
+            'machine': platform.machine(),
+            'system': platform.system(),
+            'cpus': os.cpu_count()
+        },
+        'results': results
+    }
+
+def compare_results(current, baseline, threshold=DEFAULT_THRESHOLD):
+    """
+    Find stages that got slower or use more memory than the baseline allows.
+
+    Only stages present in both runs are compared, and timings under
+    MIN_COMPARABLE_SECONDS are ignored as noise.
+
+    Args:
+        current (dict): Output of run_benchmarks.
+        baseline (dict): A stored earlier output.
+        threshold (float): Allowed growth as a fraction (0.25 = 25%).
+
+    Returns:
+        list: (key, metric, baseline value, current value, ratio) for each
+            regression.
+    """
+    regressions = []
+    for key, measurement in current['results'].items():
+        previous = baseline.get('results', {}).get(key)
+        if not previous:
+            continue
+        for metric in ('seconds', 'peak_bytes'):
+            old, new = previous.get(metric), measurement.get(metric)
+            if not old or new is None:
+                continue
+            if metric == 'seconds' and max(old, new) < MIN_COMPARABLE_SECONDS:
+                continue
+            ratio = new / old
+            if ratio > 1 + threshold:
+                regressions.append((key, metric, old, new, ratio))
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the map tooling pipeline.")
+    parser.add_argument('--sizes', default=','.join(map(str, DEFAULT_SIZES)),
+                        help=f"comma-separated map sizes, or 'all' for {', '.join(map(str, ALL_SIZES))}")
+    parser.add_argument('--repeat', type=int, default=1, help="timed runs per stage; the best is kept")
+    parser.add_argument('--no-memory', action='store_true', help="skip the tracemalloc runs")
+    parser.add_argument('--output', help="write the results as JSON to this file")
+    parser.add_argument('--baseline', nargs='?', const=DEFAULT_BASELINE,
+                        help="results file to compare against (default: map_benchmark_baseline.json)")
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help="allowed regression as a fraction (default: %(default)s)")
+    args = parser.parse_args()
+
+    sizes = ALL_SIZES if args.sizes == 'all' else tuple(int(size) for size in args.sizes.split(','))
+
+    print("Map Tooling Benchmark")
+    print("=====================")
+    results = run_benchmarks(sizes, args.repeat, not args.no_memory)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as file:
+            json.dump(results, file, indent=2)
+        print(f"Saved results to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as file:
+            baseline = json.load(file)
+        regressions = compare_results(results, baseline, args.threshold)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s) beyond {args.threshold:.0%}:")
+            for key, metric, old, new, ratio in regressions:
+                print(f"  {key} {metric}: {old:.4g} -> {new:.4g} ({ratio:.2f}x)")
+            sys.exit(1)
+        print(f"\nNo regressions beyond {args.threshold:.0%} against {args.baseline}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,502 @@
+import json
+import mmap
+import os
+import random
+import struct
+import sys
+import tempfile
+import time
+import zlib
+from array import array
+
+from map_items import NUMERIC_FIELDS, STRING_FIELDS, FIELD_ALIASES, MapItems
+from plots2 import MapParseError, iter_json_items, open_atomic, write_json
+
+MAGIC = b'MAPB'
+FORMAT_VERSION = 1
+
+# Sections in file order. Numeric columns are float64, string and shape
+# columns uint32 codes, offset tables uint64 and the hash index uint32.
+SECTIONS = (
+    ('meta', 'B'),
+    *((f'num:{name}', 'd') for name in NUMERIC_FIELDS),
+    *((f'str:{name}', 'I') for name in STRING_FIELDS),
+    ('shape_ids', 'I'),
+    ('string_offsets', 'Q'),
+    ('string_data', 'B'),
+    ('id_offsets', 'Q'),
+    ('id_data', 'B'),
+    ('properties_offsets', 'Q'),
+    ('properties_data', 'B'),
+    ('extras_offsets', 'Q'),
+    ('extras_data', 'B'),
+    ('id_index', 'I'),
+)
+
+# magic, version, item count, then (offset, length) per section
+_HEADER = struct.Struct(f'<4sIQ{2 * len(SECTIONS)}Q')
+
+_COMPACT = (',', ':')
+
+def _id_hash(encoded_id):
+    return zlib.crc32(encoded_id)
+
+def _index_size(count):
+    """Number of hash slots: a power of two at least twice the item count."""
+    size = 8
+    while size < 2 * count:
+        size *= 2
+    return size
+
+def _blob(values):
+    """Concatenate byte strings into (offsets array, data bytes)."""
+    offsets = array('Q', [0])
+    position = 0
+    for value in values:
+        position += len(value)
+        offsets.append(position)
+    return offsets, b''.join(values)
+
+def read_map_document(file_path):
+    """
+    Read a map file in any of the repo's JSON shapes.
+
+    Template and plots files ({"items": [...], ...}, including the
+    leading-comma dialect) and map_data exports ([{"map_data": {...}}])
+    are all streamed with iter_json_items.
+
+    Args:
+        file_path (str): Path to the JSON file.
+
+    Returns:
+        tuple: (header dict with an 'items' placeholder, MapItems, wrapper)
+            where wrapper is None or the outer map_data record with its
+            map_data value set to None.
+
+    Raises:
+        MapParseError: If the file is malformed.
+    """
+    header = {}
+    wrapper = {}
+    items = MapItems.from_items(iter_json_items(file_path, header, wrapper=wrapper))
+    return header, items, wrapper or None
+
+def write_binary_map(header, items, file_path, wrapper=None):
+    """
+    Write a map in the binary format, replacing the file atomically.
+
+    Args:
+        header (dict): The non-item top-level keys (an 'items' key marks
+            where the items go when converting back to JSON).
+        items (MapItems or iterable): The items.
+        file_path (str): Path to save the file.
+        wrapper (dict): Outer map_data record for map_data exports, or None.
+    """
+    if not isinstance(items, MapItems):
+        items = MapItems.from_items(items)
+    count = len(items)
+
+    meta = {
+        'header': header,
+        'wrapper': wrapper,
+        'shapes': [list(map(list, shape)) for shape in items.shapes]
+    }
+
+    encoded_ids = [(item_id or '').encode('utf-8') for item_id in items.ids]
+    id_offsets, id_data = _blob(encoded_ids)
+    string_offsets, string_data = _blob([value.encode('utf-8') for value in items.strings.values])
+    properties_offsets, properties_data = _blob([
+        json.dumps(properties, separators=_COMPACT).encode('utf-8') if properties else b''
+        for properties in items.properties
+    ])
+    extras_offsets, extras_data = _blob([
+        json.dumps(items.extras[index], separators=_COMPACT).encode('utf-8') if index in items.extras else b''
+        for index in range(count)
+    ])
+
+    # Open-addressing hash index from id to item index + 1 (0 = empty slot)
+    slots = _index_size(count)
+    mask = slots - 1
+    id_index = array('I', bytes(4 * slots))
+    for index, encoded_id in enumerate(encoded_ids):
+        slot = _id_hash(encoded_id) & mask
+        while id_index[slot]:
+            slot = (slot + 1) & mask
+        id_index[slot] = index + 1
+
+    payloads = {
+        'meta': json.dumps(meta, separators=_COMPACT).encode('utf-8'),
+        'shape_ids': items.shape_ids,
+        'string_offsets': string_offsets,
+        'string_data': string_data,
+        'id_offsets': id_offsets,
+        'id_data': id_data,
+        'properties_offsets': properties_offsets,
+        'properties_data': properties_data,
+        'extras_offsets': extras_offsets,
+        'extras_data': extras_data,
+        'id_index': id_index
+    }
+    for name in NUMERIC_FIELDS:
+        payloads[f'num:{name}'] = items.numeric[name]
+    for name in STRING_FIELDS:
+        payloads[f'str:{name}'] = items.codes[name]
+
+    little_endian = sys.byteorder == 'little'
+    # Binary output goes straight to the buffer under open_atomic's text layer
+    with open_atomic(file_path, compress=False) as text_file:
+        text_file.flush()
+        file = text_file.buffer
+        file.write(bytes(_HEADER.size))
+        position = _HEADER.size
+        table = []
+        for name, typecode in SECTIONS:
+            payload = payloads[name]
+            if isinstance(payload, array) and not little_endian:
+                payload = array(payload.typecode, payload)
+                payload.byteswap()
+            data = payload.tobytes() if isinstance(payload, array) else payload
+            # Align every section to 8 bytes so it can be cast in place
+            padding = -position % 8
+            file.write(bytes(padding))
+            position += padding
+            table.extend((position, len(data)))
+            file.write(data)
+            position += len(data)
+        file.seek(0)
+        file.write(_HEADER.pack(MAGIC, FORMAT_VERSION, count, *table))
+
+class BinaryMap:
+    """
+    Read-only, memory-mapped view of a binary map file.
+
+    Opening only parses the header and the small metadata block; columns are
+    memoryviews into the mapping, so nothing is copied until an item or a
+    value is requested. Lookup by id goes through the stored hash index.
+    """
+
+    def __init__(self, file_path):
+        if sys.byteorder != 'little':
+            raise ValueError("BinaryMap requires a little-endian platform")
+        self._file = open(file_path, 'rb')
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        view = memoryview(self._mmap)
+
+        fields = _HEADER.unpack_from(self._mmap, 0)
+        magic, version, self.count = fields[:3]
+        if magic != MAGIC or version != FORMAT_VERSION:
+            self.close()
+            raise ValueError(f"{file_path} is not a version {FORMAT_VERSION} binary map")
+
+        self._sections = {}
+        for position, (name, typecode) in enumerate(SECTIONS):
+            offset, length = fields[3 + 2 * position], fields[4 + 2 * position]
+            section = view[offset:offset + length]
+            self._sections[name] = section if typecode == 'B' else section.cast(typecode)
+
+        meta = json.loads(bytes(self._sections['meta']))
+        self.header = meta['header']
+        self.wrapper = meta['wrapper']
+        self.shapes = [tuple(map(tuple, shape)) for shape in meta['shapes']]
+
+        string_offsets = self._sections['string_offsets']
+        string_data = self._sections['string_data']
+        self.strings = [
+            bytes(string_data[string_offsets[i]:string_offsets[i + 1]]).decode('utf-8')
+            for i in range(len(string_offsets) - 1)
+        ]
+        self._index_mask = len(self._sections['id_index']) - 1
+        self._plans = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        return self.count
+
+    def __iter__(self):
+        for index in range(self.count):
+            yield self.item(index)
+
+    def close(self):
+        """Release the memory map and the file."""
+        self._sections = {}
+        self._plans = {}
+        try:
+            self._mmap.close()
+        except BufferError:
+            # A caller still holds a column view; the map is freed with it
+            pass
+        self._file.close()
+
+    def _slice(self, name, index):
+        offsets = self._sections[f'{name}_offsets']
+        return self._sections[f'{name}_data'][offsets[index]:offsets[index + 1]]
+
+    def item_id(self, index):
+        """
+        Return the id of an item.
+
+        Args:
+            index (int): Index of the item.
+
+        Returns:
+            str: The id.
+        """
+        return bytes(self._slice('id', index)).decode('utf-8')
+
+    def index_of(self, item_id):
+        """
+        Find an item by id in O(1) through the hash index.
+
+        Args:
+            item_id (str): The id to look up.
+
+        Returns:
+            int: Index of the item, or -1 if absent.
+        """
+        encoded = item_id.encode('utf-8')
+        sections = self._sections
+        id_index = sections['id_index']
+        offsets = sections['id_offsets']
+        data = sections['id_data']
+        mask = self._index_mask
+        slot = _id_hash(encoded) & mask
+        while True:
+            entry = id_index[slot]
+            if not entry:
+                return -1
+            if data[offsets[entry - 1]:offsets[entry]] == encoded:
+                return entry - 1
+            slot = (slot + 1) & mask
+
+    def get(self, item_id, default=None):
+        """
+        Return the item with the given id.
+
+        Args:
+            item_id (str): The id to look up.
+            default: Value returned if there is no such item.
+
+        Returns:
+            dict: The item, or default.
+        """
+        index = self.index_of(item_id)
+        return self.item(index) if index >= 0 else default
+
+    def _shape_plan(self, shape_id):
+        # Resolve each key of a shape to its column once
+        plan = self._plans.get(shape_id)
+        if plan is None:
+            sections = self._sections
+            plan = []
+            for key, kind in self.shapes[shape_id]:
+                field = FIELD_ALIASES.get(key, key)
+                if kind in ('f', 'i'):
+                    plan.append((key, kind, sections[f'num:{field}']))
+                elif kind == 's':
+                    plan.append((key, kind, sections[f'str:{field}']))
+                else:
+                    plan.append((key, kind, None))
+            self._plans[shape_id] = plan
+        return plan
+
+    def item(self, index):
+        """
+        Materialize one item as a dict, exactly as it was written.
+
+        Args:
+            index (int): Index of the item.
+
+        Returns:
+            dict: The item.
+        """
+        result = {}
+        extras = None
+        for key, kind, column in self._shape_plan(self._sections['shape_ids'][index]):
+            if kind == 'f':
+                result[key] = column[index]
+            elif kind == 'i':
+                result[key] = int(column[index])
+            elif kind == 's':
+                result[key] = self.strings[column[index]]
+            elif kind == 'd':
+                result[key] = self.item_id(index)
+            elif kind == 'p':
+                data = self._slice('properties', index)
+                result[key] = json.loads(bytes(data)) if len(data) else {}
+            else:
+                if extras is None:
+                    extras = json.loads(bytes(self._slice('extras', index)))
+                result[key] = extras[key]
+        return result
+
+    def column(self, name):
+        """
+        Return a zero-copy view of a column.
+
+        Numeric fields give a float64 memoryview; string fields give a
+        memoryview of codes into `strings`. Slicing either does not copy.
+        Items lacking the field hold 0.0 or code 0.
+
+        Args:
+            name (str): Field name.
+
+        Returns:
+            memoryview: The column.
+        """
+        if name in NUMERIC_FIELDS:
+            return self._sections[f'num:{name}']
+        if name in STRING_FIELDS:
+            return self._sections[f'str:{name}']
+        raise KeyError(name)
+
+    def to_document(self):
+        """
+        Rebuild the JSON document the map was converted from.
+
+        Returns:
+            dict or list: The document.
+        """
+        data = dict(self.header)
+        data['items'] = list(self)
+        if self.wrapper is None:
+            return data
+        return [dict(self.wrapper, map_data=data)]
+
+def json_to_binary(json_path, binary_path):
+    """
+    Convert a JSON map file to the binary format.
+
+    Args:
+        json_path (str): Source JSON file.
+        binary_path (str): Destination binary file.
+
+    Returns:
+        int: Number of items written.
+    """
+    header, items, wrapper = read_map_document(json_path)
+    write_binary_map(header, items, binary_path, wrapper)
+    return len(items)
+
+def binary_to_json(binary_path, json_path):
+    """
+    Convert a binary map back to JSON in its original shape.
+
+    Template-style maps are streamed out with indent=2; map_data exports
+    are written in the same nested shape they came from.
+
+    Args:
+        binary_path (str): Source binary file.
+        json_path (str): Destination JSON file.
+
+    Returns:
+        int: Number of items written.
+    """
+    with BinaryMap(binary_path) as binary_map:
+        with open_atomic(json_path) as file:
+            if binary_map.wrapper is None:
+                data = dict(binary_map.header)
+                data['items'] = iter(binary_map)
+                write_json(data, file)
+            else:
+                json.dump(binary_map.to_document(), file, indent=2)
+        return len(binary_map)
+
+def benchmark_binary_map(json_path, lookups=1000, repeat=3):
+    """
+    Compare cold open and lookup by id against json.load.
+
+    Args:
+        json_path (str): A standard JSON map file.
+        lookups (int): Number of random id lookups.
+        repeat (int): Runs per measurement; the best is reported.
+
+    Returns:
+        dict: Timings in milliseconds.
+    """
+    header, items, wrapper = read_map_document(json_path)
+    fd, binary_path = tempfile.mkstemp(suffix='.mapb')
+    os.close(fd)
+    try:
+        write_binary_map(header, items, binary_path, wrapper)
+        ids = random.Random(0).choices([i for i in items.ids if i], k=lookups)
+
+        def best(run):
+            timings = []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                run()
+                timings.append((time.perf_counter() - start) * 1000)
+            return min(timings)
+
+        def json_open():
+            with open(json_path, 'r', encoding='utf-8-sig') as file:
+                return json.load(file)
+
+        def json_lookup():
+            document = json_open()
+            data = document[0]['map_data'] if isinstance(document, list) else document
+            by_id = {item['id']: item for item in data['items']}
+            return [by_id[item_id] for item_id in ids]
+
+        def binary_open():
+            BinaryMap(binary_path).close()
+
+        def binary_lookup():
+            with BinaryMap(binary_path) as binary_map:
+                return [binary_map.get(item_id) for item_id in ids]
+
+        return {
+            'items': len(items),
+            'json_bytes': os.path.getsize(json_path),
+            'binary_bytes': os.path.getsize(binary_path),
+            'json_open_ms': best(json_open),
+            'binary_open_ms': best(binary_open),
+            'json_open_and_lookup_ms': best(json_lookup),
+            'binary_open_and_lookup_ms': best(binary_lookup),
+            'lookups': lookups
+        }
+    finally:
+        os.remove(binary_path)
+
+def main():
+    print("Binary Map Converter")
+    print("====================")
+
+    usage = "Usage: python map_binary.py to-binary <map.json> [out.mapb] | to-json <map.mapb> [out.json] | bench <map.json>"
+    if len(sys.argv) < 3:
+        print(usage)
+        return
+
+    command, input_file = sys.argv[1], sys.argv[2]
+    if not os.path.exists(input_file):
+        print(f"File not found: {input_file}")
+        return
+
+    try:
+        if command == 'to-binary':
+            output_file = sys.argv[3] if len(sys.argv) > 3 else f"{os.path.splitext(input_file)[0]}.mapb"
+            count = json_to_binary(input_file, output_file)
+        elif command == 'to-json':
+            # Not '<name>.json', which is usually the map the binary was made from
+            output_file = sys.argv[3] if len(sys.argv) > 3 else f"{os.path.splitext(input_file)[0]}_from_binary.json"
+            count = binary_to_json(input_file, output_file)
+        elif command == 'bench':
+            results = benchmark_binary_map(input_file)
+            print(json.dumps(results, indent=2))
+            return
+        else:
+            print(usage)
+            return
+    except (MapParseError, ValueError, OSError) as e:
+        print(f"Conversion failed: {e}")
+        return
+
+    print(f"Converted {count} items to {output_file}")
+
+if __name__ == "__main__":
+    main()
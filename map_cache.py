@@ -0,0 +1,294 @@
+import contextlib
+import hashlib
+import os
+import pickle
+import tempfile
+from collections import OrderedDict
+
+try:
+    import fcntl
+except ImportError:
+    # No advisory locks (Windows): concurrent updates are merged but may race
+    fcntl = None
+
+from plots2 import PATTERN_CACHE_VERSION, analyze_patterns, load_json_file
+
+# Bump when the cached map layout changes so old entries are ignored
+CACHE_FORMAT_VERSION = 1
+
+DEFAULT_CACHE_DIR = os.environ.get('MAP_CACHE_DIR') or os.path.join(os.path.expanduser('~'), '.cache', 'plots2')
+
+# Total size of the entries kept on disk before the least recently used go
+DEFAULT_CACHE_BYTES = 512 * 1024 * 1024
+
+# Number of row/grid analyses remembered across runs
+GROUP_CACHE_SIZE = 100_000
+
+_ENTRY_SUFFIX = '.pickle'
+
+_GROUPS_KEY = 'groups'
+
+def file_digest(file_path, chunk_size=1 << 20):
+    """
+    Content hash of a file.
+
+    Args:
+        file_path (str): Path to the file.
+        chunk_size (int): Bytes read at a time.
+
+    Returns:
+        str: Hex BLAKE2b digest.
+    """
+    digest = hashlib.blake2b(digest_size=20)
+    with open(file_path, 'rb') as file:
+        while chunk := file.read(chunk_size):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+class MapCache:
+    """
+    On-disk, size-bounded LRU cache of pickled values.
+
+    Each entry is one file named after its key. Reads refresh the file's
+    modification time, and after each write the least recently used
+    entries are deleted until the total size fits in `max_bytes`. Entries
+    are written atomically, and unreadable ones count as misses.
+    """
+
+    def __init__(self, directory=None, max_bytes=DEFAULT_CACHE_BYTES):
+        self.directory = directory or DEFAULT_CACHE_DIR
+        self.max_bytes = max_bytes
+        os.makedirs(self.directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"v{CACHE_FORMAT_VERSION}-{key}{_ENTRY_SUFFIX}")
+
+    def get(self, key, default=None):
+        """
+        Return a cached value.
+
+        Args:
+            key (str): The entry key.
+            default: Value returned on a miss.
+
+        Returns:
+            The cached value, or default.
+        """
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as file:
+                value = pickle.load(file)
+        except FileNotFoundError:
+            return default
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ImportError):
+            # Truncated or stale entry
+            self.discard(key)
+            return default
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return value
+
+    def put(self, key, value):
+        """
+        Store a value, then evict old entries if the cache is too large.
+
+        Args:
+            key (str): The entry key.
+            value: Any picklable value.
+        """
+        descriptor, temp_path = tempfile.mkstemp(prefix='.entry.', suffix='.tmp', dir=self.directory)
+        try:
+            with os.fdopen(descriptor, 'wb') as file:
+                pickle.dump(value, file, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(temp_path, self._path(key))
+        except BaseException:
+            os.remove(temp_path)
+            raise
+        self.evict(keep=key)
+
+    @contextlib.contextmanager
+    def lock(self, key):
+        """
+        Hold an exclusive lock on an entry, for read-modify-write updates
+        shared between processes.
+
+        Args:
+            key (str): The entry key.
+        """
+        if fcntl is None:
+            yield
+            return
+        with open(os.path.join(self.directory, f".v{CACHE_FORMAT_VERSION}-{key}.lock"), 'a') as file:
+            fcntl.flock(file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(file, fcntl.LOCK_UN)
+
+    def discard(self, key):
+        """Remove an entry if it exists."""
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    def entries(self):
+        """
+        List the cache entries.
+
+        Returns:
+            list: (modification time, size, path) tuples, oldest first.
+        """
+        entries = []
+        with os.scandir(self.directory) as scan:
+            for entry in scan:
+                if entry.name.endswith(_ENTRY_SUFFIX):
+                    try:
+                        stat = entry.stat()
+                    except FileNotFoundError:
+                        continue
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+        entries.sort()
+        return entries
+
+    def evict(self, keep=None):
+        """
+        Delete least recently used entries until the cache fits.
+
+        Args:
+            keep (str): Key of an entry that is never evicted (the one just
+                written).
+
+        Returns:
+            int: Number of entries removed.
+        """
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        keep_path = self._path(keep) if keep is not None else None
+        removed = 0
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            if path == keep_path:
+                continue
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+            removed += 1
+        return removed
+
+    def clear(self):
+        """Delete every entry."""
+        for _, _, path in self.entries():
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+class GroupPatternCache:
+    """
+    In-memory LRU of row and grid analyses, persisted as one cache entry.
+
+    Passed to `analyze_patterns` as its group cache: keys are content
+    hashes of a group's items, so a group is only analysed again when one
+    of its items changed. The entry is shared by every input, so saving
+    merges this run's groups into what is stored now, under the entry's
+    lock, rather than overwriting what parallel runs saved meanwhile.
+    """
+
+    def __init__(self, cache, max_groups=GROUP_CACHE_SIZE):
+        self.cache = cache
+        self.max_groups = max_groups
+        self.groups = cache.get(_GROUPS_KEY) or OrderedDict()
+        # Groups analysed in this run, and the stored ones it used
+        self.added = {}
+        self.used = set()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default=None):
+        if key in self.groups:
+            self.groups.move_to_end(key)
+            self.used.add(key)
+            self.hits += 1
+            return self.groups[key]
+        self.misses += 1
+        return default
+
+    def __setitem__(self, key, pattern):
+        self.groups[key] = pattern
+        self.added[key] = pattern
+        while len(self.groups) > self.max_groups:
+            self.groups.popitem(last=False)
+
+    def save(self):
+        """Merge the groups added in this run into the stored ones, if there are any."""
+        if not self.added:
+            return
+        with self.cache.lock(_GROUPS_KEY):
+            groups = self.cache.get(_GROUPS_KEY) or OrderedDict()
+            for key in self.used:
+                if key in groups:
+                    groups.move_to_end(key)
+            groups.update(self.added)
+            for key in self.added:
+                groups.move_to_end(key)
+            while len(groups) > self.max_groups:
+                groups.popitem(last=False)
+            self.cache.put(_GROUPS_KEY, groups)
+        self.groups = groups
+        self.added = {}
+        self.used = set()
+
+def load_map_cached(file_path, cache, stats=None, raise_errors=False):
+    """
+    Load a map like `load_json_file(file_path, columnar=True)`, from the
+    cache when the file content has been parsed before.
+
+    Args:
+        file_path (str): Path to the JSON file.
+        cache (MapCache): The cache.
+        stats (dict): Optional dict that receives parse statistics when the
+            file is parsed (see `iter_json_items`); left empty on a hit.
+        raise_errors (bool): Whether to raise read and parse errors (see
+            `load_json_file`).
+
+    Returns:
+        tuple: (data dict or None, content digest of the file)
+    """
+    digest = file_digest(file_path)
+    key = f"map-{digest}"
+    data = cache.get(key)
+    if data is None:
+        data = load_json_file(file_path, columnar=True, stats=stats, raise_errors=raise_errors)
+        if data is not None:
+            cache.put(key, data)
+    return data, digest
+
+def analyze_patterns_cached(items, digest, cache):
+    """
+    Run `analyze_patterns` with results cached per input and per group.
+
+    An unchanged input returns the stored patterns directly. Otherwise
+    only the rows and grids whose items changed are analysed again.
+
+    Args:
+        items (list or MapItems): The items.
+        digest (str): Content digest of the input the items came from.
+        cache (MapCache): The cache.
+
+    Returns:
+        dict: The detected patterns.
+    """
+    key = f"patterns-{PATTERN_CACHE_VERSION}-{digest}"
+    patterns = cache.get(key)
+    if patterns is None:
+        groups = GroupPatternCache(cache)
+        patterns = analyze_patterns(items, groups)
+        cache.put(key, patterns)
+        groups.save()
+    return patterns
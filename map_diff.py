@@ -0,0 +1,310 @@
+import hashlib
+import itertools
+import json
+import os
+import sys
+
+from map_normalize import write_map_document
+from plots2 import MapParseError, iter_json_items, open_atomic, stream_members
+
+PATCH_FORMAT_VERSION = 1
+
+_DIGEST_SIZE = 16
+
+# Canonical encoding hashed for each item
+_DIGEST_ENCODER = json.JSONEncoder(sort_keys=True, separators=(',', ':'))
+
+def item_digest(item):
+    """
+    Content hash of an item.
+
+    Key order is not significant: items that compare equal as dicts have
+    the same digest.
+
+    Args:
+        item (dict): The item.
+
+    Returns:
+        bytes: A 16-byte BLAKE2b digest.
+    """
+    encoded = _DIGEST_ENCODER.encode(item).encode('utf-8')
+    return hashlib.blake2b(encoded, digest_size=_DIGEST_SIZE).digest()
+
+def _item_id(item, index, source, seen=None):
+    """
+    The id of an item, or a ValueError naming the item's position in `source`.
+
+    Items are matched by id, so when `seen` (a dict of id -> index) is
+    given, an id that already occurred is an error too.
+    """
+    try:
+        item_id = item['id']
+    except (KeyError, TypeError):
+        raise ValueError(f"{source} item {index} has no id") from None
+    if seen is not None:
+        first = seen.setdefault(item_id, index)
+        if first != index:
+            raise ValueError(f"{source} item {index} repeats the id {item_id!r} of item {first}")
+    return item_id
+
+def diff_items(base_items, target_items):
+    """
+    Compute the item-level changes from one item sequence to another.
+
+    Items are matched by `id` and compared by content digest. Only the ids
+    and digests of the base are kept while the target is read, and only
+    changed target items are stored, so both inputs can be streams and
+    memory does not hold either map.
+
+    Args:
+        base_items (iterable): Items of the base map.
+        target_items (iterable): Items of the target map.
+
+    Returns:
+        dict: {'removed': [ids], 'modified': [items], 'added': [items],
+            'addedAfter': [ids]} where addedAfter[i] is the id of the item
+            that precedes added[i] in the target (None at the start).
+
+    Raises:
+        ValueError: If an item has no id, or an id occurs twice in either
+            input; the message gives the item's index.
+    """
+    digests = {}
+    base_ids = {}
+    for index, item in enumerate(base_items):
+        digests[_item_id(item, index, 'Base', base_ids)] = item_digest(item)
+
+    modified = []
+    added = []
+    added_after = []
+    previous = None
+    target_ids = {}
+    for index, item in enumerate(target_items):
+        item_id = _item_id(item, index, 'Target', target_ids)
+        digest = digests.pop(item_id, None)
+        if digest is None:
+            added.append(item)
+            added_after.append(previous)
+        elif digest != item_digest(item):
+            modified.append(item)
+        previous = item_id
+
+    # Whatever is left was not in the target, in base order
+    return {
+        'removed': list(digests),
+        'modified': modified,
+        'added': added,
+        'addedAfter': added_after
+    }
+
+def diff_headers(base_header, target_header):
+    """
+    Compute the changes to the non-item top-level keys of a map.
+
+    Args:
+        base_header (dict): Top-level keys of the base map.
+        target_header (dict): Top-level keys of the target map.
+
+    Returns:
+        tuple: (dict of keys to set, list of keys to remove)
+    """
+    changed = {
+        key: value for key, value in target_header.items()
+        if key != 'items' and (key not in base_header or base_header[key] != value)
+    }
+    removed = [key for key in base_header if key != 'items' and key not in target_header]
+    return changed, removed
+
+def diff_map_files(base_path, target_path):
+    """
+    Diff two map files into a patch.
+
+    Both files are streamed once. Maps of any shape supported by
+    `iter_json_items` can be compared; the top-level keys of the map
+    object are diffed alongside the items.
+
+    Args:
+        base_path (str): The old map.
+        target_path (str): The new map.
+
+    Returns:
+        dict: The patch (see `apply_patch_items` for its fields).
+
+    Raises:
+        MapParseError: If either file is malformed.
+        ValueError: If an item has no id or repeats an id.
+    """
+    base_header = {}
+    target_header = {}
+    patch = diff_items(
+        iter_json_items(base_path, base_header),
+        iter_json_items(target_path, target_header)
+    )
+    header, header_removed = diff_headers(base_header, target_header)
+    return {
+        'version': PATCH_FORMAT_VERSION,
+        'header': header,
+        'headerRemoved': header_removed,
+        **patch
+    }
+
+def apply_patch_items(base_items, patch):
+    """
+    Stream the items of a patched map.
+
+    Removed items are dropped and modified items replaced in place. Added
+    items are emitted right after the item they followed in the target, so
+    applying a patch to its own base reproduces the target's order as long
+    as unchanged items kept their relative order.
+
+    Args:
+        base_items (iterable): Items of the base map.
+        patch (dict): Patch from `diff_items` or `diff_map_files`.
+
+    Yields:
+        dict: The items of the patched map.
+
+    Raises:
+        ValueError: If the patch refers to ids the base does not have, or
+            an item has no id.
+    """
+    removed = set(patch.get('removed', ()))
+    modified = {_item_id(item, index, 'Modified'): item for index, item in enumerate(patch.get('modified', ()))}
+    followers = {}
+    for index, (item, after) in enumerate(zip(patch.get('added', ()), patch.get('addedAfter', ()))):
+        _item_id(item, index, 'Added')
+        followers.setdefault(after, []).append(item)
+
+    def with_followers(item_id):
+        # Added items can themselves be followed by added items
+        stack = list(reversed(followers.pop(item_id, ())))
+        while stack:
+            item = stack.pop()
+            yield item
+            stack.extend(reversed(followers.pop(item['id'], ())))
+
+    yield from with_followers(None)
+    seen_removed = 0
+    seen_modified = 0
+    for index, item in enumerate(base_items):
+        item_id = _item_id(item, index, 'Base')
+        if item_id in removed:
+            seen_removed += 1
+        else:
+            if item_id in modified:
+                item = modified[item_id]
+                seen_modified += 1
+            yield item
+        yield from with_followers(item_id)
+
+    if seen_removed != len(removed) or seen_modified != len(modified) or followers:
+        raise ValueError("Patch does not match the base map (missing ids)")
+
+def apply_patch_file(base_path, patch, output_path):
+    """
+    Apply a patch to a map file, streaming the result to a new file.
+
+    The output keeps the shape of the base (including a map_data wrapper)
+    and is only written if the whole patch applies.
+
+    Args:
+        base_path (str): The map to patch.
+        patch (dict): Patch from `diff_map_files`.
+        output_path (str): Path to save the patched map ('.gz' to compress).
+
+    Returns:
+        int: Number of items written.
+
+    Raises:
+        MapParseError: If the base map is malformed.
+        ValueError: If the patch does not match the base map.
+    """
+    if patch.get('version') != PATCH_FORMAT_VERSION:
+        raise ValueError(f"Unsupported patch version {patch.get('version')!r}")
+
+    header = {}
+    wrapper = {}
+    base_items = iter_json_items(base_path, header, wrapper=wrapper)
+    # Reading the first item fills in the keys that precede the items
+    first = next(base_items, None)
+    if 'items' not in header:
+        raise ValueError(f"{base_path} has no items array")
+    if first is not None:
+        base_items = itertools.chain([first], base_items)
+    count = 0
+
+    def items():
+        nonlocal count
+        for item in apply_patch_items(base_items, patch):
+            count += 1
+            yield item
+
+    header_patch = patch.get('header', {})
+    header_removed = set(patch.get('headerRemoved', ()))
+
+    def members():
+        for key, value in stream_members(header, {'items': items()}):
+            if key not in header_removed:
+                yield key, header_patch[key] if key in header_patch else value
+        for key, value in header_patch.items():
+            if key not in header:
+                yield key, value
+
+    with open_atomic(output_path) as file:
+        write_map_document(members(), file, stream_members(wrapper) if wrapper else None)
+    return count
+
+def save_patch(patch, file_path):
+    """
+    Save a patch as compact JSON.
+
+    Args:
+        patch (dict): The patch.
+        file_path (str): Path to save the file.
+
+    Returns:
+        bool: True if successful, False otherwise.
+    """
+    try:
+        with open_atomic(file_path, compress=False) as file:
+            json.dump(patch, file, separators=(',', ':'))
+        return True
+    except OSError as e:
+        print(f"Error saving file: {e}")
+        return False
+
+def main():
+    print("Map Diff and Patch")
+    print("==================")
+
+    usage = ("Usage: python map_diff.py diff <base.json> <target.json> <patch.json>\n"
+             "       python map_diff.py apply <base.json> <patch.json> <output.json>")
+    if len(sys.argv) < 5 or sys.argv[1] not in ('diff', 'apply'):
+        print(usage)
+        return
+
+    command, first_file, second_file, output_file = sys.argv[1:5]
+    for path in (first_file, second_file):
+        if not os.path.exists(path):
+            print(f"File not found: {path}")
+            return
+
+    try:
+        if command == 'diff':
+            patch = diff_map_files(first_file, second_file)
+            print(f"Removed: {len(patch['removed'])}")
+            print(f"Modified: {len(patch['modified'])}")
+            print(f"Added: {len(patch['added'])}")
+            print(f"Header keys changed: {len(patch['header']) + len(patch['headerRemoved'])}")
+            if save_patch(patch, output_file):
+                print(f"Saved patch to {output_file}")
+        else:
+            with open(second_file, 'r', encoding='utf-8') as file:
+                patch = json.load(file)
+            count = apply_patch_file(first_file, patch, output_file)
+            print(f"Wrote {count} items to {output_file}")
+    except (MapParseError, ValueError, OSError) as e:
+        print(f"{command.capitalize()} failed: {e}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,279 @@
+import hashlib
+import json
+import os
+import re
+import sys
+from array import array
+
+from plots2 import MapParseError, iter_json_items, open_atomic
+
+INSTANCE_FORMAT_VERSION = 1
+
+# Per-instance Float32 values, in buffer order
+INSTANCE_ATTRIBUTES = ('x', 'y', 'elevationOffset', 'width', 'height', 'rotation', 'scale', 'r', 'g', 'b')
+
+INSTANCE_STRIDE = len(INSTANCE_ATTRIBUTES) * 4
+
+# Same fallback as DEFAULT_ITEM_COLOR in lib/config.ts
+DEFAULT_COLOR = '#999999'
+
+# ITEM_TYPE_DEFAULT_COLORS in lib/config.ts: the renderer draws an item
+# without a color in its type's color before falling back to DEFAULT_COLOR
+ITEM_TYPE_DEFAULT_COLORS = {
+    # Plots
+    'plot-residential': '#a0c4ff',
+    'plot-commercial': '#e1d5e7',
+    'plot-special': '#ffd6a5',
+    'plot-standard': '#d5e8d4',
+    'plot-premium': '#b5e7a0',
+
+    # Ground
+    'ground-grass': '#8CC084',
+    'ground-water': '#5da9e9',
+    'ground-sand': '#e6d2b5',
+    'ground-park': '#7FB069',
+    'ground-street': '#AAAAAA',
+
+    # Streets
+    'street-main': '#555555',
+    'street-secondary': '#777777',
+    'street-path': '#999999',
+    'street-parking-lot': '#696969',
+    'street-sidewalk': '#C0C0C0',
+
+    # Buildings
+    'building-community-center': '#4ECDC4',
+    'building-directory': '#FF6B6B',
+    'building-feedback': '#C7B3E5',
+    'building-planet-express': '#FF9F40',
+
+    # Decorative trees
+    'decorative-tree-pine': '#2d6a4f',
+    'decorative-tree-mushroom': '#d8315b',
+    'decorative-tree-crystal': '#9896f1',
+    'decorative-tree-floating': '#70d6ff',
+    'decorative-tree-bonsai': '#48bfe3',
+    'decorative-tree-tree': '#40916c',
+    'decorative-tree-forest': '#52b788',
+
+    # Other decorative items
+    'decorative-mailbox': '#CD5C5C',
+    'decorative-bench': '#A0522D',
+    'decorative-lamp': '#FFD700',
+    'decorative-billboard': '#FF69B4',
+    'decorative-robot-pet': '#32CD32',
+
+    # Landmarks
+    'landmark-central-park': '#8CC084',
+    'landmark-mountain-with-waterfall': '#FFD700',
+    'landmark-mountain': '#8B7355'
+}
+
+# The CSS basic color keywords; other CSS names, which three.js would also
+# accept, are not recognized and get the type or default color instead
+CSS_COLOR_NAMES = {
+    'black': '#000000',
+    'silver': '#c0c0c0',
+    'gray': '#808080',
+    'grey': '#808080',
+    'white': '#ffffff',
+    'maroon': '#800000',
+    'red': '#ff0000',
+    'purple': '#800080',
+    'fuchsia': '#ff00ff',
+    'magenta': '#ff00ff',
+    'green': '#008000',
+    'lime': '#00ff00',
+    'olive': '#808000',
+    'yellow': '#ffff00',
+    'navy': '#000080',
+    'blue': '#0000ff',
+    'teal': '#008080',
+    'aqua': '#00ffff',
+    'cyan': '#00ffff',
+    'orange': '#ffa500'
+}
+
+DEFAULT_CATEGORIES = ('decorative',)
+
+INDEX_NAME = 'instances.json'
+
+_HEX_COLOR = re.compile(r'#([0-9a-fA-F]{3}|[0-9a-fA-F]{6})')
+
+_UNSAFE_NAME = re.compile(r'[^A-Za-z0-9_.-]')
+
+def parse_color(value, default=DEFAULT_COLOR):
+    """
+    Convert a '#rgb' or '#rrggbb' color, or a CSS_COLOR_NAMES name, to sRGB components.
+
+    Args:
+        value (str): The color.
+        default (str): Color used when value is missing or not recognized.
+
+    Returns:
+        tuple: (r, g, b) in the 0-1 range, or None if neither color is
+            recognized.
+    """
+    if isinstance(value, str):
+        value = CSS_COLOR_NAMES.get(value.strip().lower(), value)
+    match = _HEX_COLOR.fullmatch(value) if isinstance(value, str) else None
+    if match is None:
+        if default is None:
+            return None
+        return parse_color(default, None)
+    digits = match.group(1)
+    if len(digits) == 3:
+        digits = ''.join(digit * 2 for digit in digits)
+    return tuple(int(digits[i:i + 2], 16) / 255 for i in (0, 2, 4))
+
+def bake_instances(input_path, output_dir, categories=DEFAULT_CATEGORIES, default_color=DEFAULT_COLOR):
+    """
+    Bake items into per-type instance buffers for instanced meshes.
+
+    Items of the given categories are grouped by type and layer, and each
+    group is written as one little-endian Float32 buffer of
+    INSTANCE_ATTRIBUTES per item, interleaved (stride INSTANCE_STRIDE
+    bytes). Values are the item fields with the renderer's fallbacks
+    applied: width, height and scale of 0 or missing become 1, rotation
+    stays in degrees, and the color is split into sRGB components in
+    0-1 (`color.setRGB(r, g, b, THREE.SRGBColorSpace)`). Items without a
+    color get their type's color from ITEM_TYPE_DEFAULT_COLORS, then
+    default_color, as the renderer does; colors that are neither hex nor
+    a CSS_COLOR_NAMES name get the same fallback and are counted in the
+    index's fallbackColors. The index JSON
+    lists, per group, its type, layerId, count, buffer file, byte length
+    and SHA-256, plus the attribute offsets, so the client can make one
+    InstancedMesh per group from a single fetch. Buffers the new index no
+    longer references are removed.
+
+    Args:
+        input_path (str): Path to the map file.
+        output_dir (str): Directory for the index and buffers.
+        categories (iterable): Item categories to bake.
+        default_color (str): Color for items without a color of their own
+            or of their type.
+
+    Returns:
+        dict: The index.
+
+    Raises:
+        MapParseError: If the map file is malformed.
+    """
+    categories = set(categories)
+    groups = {}
+    fallback_colors = 0
+    for item in iter_json_items(input_path):
+        if item.get('category') not in categories:
+            continue
+        key = (item.get('type'), item.get('layerId', item.get('layer_id')))
+        values = groups.get(key)
+        if values is None:
+            values = groups[key] = array('f')
+        color = parse_color(item.get('color'), None)
+        if color is None:
+            if item.get('color'):
+                # A color the renderer would use but we cannot read
+                fallback_colors += 1
+            color = parse_color(ITEM_TYPE_DEFAULT_COLORS.get(item.get('type')), default_color)
+        values.extend((
+            item.get('x') or 0,
+            item.get('y') or 0,
+            item.get('elevationOffset', item.get('elevation_offset')) or 0,
+            item.get('width') or 1,
+            item.get('height') or 1,
+            item.get('rotation') or 0,
+            item.get('scale') or 1,
+            *color
+        ))
+
+    os.makedirs(output_dir, exist_ok=True)
+    written = set()
+    entries = []
+    for (item_type, layer_id), values in sorted(groups.items(), key=lambda group: tuple(map(str, group[0]))):
+        if sys.byteorder == 'big':
+            values.byteswap()
+        content = values.tobytes()
+        name = _UNSAFE_NAME.sub('_', str(item_type))
+        if name + '.bin' in written:
+            # Same type on another layer
+            name = f"{name}.{len(written)}"
+        name += '.bin'
+        with open_atomic(os.path.join(output_dir, name)) as file:
+            file.buffer.write(content)
+        written.add(name)
+        entries.append({
+            'type': item_type,
+            'layerId': layer_id,
+            'count': len(values) // len(INSTANCE_ATTRIBUTES),
+            'file': name,
+            'byteLength': len(content),
+            'hash': hashlib.sha256(content).hexdigest()
+        })
+
+    index = {
+        'version': INSTANCE_FORMAT_VERSION,
+        'format': 'float32le',
+        'stride': INSTANCE_STRIDE,
+        'attributes': [{'name': attribute, 'offset': position * 4}
+                       for position, attribute in enumerate(INSTANCE_ATTRIBUTES)],
+        'fallbackColors': fallback_colors,
+        'groups': entries
+    }
+    with open_atomic(os.path.join(output_dir, INDEX_NAME)) as file:
+        json.dump(index, file, indent=2)
+
+    for name in os.listdir(output_dir):
+        if name.endswith('.bin') and name not in written:
+            os.remove(os.path.join(output_dir, name))
+    return index
+
+def read_instances(output_dir, entry):
+    """
+    Read one baked group back.
+
+    Args:
+        output_dir (str): Directory holding the index and buffers.
+        entry (dict): A group from the index.
+
+    Returns:
+        list: One dict of INSTANCE_ATTRIBUTES per instance.
+    """
+    values = array('f')
+    with open(os.path.join(output_dir, entry['file']), 'rb') as file:
+        values.frombytes(file.read())
+    if sys.byteorder == 'big':
+        values.byteswap()
+    width = len(INSTANCE_ATTRIBUTES)
+    return [dict(zip(INSTANCE_ATTRIBUTES, values[start:start + width])) for start in range(0, len(values), width)]
+
+def main():
+    print("Instance Buffer Baker")
+    print("=====================")
+
+    if len(sys.argv) < 3:
+        print("Usage: python map_instances.py <map.json> <output_dir> [category,...]")
+        return
+
+    input_file, output_dir = sys.argv[1], sys.argv[2]
+    categories = sys.argv[3].split(',') if len(sys.argv) > 3 else DEFAULT_CATEGORIES
+
+    if not os.path.exists(input_file):
+        print(f"File not found: {input_file}")
+        return
+
+    try:
+        index = bake_instances(input_file, output_dir, categories)
+    except (MapParseError, OSError) as e:
+        print(f"Baking failed: {e}")
+        return
+
+    total = sum(entry['count'] for entry in index['groups'])
+    print(f"Baked {total} instances in {len(index['groups'])} groups to {output_dir}")
+    for entry in index['groups']:
+        print(f"  - {entry['type']}: {entry['count']} ({entry['byteLength']} bytes)")
+    if index['fallbackColors']:
+        print(f"{index['fallbackColors']} item(s) have an unrecognized color and use their type's color "
+              f"or {DEFAULT_COLOR}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+import contextlib
+import cProfile
+import json
+import platform
+import sys
+import time
+
+REPORT_FORMAT_VERSION = 1
+
+class Instrumentation:
+    """
+    Per-stage timing of a tool run, with optional cProfile capture.
+
+    Each `stage` block records wall and CPU time plus any counters the
+    block sets on the record it yields (items, bytes_read, bytes_written,
+    parse approach, ...). Recording costs a few clock reads per stage.
+    Profiling is off unless requested, and then only runs inside stages.
+    The profile is saved in the standard pstats format, which snakeviz,
+    gprof2dot and flameprof read, e.g. `flameprof run.prof > run.svg`.
+    """
+
+    def __init__(self, profile=False):
+        self.stages = []
+        self.profiler = cProfile.Profile() if profile else None
+        self.started = time.perf_counter()
+        self.started_cpu = time.process_time()
+
+    @contextlib.contextmanager
+    def stage(self, name, **counters):
+        """
+        Time a stage of the run.
+
+        Args:
+            name (str): Stage name.
+            **counters: Initial counters for the stage record.
+
+        Yields:
+            dict: The stage record; set counters on it inside the block.
+        """
+        record = {'stage': name, **counters}
+        profiler = self.profiler
+        wall = time.perf_counter()
+        cpu = time.process_time()
+        if profiler is not None:
+            profiler.enable()
+        try:
+            yield record
+        finally:
+            if profiler is not None:
+                profiler.disable()
+            record['wall_seconds'] = time.perf_counter() - wall
+            record['cpu_seconds'] = time.process_time() - cpu
+            self.stages.append(record)
+
+    def report(self):
+        """
+        Build the run report.
+
+        Returns:
+            dict: {"version", "environment", "stages", "total"}.
+        """
+        return {
+            'version': REPORT_FORMAT_VERSION,
+            'environment': {
+                'python': platform.python_version(),
+                'argv': sys.argv
+            },
+            'stages': self.stages,
+            'total': {
+                'wall_seconds': time.perf_counter() - self.started,
+                'cpu_seconds': time.process_time() - self.started_cpu,
+                'stage_wall_seconds': sum(record['wall_seconds'] for record in self.stages)
+            }
+        }
+
+    def save_report(self, file_path):
+        """
+        Save the report as JSON.
+
+        Args:
+            file_path (str): Path to save the file.
+
+        Returns:
+            bool: True if successful, False otherwise.
+        """
+        try:
+            with open(file_path, 'w', encoding='utf-8') as file:
+                json.dump(self.report(), file, indent=2)
+            return True
+        except OSError as e:
+            print(f"Error saving file: {e}")
+            return False
+
+    def save_profile(self, file_path):
+        """
+        Save the cProfile data of the profiled stages.
+
+        Args:
+            file_path (str): Path to save the pstats file.
+
+        Returns:
+            bool: True if successful, False otherwise (or if profiling is off).
+        """
+        if self.profiler is None:
+            return False
+        try:
+            self.profiler.dump_stats(file_path)
+            return True
+        except OSError as e:
+            print(f"Error saving file: {e}")
+            return False
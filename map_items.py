@@ -0,0 +1,314 @@
+from array import array
+
+# Numeric item fields stored as float64 columns
+NUMERIC_FIELDS = ('x', 'y', 'width', 'height', 'rotation', 'scale', 'elevationOffset')
+
+# String item fields stored as codes into the shared string table
+STRING_FIELDS = ('type', 'category', 'color', 'layerId')
+
+# snake_case spellings used by map_data exports, stored in the same columns
+FIELD_ALIASES = {'layer_id': 'layerId', 'elevation_offset': 'elevationOffset'}
+
+# Largest integer a float64 column can hold exactly
+_MAX_EXACT_INT = 2 ** 53
+
+# Field kinds recorded in an item shape
+_FLOAT = 'f'
+_INT = 'i'
+_STRING = 's'
+_ID = 'd'
+_PROPERTIES = 'p'
+_OTHER = 'o'
+
+class StringTable:
+    """
+    Dictionary encoding for repeated strings.
+
+    Each distinct string is stored once and referred to by its integer code.
+    """
+
+    __slots__ = ('values', 'codes')
+
+    def __init__(self):
+        self.values = []
+        self.codes = {}
+
+    def __len__(self):
+        return len(self.values)
+
+    def encode(self, value):
+        """
+        Return the code for a string, adding it to the table if needed.
+
+        Args:
+            value (str): The string to encode.
+
+        Returns:
+            int: The code of the string.
+        """
+        code = self.codes.get(value)
+        if code is None:
+            code = len(self.values)
+            self.values.append(value)
+            self.codes[value] = code
+        return code
+
+    def decode(self, code):
+        """
+        Return the string for a code.
+
+        Args:
+            code (int): The code to decode.
+
+        Returns:
+            str: The string.
+        """
+        return self.values[code]
+
+class MapItems:
+    """
+    Columnar container for map items.
+
+    Numeric fields live in float64 arrays and string fields in arrays of
+    codes into one shared StringTable, so per-item cost is a few machine
+    words instead of a full dict. Each item also records its "shape": the
+    key order and, for each key, how the value was stored. Shapes are
+    deduplicated, so converting back to dicts reproduces the original JSON
+    exactly (key order, int vs float, missing or extra keys) at almost no
+    cost.
+
+    The container behaves like a read-only sequence of item dicts: indexing
+    and iteration materialize dicts on demand.
+    """
+
+    def __init__(self, strings=None):
+        self.strings = strings if strings is not None else StringTable()
+        self.ids = []
+        self.numeric = {name: array('d') for name in NUMERIC_FIELDS}
+        self.codes = {name: array('I') for name in STRING_FIELDS}
+        # None stands for an empty properties dict
+        self.properties = []
+        self.shape_ids = array('I')
+        self.shapes = []
+        self._shape_index = {}
+        # Values that do not fit a column, keyed by item index
+        self.extras = {}
+
+    @classmethod
+    def from_items(cls, items):
+        """
+        Build a container from item dicts.
+
+        Args:
+            items (iterable): Item dictionaries, e.g. from iter_json_items.
+
+        Returns:
+            MapItems: The columnar items.
+        """
+        container = cls()
+        container.extend(items)
+        return container
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __iter__(self):
+        for index in range(len(self.ids)):
+            yield self.item(index)
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self.ids)
+        if not 0 <= index < len(self.ids):
+            raise IndexError("MapItems index out of range")
+        return self.item(index)
+
+    def _shape_id(self, shape):
+        shape_id = self._shape_index.get(shape)
+        if shape_id is None:
+            shape_id = len(self.shapes)
+            self.shapes.append(shape)
+            self._shape_index[shape] = shape_id
+        return shape_id
+
+    def append(self, item):
+        """
+        Add one item dict.
+
+        Args:
+            item (dict): The item to add.
+        """
+        index = len(self.ids)
+        shape = []
+        extras = None
+        numeric = self.numeric
+        codes = self.codes
+
+        columns = {}
+        for key, value in item.items():
+            field = FIELD_ALIASES.get(key, key)
+            if field in columns:
+                # Both spellings of a field: keep the second one out of the columns
+                field = None
+            if field in numeric:
+                value_type = type(value)
+                if value_type is float:
+                    shape.append((key, _FLOAT))
+                    columns[field] = value
+                    continue
+                if value_type is int and -_MAX_EXACT_INT <= value <= _MAX_EXACT_INT:
+                    shape.append((key, _INT))
+                    columns[field] = value
+                    continue
+            elif field in codes:
+                if type(value) is str:
+                    shape.append((key, _STRING))
+                    columns[field] = value
+                    continue
+            elif key == 'id':
+                if type(value) is str:
+                    shape.append((key, _ID))
+                    continue
+            elif key == 'properties':
+                if type(value) is dict:
+                    shape.append((key, _PROPERTIES))
+                    continue
+            if extras is None:
+                extras = {}
+            extras[key] = value
+            shape.append((key, _OTHER))
+
+        present = dict(shape)
+        for name, column in numeric.items():
+            column.append(columns.get(name, 0.0))
+        for name, column in codes.items():
+            column.append(self.strings.encode(columns[name]) if name in columns else 0)
+        self.ids.append(item['id'] if present.get('id') == _ID else None)
+        properties = item['properties'] if present.get('properties') == _PROPERTIES else None
+        self.properties.append(dict(properties) if properties else None)
+        self.shape_ids.append(self._shape_id(tuple(shape)))
+        if extras is not None:
+            self.extras[index] = extras
+
+    def extend(self, items):
+        """
+        Add item dicts.
+
+        Args:
+            items (iterable): The items to add.
+        """
+        for item in items:
+            self.append(item)
+
+    def value(self, index, key, default=None):
+        """
+        Return one field of an item without building the whole dict.
+
+        Args:
+            index (int): Index of the item.
+            key (str): Field name.
+            default: Value returned if the item has no such field.
+
+        Returns:
+            The field value.
+        """
+        for shape_key, kind in self.shapes[self.shape_ids[index]]:
+            if shape_key == key:
+                return self._decode(index, key, kind)
+        return default
+
+    def _decode(self, index, key, kind):
+        if kind == _FLOAT:
+            return self.numeric[FIELD_ALIASES.get(key, key)][index]
+        if kind == _INT:
+            return int(self.numeric[FIELD_ALIASES.get(key, key)][index])
+        if kind == _STRING:
+            return self.strings.values[self.codes[FIELD_ALIASES.get(key, key)][index]]
+        if kind == _ID:
+            return self.ids[index]
+        if kind == _PROPERTIES:
+            properties = self.properties[index]
+            return dict(properties) if properties else {}
+        return self.extras[index][key]
+
+    def item(self, index):
+        """
+        Materialize one item as a dict, exactly as it was added.
+
+        Args:
+            index (int): Index of the item.
+
+        Returns:
+            dict: The item.
+        """
+        decode = self._decode
+        return {key: decode(index, key, kind) for key, kind in self.shapes[self.shape_ids[index]]}
+
+    def to_items(self):
+        """
+        Convert back to a list of item dicts.
+
+        Returns:
+            list: The items.
+        """
+        return list(self)
+
+    def column(self, name):
+        """
+        Return a whole column.
+
+        Numeric fields come back as the float64 array itself and string
+        fields as a list of decoded strings. Items that lack the field hold
+        0.0 or the first string in the table.
+
+        Args:
+            name (str): Field name.
+
+        Returns:
+            array or list: The column values.
+        """
+        if name in self.numeric:
+            return self.numeric[name]
+        if name in self.codes:
+            values = self.strings.values
+            return [values[code] for code in self.codes[name]]
+        if name == 'id':
+            return self.ids
+        raise KeyError(name)
+
+    def take(self, indices):
+        """
+        Return a new container with the given items, in the given order.
+
+        The string table is shared with this container.
+
+        Args:
+            indices (iterable): Item indices to copy.
+
+        Returns:
+            MapItems: The selected items.
+        """
+        indices = list(indices)
+        result = MapItems(self.strings)
+        result.ids = [self.ids[i] for i in indices]
+        result.numeric = {name: array('d', [column[i] for i in indices]) for name, column in self.numeric.items()}
+        result.codes = {name: array('I', [column[i] for i in indices]) for name, column in self.codes.items()}
+        result.properties = [self.properties[i] for i in indices]
+        result.shapes = list(self.shapes)
+        result._shape_index = dict(self._shape_index)
+        result.shape_ids = array('I', [self.shape_ids[i] for i in indices])
+        result.extras = {
+            new_index: dict(self.extras[old_index])
+            for new_index, old_index in enumerate(indices)
+            if old_index in self.extras
+        }
+        return result
+
+    def copy(self):
+        """
+        Return an independent copy of the container.
+
+        Returns:
+            MapItems: The copy.
+        """
+        return self.take(range(len(self.ids)))
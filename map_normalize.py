@@ -0,0 +1,214 @@
+import json
+import os
+import re
+import sys
+
+from plots2 import MapParseError, iter_json_items, open_atomic, stream_members, write_json
+
+# Output shapes: the database export ([{"map_data": {...}}], snake_case),
+# map templates ({id, name, ..., items, layers, environment}, camelCase) and
+# item-only files like plots_complete.json ({"items": [...]}, camelCase)
+MAP_FORMATS = ('map_data', 'template', 'plots')
+
+_UPPER_RE = re.compile(r'([A-Z])')
+_SNAKE_RE = re.compile(r'_([a-z])')
+
+def to_snake_case_key(key):
+    """
+    Convert a camelCase key to snake_case, as toSnakeCase in
+    lib/utils/case-converters.ts does.
+
+    Args:
+        key (str): The key.
+
+    Returns:
+        str: The converted key.
+    """
+    return _UPPER_RE.sub(r'_\1', key).lower()
+
+def to_camel_case_key(key):
+    """
+    Convert a snake_case key to camelCase, as toCamelCase in
+    lib/utils/case-converters.ts does.
+
+    Args:
+        key (str): The key.
+
+    Returns:
+        str: The converted key.
+    """
+    return _SNAKE_RE.sub(lambda match: match.group(1).upper(), key)
+
+class KeyConverter:
+    """
+    Recursively convert the keys of JSON values.
+
+    Maps repeat the same few dozen keys on every item, so each distinct key
+    is converted once and then looked up.
+    """
+
+    __slots__ = ('convert_key', 'names')
+
+    def __init__(self, convert_key):
+        self.convert_key = convert_key
+        self.names = {}
+
+    def key(self, key):
+        """Return the converted form of one key."""
+        name = self.names.get(key)
+        if name is None:
+            name = self.names[key] = self.convert_key(key)
+        return name
+
+    def __call__(self, value):
+        value_type = type(value)
+        if value_type is dict:
+            names = self.names
+            result = {}
+            for key, member in value.items():
+                name = names.get(key)
+                if name is None:
+                    name = self.key(key)
+                member_type = type(member)
+                result[name] = self(member) if member_type is dict or member_type is list else member
+            return result
+        if value_type is list:
+            return [self(member) for member in value]
+        return value
+
+def _converted_members(data, convert, values):
+    for key, value in stream_members(data, values):
+        if key in values:
+            yield convert.key(key), value
+        else:
+            yield convert.key(key), convert(value)
+
+def write_map_document(map_object, file, wrapper=None):
+    """
+    Write a map as JSON with indent=2, optionally inside a map_data export.
+
+    Args:
+        map_object (dict): The map, or an iterable of its (key, value) pairs
+            (see `write_json`).
+        file: Writable text file handle.
+        wrapper (dict): For map_data output, the outer record (or its pairs);
+            its 'map_data' value is replaced by the map. None writes the
+            map on its own.
+    """
+    if wrapper is None:
+        write_json(map_object, file)
+        return
+    write = file.write
+    write("[\n  {")
+    separator = "\n    "
+    for key, value in (wrapper.items() if isinstance(wrapper, dict) else wrapper):
+        write(separator)
+        write(json.dumps(key))
+        write(": ")
+        if key == 'map_data':
+            write_json(map_object, file, "    ")
+        else:
+            write(json.dumps(value, indent=2).replace("\n", "\n    "))
+        separator = ",\n    "
+    write("\n  }\n]")
+
+def normalize_map(input_path, output_path, target=None):
+    """
+    Convert a map file between the map_data, template and plots shapes.
+
+    The input is streamed with `iter_json_items` and the output written one
+    item at a time, so memory does not grow with the number of items. Keys
+    are converted recursively with the same rules as case-converters.ts:
+    snake_case for map_data, camelCase otherwise. Converting to 'plots'
+    keeps only the items; converting away from 'map_data' drops the outer
+    record and keeps its map_data object.
+
+    Args:
+        input_path (str): Map file in any of the three shapes (optionally
+            gzipped or in the leading-comma dialect).
+        output_path (str): Path to save the converted file ('.gz' to compress).
+        target (str): One of MAP_FORMATS. Defaults to 'template' for
+            map_data input and 'map_data' otherwise.
+
+    Returns:
+        tuple: (source format, target format, number of items written)
+
+    Raises:
+        MapParseError: If the input is malformed.
+        ValueError: If the target format is unknown.
+    """
+    if target is not None and target not in MAP_FORMATS:
+        raise ValueError(f"Unknown map format {target!r}; expected one of {', '.join(MAP_FORMATS)}")
+
+    header = {}
+    wrapper = {}
+    stream = iter_json_items(input_path, header, wrapper=wrapper)
+    # Reading the first item fills in every key that precedes the items
+    first = next(stream, None)
+
+    if wrapper:
+        source = 'map_data'
+    elif any(key != 'items' for key in header):
+        source = 'template'
+    else:
+        source = 'plots'
+    if target is None:
+        target = 'template' if source == 'map_data' else 'map_data'
+
+    convert = KeyConverter(to_snake_case_key if target == 'map_data' else to_camel_case_key)
+    count = 0
+
+    def items():
+        nonlocal count
+        item = first
+        if item is None:
+            return
+        yield convert(item)
+        count = 1
+        for item in stream:
+            yield convert(item)
+            count += 1
+
+    if target == 'plots':
+        map_object = {'items': items()}
+    else:
+        header.setdefault('items', [])
+        map_object = _converted_members(header, convert, {'items': items()})
+
+    with open_atomic(output_path) as file:
+        if target == 'map_data':
+            wrapper.setdefault('map_data', None)
+            write_map_document(map_object, file, _converted_members(wrapper, convert, {}))
+        else:
+            write_map_document(map_object, file)
+        # Drain the input so errors after the items array are still reported
+        for _ in stream:
+            pass
+
+    return source, target, count
+
+def main():
+    print("Map Format Normalizer")
+    print("=====================")
+
+    if len(sys.argv) < 3:
+        print(f"Usage: python map_normalize.py <input.json> <output.json> [{'|'.join(MAP_FORMATS)}]")
+        return
+
+    input_file, output_file = sys.argv[1], sys.argv[2]
+    target = sys.argv[3] if len(sys.argv) > 3 else None
+
+    if not os.path.exists(input_file):
+        print(f"File not found: {input_file}")
+        return
+
+    try:
+        source, target, count = normalize_map(input_file, output_file, target)
+    except (MapParseError, ValueError, OSError) as e:
+        print(f"Conversion failed: {e}")
+        return
+
+    print(f"Converted {count} items from {source} to {target} format: {output_file}")
+
+if __name__ == "__main__":
+    main()
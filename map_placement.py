@@ -0,0 +1,380 @@
+import argparse
+import math
+import os
+import sys
+from collections import Counter, defaultdict
+
+import plots
+from map_overlaps import OVERLAP_TOLERANCE, item_footprints
+from plots2 import MapParseError, iter_json_items, save_file
+
+# Linear street types that get plots along their sides
+DEFAULT_STREET_TYPES = ('street-main', 'street-secondary', 'street-diagonal')
+
+# Ground that plots may be built on; any other ground (parks, water, ...) blocks
+OPEN_GROUND_TYPES = frozenset({'ground-grass', 'ground-dirt', 'ground-sand', 'ground-snow'})
+
+# Defaults follow map_template_v3.json: 10x10 plots, 3 units apart and 3 units from the street
+DEFAULT_FRONTAGE = 10
+DEFAULT_DEPTH = 10
+DEFAULT_GAP = 3
+DEFAULT_SETBACK = 3
+
+DEFAULT_PLOT_TYPE = 'plot-standard'
+DEFAULT_PLOT_COLOR = '#d5e8d4'
+
+# Obstacles covering more grid cells than this are checked against every frontage
+_MAX_INDEXED_CELLS = 64
+
+def street_segments(items, street_types=DEFAULT_STREET_TYPES):
+    """
+    Describe each street item as a centre line with a width.
+
+    The street's long side gives its direction, which is made to point
+    towards +x (or +y for vertical streets) so sides are named the same
+    way on every street.
+
+    Args:
+        items (iterable): Item dictionaries.
+        street_types (iterable): Street types to include, or None for all
+            items in the 'street' category.
+
+    Returns:
+        list: Dicts with 'item', 'cx', 'cy', 'ux', 'uy' (unit direction),
+            'half_length' and 'half_width', longest street first.
+    """
+    types = set(street_types) if street_types is not None else None
+    streets = [item for item in items
+               if item.get('category') == 'street' and (types is None or item.get('type') in types)]
+    footprints = item_footprints(streets, ignore_categories=())
+    segments = []
+    for index, street in enumerate(streets):
+        angle, hw, hh = footprints['angle'][index], footprints['hw'][index], footprints['hh'][index]
+        if hw >= hh:
+            ux, uy, half_length, half_width = math.cos(angle), math.sin(angle), hw, hh
+        else:
+            ux, uy, half_length, half_width = -math.sin(angle), math.cos(angle), hh, hw
+        if ux < -1e-9 or (abs(ux) <= 1e-9 and uy < 0):
+            ux, uy = -ux, -uy
+        segments.append({
+            'item': street,
+            'cx': footprints['cx'][index],
+            'cy': footprints['cy'][index],
+            'ux': ux,
+            'uy': uy,
+            'half_length': half_length,
+            'half_width': half_width
+        })
+    segments.sort(key=lambda segment: (-segment['half_length'], str(segment['item'].get('id'))))
+    return segments
+
+def _side_name(nx, ny):
+    """Compass letter for the side a normal points to (y grows southwards)."""
+    if abs(ny) >= abs(nx):
+        return 'n' if ny < 0 else 's'
+    return 'w' if nx < 0 else 'e'
+
+def _facing_rotation(nx, ny):
+    """
+    Rotation in degrees that turns a plot's front (its local +y edge)
+    towards the street, for a plot on the side the normal points to.
+    """
+    degrees = round(math.degrees(math.atan2(nx, -ny)) % 360, 2) % 360
+    return int(degrees) if degrees == int(degrees) else degrees
+
+def free_intervals(blocked, start, end):
+    """
+    Subtract blocked intervals from [start, end].
+
+    Args:
+        blocked (list): (low, high) pairs, in any order, possibly overlapping.
+        start (float): Start of the range.
+        end (float): End of the range.
+
+    Returns:
+        list: Disjoint (low, high) pairs in increasing order.
+    """
+    free = []
+    position = start
+    for low, high in sorted(blocked):
+        if high <= position:
+            continue
+        if low > position:
+            free.append((position, min(low, end)))
+        position = max(position, high)
+        if position >= end:
+            break
+    if position < end:
+        free.append((position, end))
+    return [(low, high) for low, high in free if high > low]
+
+def pack_interval(low, high, length, gap):
+    """
+    Start offsets of as many `length` long pieces, `gap` apart, as fit in [low, high].
+
+    Args:
+        low (float): Start of the free interval.
+        high (float): End of the free interval.
+        length (float): Length of each piece.
+        gap (float): Space between pieces.
+
+    Returns:
+        list: Offsets of each piece's start, packed from `low`.
+    """
+    if high - low < length:
+        return []
+    count = int((high - low - length) / (length + gap) + 1e-9) + 1
+    return [low + number * (length + gap) for number in range(count)]
+
+class _ObstacleIndex:
+    """Item footprints bucketed into a uniform grid by the cells their box covers."""
+
+    def __init__(self, cell):
+        self.cell = cell
+        self.grid = defaultdict(list)
+        self.large = []
+        self.cx, self.cy, self.hw, self.hh, self.angle = [], [], [], [], []
+
+    def add(self, cx, cy, hw, hh, angle, ex, ey):
+        index = len(self.cx)
+        self.cx.append(cx)
+        self.cy.append(cy)
+        self.hw.append(hw)
+        self.hh.append(hh)
+        self.angle.append(angle)
+        cell = self.cell
+        col0, col1 = math.floor((cx - ex) / cell), math.floor((cx + ex) / cell)
+        row0, row1 = math.floor((cy - ey) / cell), math.floor((cy + ey) / cell)
+        if (col1 - col0 + 1) * (row1 - row0 + 1) > _MAX_INDEXED_CELLS:
+            self.large.append(index)
+            return
+        for col in range(col0, col1 + 1):
+            for row in range(row0, row1 + 1):
+                self.grid[(col, row)].append(index)
+
+    def query(self, x0, y0, x1, y1):
+        """Indices of obstacles that may touch the box, without duplicates."""
+        cell = self.cell
+        found = set(self.large)
+        for col in range(math.floor(x0 / cell), math.floor(x1 / cell) + 1):
+            for row in range(math.floor(y0 / cell), math.floor(y1 / cell) + 1):
+                found.update(self.grid.get((col, row), ()))
+        return found
+
+def place_street_plots(items, header=None, street_types=DEFAULT_STREET_TYPES, frontage=DEFAULT_FRONTAGE,
+                       depth=DEFAULT_DEPTH, gap=DEFAULT_GAP, setback=DEFAULT_SETBACK, plot_type=DEFAULT_PLOT_TYPE,
+                       color=DEFAULT_PLOT_COLOR, layer_id=None, id_prefix='plot', face_street=True):
+    """
+    Pack plots along both sides of every street.
+
+    Each side of a street is a band `setback` units from the street edge
+    and `depth` units deep. Every item whose footprint reaches into the
+    band blocks the stretch of street it covers, widened by `gap` on both
+    ends; that includes crossing streets, trees, buildings, parks and
+    water, but not OPEN_GROUND_TYPES. The stretches left free are filled
+    from their start with `frontage` wide plots, `gap` units apart. Plots
+    that would leave the map's width x height are dropped. Streets are
+    done longest first, and the plots placed so far block later streets,
+    so corners where two frontages meet are never filled twice. Running
+    again on the output adds nothing.
+
+    Args:
+        items (list): Item dictionaries of the map.
+        header (dict): The map's top-level keys, for its size and layers.
+        street_types (iterable): Street types to build along, or None for all.
+        frontage (float): Plot width along the street.
+        depth (float): Plot depth away from the street.
+        gap (float): Space between plots, and between plots and other items.
+        setback (float): Space between the street edge and the plots.
+        plot_type (str): Type of the new plots.
+        color (str): Color of the new plots.
+        layer_id (str): Layer for the new plots; defaults to the layer most
+            existing plots use, then to a layer named 'Plots'.
+        id_prefix (str): Start of the new ids, '<prefix>-<street id>-<side>-<n>'.
+        face_street (bool): Turn each plot's front (local +y edge) towards
+            its street; otherwise plots keep the street's direction only.
+
+    Returns:
+        list: The new plot items.
+
+    Raises:
+        ValueError: If frontage or depth is not positive, or gap or setback is negative.
+    """
+    if frontage <= 0 or depth <= 0 or gap < 0 or setback < 0:
+        raise ValueError("Frontage and depth must be positive, gap and setback not negative")
+    header = header or {}
+    if layer_id is None:
+        layer_id = _plot_layer(items, header)
+
+    segments = street_segments(items, street_types)
+    obstacles = [item for item in items
+                 if not (item.get('category') == 'ground' and item.get('type') in OPEN_GROUND_TYPES)]
+    footprints = item_footprints(obstacles, ignore_categories=())
+    index = _ObstacleIndex(max(frontage + gap, depth + setback) * 2)
+    for values in zip(footprints['cx'], footprints['cy'], footprints['hw'], footprints['hh'],
+                      footprints['angle'], footprints['ex'], footprints['ey']):
+        index.add(*values)
+
+    width, height = header.get('width'), header.get('height')
+    used_ids = {item.get('id') for item in items}
+    placed = []
+
+    for segment in segments:
+        street = segment['item']
+        scx, scy, ux, uy = segment['cx'], segment['cy'], segment['ux'], segment['uy']
+        half_length = segment['half_length']
+        near = segment['half_width'] + setback
+        far = near + depth
+        label = (street.get('properties') or {}).get('name') or street.get('id')
+
+        for nx, ny in ((uy, -ux), (-uy, ux)):
+            side = _side_name(nx, ny)
+            rotation = _facing_rotation(nx, ny) if face_street else _facing_rotation(uy, -ux)
+            # Box around the band, to fetch candidate obstacles
+            corners = [(scx + ux * along + nx * across, scy + uy * along + ny * across)
+                       for along in (-half_length, half_length) for across in (near, far)]
+            xs, ys = [x for x, _ in corners], [y for _, y in corners]
+            candidates = index.query(min(xs) - gap, min(ys) - gap, max(xs) + gap, max(ys) + gap)
+
+            blocked = []
+            for j in candidates:
+                dx, dy = index.cx[j] - scx, index.cy[j] - scy
+                cos, sin = math.cos(index.angle[j]), math.sin(index.angle[j])
+                hw, hh = index.hw[j], index.hh[j]
+                across = dx * nx + dy * ny
+                reach_across = hw * abs(nx * cos + ny * sin) + hh * abs(-nx * sin + ny * cos)
+                if across + reach_across <= near + OVERLAP_TOLERANCE or across - reach_across >= far - OVERLAP_TOLERANCE:
+                    continue
+                along = dx * ux + dy * uy
+                reach_along = hw * abs(ux * cos + uy * sin) + hh * abs(-ux * sin + uy * cos)
+                blocked.append((along - reach_along - gap, along + reach_along + gap))
+
+            number = 0
+            first_placed = len(placed)
+            middle = (near + far) / 2
+            for low, high in free_intervals(blocked, -half_length, half_length):
+                for start in pack_interval(low, high, frontage, gap):
+                    along = start + frontage / 2
+                    cx = scx + ux * along + nx * middle
+                    cy = scy + uy * along + ny * middle
+                    ex = frontage / 2 * abs(ux) + depth / 2 * abs(nx)
+                    ey = frontage / 2 * abs(uy) + depth / 2 * abs(ny)
+                    if width and height and (cx - ex < -OVERLAP_TOLERANCE or cy - ey < -OVERLAP_TOLERANCE
+                                             or cx + ex > width + OVERLAP_TOLERANCE
+                                             or cy + ey > height + OVERLAP_TOLERANCE):
+                        continue
+                    number += 1
+                    while f"{id_prefix}-{street.get('id')}-{side}-{number}" in used_ids:
+                        number += 1
+                    item_id = f"{id_prefix}-{street.get('id')}-{side}-{number}"
+                    used_ids.add(item_id)
+                    placed.append({
+                        "id": item_id,
+                        "type": plot_type,
+                        "category": "plot",
+                        "x": round(cx - frontage / 2, 2),
+                        "y": round(cy - depth / 2, 2),
+                        "width": frontage,
+                        "height": depth,
+                        "rotation": rotation,
+                        "scale": 1,
+                        "color": color,
+                        "layerId": layer_id,
+                        "elevationOffset": 0,
+                        "properties": {"name": f"{label} {side.upper()}-{number}"}
+                    })
+            # Plots of this side block the streets that come later
+            for plot in placed[first_placed:]:
+                new = item_footprints([plot], ignore_categories=())
+                index.add(new['cx'][0], new['cy'][0], new['hw'][0], new['hh'][0],
+                          new['angle'][0], new['ex'][0], new['ey'][0])
+    return placed
+
+def _plot_layer(items, header):
+    """Layer most existing plots use, else the header layer named 'Plots'."""
+    layers = Counter(item.get('layerId', item.get('layer_id')) for item in items if item.get('category') == 'plot')
+    layers.pop(None, None)
+    if layers:
+        return layers.most_common(1)[0][0]
+    for layer in header.get('layers') or ():
+        if str(layer.get('name', '')).lower() == 'plots':
+            return layer.get('id')
+    return None
+
+def populate_streets(input_path, output_path, **options):
+    """
+    Add plots along the streets of a map file.
+
+    '.txt' outputs get only the new plots as leading-comma lines, like
+    plots.py writes; anything else gets the whole map with the new plots
+    appended.
+
+    Args:
+        input_path (str): Path to the map file.
+        output_path (str): Path for the result.
+        **options: place_street_plots parameters.
+
+    Returns:
+        list: The new plot items.
+
+    Raises:
+        MapParseError: If the map file is malformed.
+        ValueError: For invalid placement options.
+        OSError: If the output cannot be written.
+    """
+    header = {}
+    items = list(iter_json_items(input_path, header))
+    header.pop('items', None)
+    placed = place_street_plots(items, header, **options)
+
+    if output_path.endswith('.txt'):
+        with open(output_path, 'w') as file:
+            plots.write_json_items(placed, file)
+    elif not save_file({**header, 'items': items + placed}, output_path, use_leading_commas=False):
+        raise OSError(f"Could not write {output_path}")
+    return placed
+
+def main():
+    parser = argparse.ArgumentParser(description="Place plots along both sides of every street in a map.")
+    parser.add_argument('input', help="map file")
+    parser.add_argument('output', nargs='?', help="output map, or .txt for the new plots only "
+                                                  "(default: <input>_streets.json)")
+    parser.add_argument('--types', default=','.join(DEFAULT_STREET_TYPES),
+                        help="comma-separated street types to build along, or 'all'")
+    parser.add_argument('--frontage', type=float, default=DEFAULT_FRONTAGE, help="plot width along the street")
+    parser.add_argument('--depth', type=float, default=DEFAULT_DEPTH, help="plot depth away from the street")
+    parser.add_argument('--gap', type=float, default=DEFAULT_GAP, help="space between plots")
+    parser.add_argument('--setback', type=float, default=DEFAULT_SETBACK, help="space between street and plots")
+    parser.add_argument('--plot-type', default=DEFAULT_PLOT_TYPE)
+    parser.add_argument('--color', default=DEFAULT_PLOT_COLOR)
+    parser.add_argument('--layer', help="layer id for the new plots")
+    parser.add_argument('--prefix', default='plot', help="id prefix for the new plots")
+    parser.add_argument('--no-facing', action='store_true', help="do not turn plots towards their street")
+    args = parser.parse_args()
+
+    print("Street Plot Placement")
+    print("=====================")
+
+    if not os.path.exists(args.input):
+        print(f"File not found: {args.input}")
+        return
+    output_path = args.output or f"{os.path.splitext(args.input)[0]}_streets.json"
+
+    try:
+        placed = populate_streets(
+            args.input, output_path,
+            street_types=None if args.types == 'all' else [value for value in args.types.split(',') if value],
+            frontage=args.frontage, depth=args.depth, gap=args.gap, setback=args.setback,
+            plot_type=args.plot_type, color=args.color, layer_id=args.layer, id_prefix=args.prefix,
+            face_street=not args.no_facing
+        )
+    except (MapParseError, ValueError, OSError) as e:
+        print(f"Placement failed: {e}")
+        sys.exit(1)
+
+    streets = Counter(plot['id'].rsplit('-', 1)[0] for plot in placed)
+    print(f"Placed {len(placed)} plots along {len(streets)} street sides.")
+    print(f"Output saved to {output_path}")
+
+if __name__ == "__main__":
+    main()
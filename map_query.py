@@ -0,0 +1,400 @@
+import argparse
+import itertools
+import json
+import math
+import os
+import pickle
+import sys
+import time
+from array import array
+from collections import defaultdict
+
+from map_items import FIELD_ALIASES, MapItems
+from plots2 import load_json_file, open_atomic
+
+# Bump when the index layout changes so cached indexes are rebuilt
+INDEX_FORMAT_VERSION = 1
+
+# Item fields with an inverted index, in MapItems column names
+INDEXED_FIELDS = ('category', 'type', 'layerId', 'color')
+
+# Items more than this many times a typical item's size skip the grid and are checked by every spatial query
+_MAX_GRID_SPAN = 16
+
+_STRING = 's'
+
+class MapIndex:
+    """
+    Inverted and spatial indexes over the items of one map.
+
+    Every INDEXED_FIELDS value maps to the sorted indices of the items
+    that have it. Items are also bucketed by the centre of their
+    bounding box into a uniform grid, with cells twice as wide as a
+    typical (95th percentile) item; the few much larger items, such as
+    ground and streets, are checked by every spatial query instead. A
+    query starts from whichever index gives the fewest candidates and
+    checks the remaining filters on those candidates only, so its cost
+    follows the size of the smallest matching set rather than the map.
+    The index, items included, pickles compactly and can be saved with
+    save() or cached per file content.
+    """
+
+    def __init__(self, items, header=None):
+        """
+        Args:
+            items (list or MapItems): The map's items.
+            header (dict): The map's other top-level keys, used to look up
+                layers by name.
+        """
+        self.items = items if isinstance(items, MapItems) else MapItems.from_items(items)
+        self.header = {key: value for key, value in (header or {}).items() if key != 'items'}
+        self._build_inverted()
+        self._build_grid()
+
+    def __len__(self):
+        return len(self.items)
+
+    def _build_inverted(self):
+        items = self.items
+        values = items.strings.values
+        # For every shape, which indexed fields it stores as strings
+        self._present = {
+            field: array('b', [
+                any(FIELD_ALIASES.get(key, key) == field and kind == _STRING for key, kind in shape)
+                for shape in items.shapes
+            ])
+            for field in INDEXED_FIELDS
+        }
+        self.postings = {}
+        shape_ids = items.shape_ids
+        for field in INDEXED_FIELDS:
+            present = self._present[field]
+            lists = defaultdict(lambda: array('I'))
+            for index, code in enumerate(items.codes[field]):
+                if present[shape_ids[index]]:
+                    lists[code].append(index)
+            self.postings[field] = {values[code]: indices for code, indices in lists.items()}
+
+    def _build_grid(self):
+        items = self.items
+        count = len(items)
+        x, y = items.numeric['x'], items.numeric['y']
+        widths, heights = items.numeric['width'], items.numeric['height']
+        rotations, scales = items.numeric['rotation'], items.numeric['scale']
+        self.min_x, self.min_y = array('d', bytes(8 * count)), array('d', bytes(8 * count))
+        self.max_x, self.max_y = array('d', bytes(8 * count)), array('d', bytes(8 * count))
+        extents = array('d', bytes(8 * count))
+        for index in range(count):
+            # Same footprint as the renderer: missing sizes and scale count as 1
+            width = widths[index] or 1
+            height = heights[index] or 1
+            scale = scales[index] or 1
+            hw, hh = abs(width * scale) / 2, abs(height * scale) / 2
+            degrees = rotations[index] % 180
+            if degrees == 90:
+                hw, hh = hh, hw
+            elif degrees:
+                angle = math.radians(degrees)
+                cos, sin = abs(math.cos(angle)), abs(math.sin(angle))
+                hw, hh = hw * cos + hh * sin, hw * sin + hh * cos
+            cx, cy = x[index] + width / 2, y[index] + height / 2
+            self.min_x[index], self.max_x[index] = cx - hw, cx + hw
+            self.min_y[index], self.max_y[index] = cy - hh, cy + hh
+            extents[index] = max(hw, hh)
+
+        typical = sorted(extents)[min(count - 1, count * 95 // 100)] if count else 0
+        self.cell = cell = 2 * typical or 1
+        cells = defaultdict(lambda: array('I'))
+        large = array('I')
+        for index in range(count):
+            if extents[index] > typical * _MAX_GRID_SPAN:
+                large.append(index)
+            else:
+                cells[(math.floor((self.min_x[index] + self.max_x[index]) / 2 / cell),
+                       math.floor((self.min_y[index] + self.max_y[index]) / 2 / cell))].append(index)
+        self.large = large
+        # How far a gridded item can reach beyond its cell
+        self.reach = max([typical] + [extents[index] for members in cells.values() for index in members
+                                      if extents[index] > typical])
+        self.cells = dict(cells)
+
+    def resolve_layer(self, layer):
+        """Layer id for a layer id or name."""
+        for entry in self.header.get('layers') or ():
+            if isinstance(entry, dict) and layer in (entry.get('id'), entry.get('name')):
+                return entry.get('id')
+        return layer
+
+    def _box_candidates(self, x0, y0, x1, y1):
+        """Items that may touch the box: those in the grid cells it reaches, plus the large ones."""
+        cell, reach = self.cell, self.reach
+        col0, col1 = math.floor((x0 - reach) / cell), math.floor((x1 + reach) / cell)
+        row0, row1 = math.floor((y0 - reach) / cell), math.floor((y1 + reach) / cell)
+        cells = self.cells
+        if (col1 - col0 + 1) * (row1 - row0 + 1) > len(cells):
+            found = [members for key, members in cells.items()
+                     if col0 <= key[0] <= col1 and row0 <= key[1] <= row1]
+        else:
+            found = [cells[key] for key in ((col, row) for col in range(col0, col1 + 1)
+                                            for row in range(row0, row1 + 1)) if key in cells]
+        found.append(self.large)
+        return found
+
+    def query(self, category=None, item_type=None, layer_id=None, color=None, bbox=None, near=None,
+              missing=(), where=None, limit=None):
+        """
+        Find the items matching every given filter.
+
+        Args:
+            category (str or list): Category, or any of several.
+            item_type (str or list): Type, or any of several.
+            layer_id (str or list): Layer id or name, or any of several.
+            color (str or list): Color, or any of several.
+            bbox (tuple): (min x, min y, max x, max y); items whose bounding
+                box intersects it.
+            near (tuple): (x, y, radius); items whose bounding box is within
+                radius of the point.
+            missing (iterable): Dotted field paths the items must lack or
+                leave empty, e.g. 'properties.name'.
+            where (callable): Extra test on the item dict.
+            limit (int): Most indices returned.
+
+        Returns:
+            list: Matching item indices, in map order.
+        """
+        items = self.items
+        equal = []
+        for field, wanted in (('category', category), ('type', item_type), ('layerId', layer_id), ('color', color)):
+            if wanted is None:
+                continue
+            wanted = [wanted] if isinstance(wanted, str) else list(wanted)
+            if field == 'layerId':
+                wanted = [self.resolve_layer(value) for value in wanted]
+            postings = [self.postings[field][value] for value in wanted if value in self.postings[field]]
+            if not postings:
+                return []
+            equal.append((sum(map(len, postings)), field, wanted, postings))
+
+        boxes = []
+        if bbox is not None:
+            boxes.append(tuple(bbox))
+        if near is not None:
+            px, py, radius = near
+            boxes.append((px - radius, py - radius, px + radius, py + radius))
+        spatial = None
+        for box in boxes:
+            # An item can touch both boxes even where they do not overlap, so
+            # take either box's candidates, whichever are fewer; the bbox and
+            # near filters below then apply both tests
+            found = self._box_candidates(*box)
+            if spatial is None or sum(map(len, found)) < sum(map(len, spatial)):
+                spatial = found
+
+        # Drive the query from the smallest candidate set
+        equal.sort(key=lambda entry: entry[0])
+        if spatial is not None and (not equal or sum(map(len, spatial)) < equal[0][0]):
+            sources = spatial
+        elif equal:
+            sources = equal.pop(0)[3]
+        else:
+            sources = [range(len(items))]
+        # Postings of different values, and grid cells, never share an item
+        candidates = list(sources[0]) if len(sources) == 1 else sorted(itertools.chain.from_iterable(sources))
+
+        # Each remaining filter keeps the candidates whose mask value is true;
+        # map and compress do the per-item work in C
+        def keep(mask):
+            nonlocal candidates
+            candidates = list(itertools.compress(candidates, mask))
+
+        shape_ids = items.shape_ids
+        codes = items.strings.codes
+        for _, field, wanted, _ in equal:
+            wanted_codes = {codes[value] for value in wanted if value in codes}
+            keep(map(wanted_codes.__contains__, map(items.codes[field].__getitem__, candidates)))
+            if 0 in wanted_codes:
+                # Code 0 also stands for a missing field
+                keep(map(self._present[field].__getitem__, map(shape_ids.__getitem__, candidates)))
+        if bbox is not None:
+            bx0, by0, bx1, by1 = map(float, bbox)
+            keep(map(bx1.__ge__, map(self.min_x.__getitem__, candidates)))
+            keep(map(bx0.__le__, map(self.max_x.__getitem__, candidates)))
+            keep(map(by1.__ge__, map(self.min_y.__getitem__, candidates)))
+            keep(map(by0.__le__, map(self.max_y.__getitem__, candidates)))
+        if near is not None:
+            px, py, radius = near
+            min_x, min_y, max_x, max_y = self.min_x, self.min_y, self.max_x, self.max_y
+            limit_squared = radius * radius
+
+            def within(index):
+                dx = max(min_x[index] - px, 0, px - max_x[index])
+                dy = max(min_y[index] - py, 0, py - max_y[index])
+                return dx * dx + dy * dy <= limit_squared
+            keep(map(within, candidates))
+        for path in missing:
+            first, _, key = path.partition('.')
+            if first == 'properties' and key and '.' not in key:
+                # The common case, read straight from the properties column
+                keep(not (properties and properties.get(key))
+                     for properties in map(items.properties.__getitem__, candidates))
+            else:
+                keep(not self.field_value(index, path) for index in candidates)
+        if where is not None:
+            keep(where(items.item(index)) for index in candidates)
+        return candidates[:limit] if limit is not None else candidates
+
+    def field_value(self, index, path):
+        """
+        Value of a dotted field path of one item, or None.
+
+        Args:
+            index (int): Item index.
+            path (str): e.g. 'color' or 'properties.name'.
+
+        Returns:
+            The value, or None if any part of the path is missing.
+        """
+        first, _, rest = path.partition('.')
+        if first == 'properties':
+            value = self.items.properties[index] or {}
+        else:
+            value = self.items.value(index, first)
+        for part in rest.split('.') if rest else ():
+            if not isinstance(value, dict):
+                return None
+            value = value.get(part)
+        return value
+
+    def counts(self, field):
+        """
+        Number of items per value of an indexed field.
+
+        Args:
+            field (str): One of INDEXED_FIELDS.
+
+        Returns:
+            dict: Value -> count, most common first.
+        """
+        postings = self.postings[field]
+        return dict(sorted(((value, len(indices)) for value, indices in postings.items()),
+                           key=lambda entry: (-entry[1], entry[0])))
+
+    def save(self, file_path):
+        """Write the index, items included, to a file atomically."""
+        with open_atomic(file_path, compress=False) as file:
+            file.flush()
+            pickle.dump((INDEX_FORMAT_VERSION, self), file.buffer, protocol=pickle.HIGHEST_PROTOCOL)
+
+    @staticmethod
+    def load(file_path):
+        """
+        Read an index written by save().
+
+        Raises:
+            ValueError: If the file holds an index of another format version.
+        """
+        with open(file_path, 'rb') as file:
+            version, index = pickle.load(file)
+        if version != INDEX_FORMAT_VERSION:
+            raise ValueError(f"{file_path} holds a version {version} index; rebuild it")
+        return index
+
+def load_index(file_path, cache=None, stats=None):
+    """
+    Build the index of a map file, or reuse the one built for the same content.
+
+    Args:
+        file_path (str): Path to the map file.
+        cache (MapCache): Optional cache for built indexes, keyed by the
+            file's content hash.
+        stats (dict): Optional dict that receives 'cached' and 'seconds'.
+
+    Returns:
+        MapIndex: The index, or None if the file could not be loaded.
+    """
+    started = time.perf_counter()
+    key = None
+    index = None
+    if cache is not None:
+        from map_cache import file_digest
+        key = f"index-{INDEX_FORMAT_VERSION}-{file_digest(file_path)}"
+        index = cache.get(key)
+    cached = index is not None
+    if index is None:
+        data = load_json_file(file_path, columnar=True)
+        if data is None:
+            return None
+        index = MapIndex(data.get('items') or [], data)
+        if cache is not None:
+            cache.put(key, index)
+    if stats is not None:
+        stats.update(cached=cached, seconds=time.perf_counter() - started)
+    return index
+
+def _numbers(text, count, option):
+    values = [float(value) for value in text.split(',')]
+    if len(values) != count:
+        raise ValueError(f"{option} needs {count} comma-separated numbers")
+    return values
+
+def main():
+    parser = argparse.ArgumentParser(description="Query the items of a map by category, type, layer, color and area.")
+    parser.add_argument('input', help="map file")
+    parser.add_argument('--category', action='append', help="category (repeat for any of several)")
+    parser.add_argument('--type', action='append', dest='item_type', help="item type (repeat for any of several)")
+    parser.add_argument('--layer', action='append', help="layer id or name (repeat for any of several)")
+    parser.add_argument('--color', action='append', help="color (repeat for any of several)")
+    parser.add_argument('--bbox', help="min_x,min_y,max_x,max_y")
+    parser.add_argument('--near', help="x,y,radius")
+    parser.add_argument('--missing', action='append', default=[], help="field the items lack, e.g. properties.name")
+    parser.add_argument('--limit', type=int, help="most items printed")
+    parser.add_argument('--count', action='store_true', help="only print the number of matches")
+    parser.add_argument('--ids', action='store_true', help="print ids instead of items")
+    parser.add_argument('--stats', choices=INDEXED_FIELDS, help="print item counts per value of a field")
+    parser.add_argument('--no-cache', action='store_true', help="build the index without the on-disk cache")
+    args = parser.parse_args()
+
+    print("Map Query")
+    print("=========")
+
+    if not os.path.exists(args.input):
+        print(f"File not found: {args.input}")
+        return
+
+    try:
+        bbox = _numbers(args.bbox, 4, '--bbox') if args.bbox else None
+        near = _numbers(args.near, 3, '--near') if args.near else None
+    except ValueError as e:
+        print(f"Query failed: {e}")
+        sys.exit(1)
+
+    cache = None
+    if not args.no_cache:
+        from map_cache import MapCache
+        cache = MapCache()
+    stats = {}
+    index = load_index(args.input, cache, stats)
+    if index is None:
+        sys.exit(1)
+    print(f"Index of {len(index)} items {'loaded from cache' if stats['cached'] else 'built'} "
+          f"in {stats['seconds']:.2f}s")
+
+    if args.stats:
+        for value, count in index.counts(args.stats).items():
+            print(f"  {value}: {count}")
+        return
+
+    started = time.perf_counter()
+    matches = index.query(args.category, args.item_type, args.layer, args.color, bbox, near, args.missing)
+    elapsed = time.perf_counter() - started
+    print(f"{len(matches)} matching items in {elapsed * 1000:.1f} ms")
+    if args.count:
+        return
+    for position in matches[:args.limit] if args.limit is not None else matches:
+        if args.ids:
+            print(index.items.ids[position])
+        else:
+            print(json.dumps(index.items.item(position), ensure_ascii=False))
+
+if __name__ == "__main__":
+    main()
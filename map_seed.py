@@ -0,0 +1,275 @@
+import json
+import math
+import os
+import sqlite3
+import sys
+import time
+
+from plots2 import MapParseError, iter_json_items, open_atomic
+
+# Columns written for each plot, as PlotService inserts them; created_at and
+# updated_at are left to their now() defaults
+SEED_COLUMNS = ('id', 'name', 'position', 'map_position', 'map_id', 'status', 'price', 'key')
+
+SEED_TABLE = 'public.plots'
+
+SEED_MODES = ('copy', 'insert')
+
+DEFAULT_BATCH_SIZE = 1000
+
+DEFAULT_PLOT_PRICE = 100
+
+# COPY text format escapes, applied in order (backslash first)
+_COPY_ESCAPES = (('\\', '\\\\'), ('\t', '\\t'), ('\n', '\\n'), ('\r', '\\r'))
+
+def _position_json(x, y, z):
+    """Format a position like json.dumps({'x': x, 'y': y, 'z': z}), faster."""
+    if all(type(value) is int or (type(value) is float and math.isfinite(value)) for value in (x, y, z)):
+        return f'{{"x": {x!r}, "y": {y!r}, "z": {z!r}}}'
+    return json.dumps({'x': x, 'y': y, 'z': z})
+
+def plot_rows(items, map_id=None):
+    """
+    Turn the plot items of a map into plots table rows.
+
+    Names and prices come from the item properties with the same fallbacks
+    as PlotService; position and map_position are both {x, y, z} with z
+    taken from the elevation offset. Whole float prices such as 150.0 are
+    written as integers, since the price column is an INTEGER.
+
+    Args:
+        items (iterable): Item dictionaries (only category == "plot" is used).
+            Both camelCase and snake_case item keys are accepted.
+        map_id (str): Optional community_maps id stored on every row.
+
+    Yields:
+        tuple: One value per column in SEED_COLUMNS; positions are JSON text.
+
+    Raises:
+        ValueError: If a plot's price is a number with a fractional part.
+    """
+    for item in items:
+        if item.get('category') != 'plot':
+            continue
+        properties = item.get('properties') or {}
+        name = str(properties['name']) if properties.get('name') else f"Plot {item['id']}"
+        price = properties.get('price')
+        if type(price) not in (int, float):
+            price = DEFAULT_PLOT_PRICE
+        elif type(price) is float:
+            if not price.is_integer():
+                raise ValueError(f"Plot {item['id']!r} has price {price!r}; the price column only takes whole numbers")
+            price = int(price)
+        elevation = item.get('elevationOffset', item.get('elevation_offset')) or 0
+        position = _position_json(item['x'], item.get('y') or 0, elevation)
+        yield (item['id'], name, position, position, map_id, 'available', price, item.get('type') or 'plot')
+
+def _copy_value(value):
+    if value is None:
+        return '\\N'
+    value = str(value)
+    for char, escape in _COPY_ESCAPES:
+        if char in value:
+            value = value.replace(char, escape)
+    return value
+
+def _sql_literal(value):
+    if value is None:
+        return 'NULL'
+    if isinstance(value, (int, float)):
+        return repr(value)
+    return "'" + value.replace("'", "''") + "'"
+
+def write_copy(rows, file, table=SEED_TABLE):
+    """
+    Stream rows as a psql `COPY ... FROM STDIN` block.
+
+    Args:
+        rows (iterable): Row tuples in SEED_COLUMNS order.
+        file: Writable text file handle.
+        table (str): Target table.
+
+    Returns:
+        int: Number of rows written.
+    """
+    write = file.write
+    write(f"COPY {table} ({', '.join(SEED_COLUMNS)}) FROM STDIN;\n")
+    count = 0
+    for row in rows:
+        write('\t'.join(map(_copy_value, row)))
+        write('\n')
+        count += 1
+    write("\\.\n")
+    return count
+
+def write_inserts(rows, file, table=SEED_TABLE, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Stream rows as multi-row INSERT statements of at most `batch_size` rows.
+
+    Args:
+        rows (iterable): Row tuples in SEED_COLUMNS order.
+        file: Writable text file handle.
+        table (str): Target table.
+        batch_size (int): Maximum rows per statement.
+
+    Returns:
+        int: Number of rows written.
+    """
+    if batch_size < 1:
+        raise ValueError("batch_size must be at least 1")
+    write = file.write
+    statement = f"INSERT INTO {table} ({', '.join(SEED_COLUMNS)})\nVALUES\n  "
+    count = 0
+    for row in rows:
+        if count % batch_size == 0:
+            if count:
+                write(";\n\n")
+            write(statement)
+        else:
+            write(",\n  ")
+        write(f"({', '.join(map(_sql_literal, row))})")
+        count += 1
+    if count:
+        write(";\n")
+    return count
+
+def emit_plot_seed(input_path, output_path, mode='copy', batch_size=DEFAULT_BATCH_SIZE, map_id=None, truncate=False):
+    """
+    Write a seed script for the plots of a map file.
+
+    The map is streamed with `iter_json_items` and rows are written as they
+    are produced, so neither the map nor the seed is held in memory. The
+    script runs in one transaction.
+
+    Args:
+        input_path (str): Map file in any supported shape.
+        output_path (str): Path to save the seed ('.gz' to compress).
+        mode (str): 'copy' for COPY FROM STDIN (psql) or 'insert' for
+            batched INSERT statements.
+        batch_size (int): Rows per INSERT statement in 'insert' mode.
+        map_id (str): Optional community_maps id stored on every row.
+        truncate (bool): Whether to empty the plots table first.
+
+    Returns:
+        int: Number of plots written.
+
+    Raises:
+        MapParseError: If the map file is malformed.
+        ValueError: If the mode or batch size is invalid.
+    """
+    if mode not in SEED_MODES:
+        raise ValueError(f"Unknown seed mode {mode!r}; expected one of {', '.join(SEED_MODES)}")
+    if batch_size < 1:
+        raise ValueError("batch_size must be at least 1")
+
+    rows = plot_rows(iter_json_items(input_path), map_id)
+    with open_atomic(output_path) as file:
+        file.write(f"-- Plots seed generated from {os.path.basename(input_path)}\n\n")
+        file.write("BEGIN;\n\n")
+        if truncate:
+            file.write(f"TRUNCATE {SEED_TABLE} RESTART IDENTITY CASCADE;\n\n")
+        if mode == 'copy':
+            count = write_copy(rows, file)
+        else:
+            count = write_inserts(rows, file, batch_size=batch_size)
+        file.write("\nCOMMIT;\n")
+    return count
+
+def _copy_unescape(value):
+    if value == '\\N':
+        return None
+    if '\\' not in value:
+        return value
+    result = []
+    chars = iter(value)
+    for char in chars:
+        if char == '\\':
+            escaped = next(chars, '')
+            char = {'t': '\t', 'n': '\n', 'r': '\r'}.get(escaped, escaped)
+        result.append(char)
+    return ''.join(result)
+
+def load_seed_into_sqlite(seed_path, connection=None):
+    """
+    Load a generated seed into SQLite as a stand-in for Postgres.
+
+    A `public` schema with a plots table holding the seed columns is
+    attached, INSERT statements are executed as-is and COPY blocks are
+    parsed and bulk-inserted, so row counts and load times can be checked
+    without a database server.
+
+    Args:
+        seed_path (str): Seed file written by emit_plot_seed.
+        connection (sqlite3.Connection): Optional connection to load into;
+            defaults to a new in-memory database.
+
+    Returns:
+        tuple: (row count in the table, load time in seconds)
+    """
+    if connection is None:
+        connection = sqlite3.connect(':memory:')
+    connection.execute("ATTACH DATABASE ':memory:' AS public")
+    connection.execute(f"CREATE TABLE {SEED_TABLE} (id TEXT PRIMARY KEY, name TEXT, position TEXT, "
+                       "map_position TEXT, map_id TEXT, status TEXT, price INTEGER, key TEXT)")
+
+    start = time.perf_counter()
+    with open(seed_path, 'r', encoding='utf-8') as file:
+        statement = []
+        for line in file:
+            if line.startswith('COPY '):
+                table, columns = line[5:].split(' (', 1)
+                columns = columns.split(') FROM STDIN', 1)[0]
+                placeholders = ', '.join('?' * len(columns.split(', ')))
+                rows = []
+                for data in file:
+                    if data == '\\.\n':
+                        break
+                    rows.append([_copy_unescape(value) for value in data.rstrip('\n').split('\t')])
+                connection.executemany(f"INSERT INTO {table} ({columns}) VALUES ({placeholders})", rows)
+                continue
+            if line.startswith(('--', 'BEGIN', 'COMMIT', 'TRUNCATE')) or not line.strip():
+                continue
+            statement.append(line)
+            if line.rstrip().endswith(';'):
+                connection.execute(''.join(statement))
+                statement = []
+    connection.commit()
+    elapsed = time.perf_counter() - start
+
+    count = connection.execute(f"SELECT COUNT(*) FROM {SEED_TABLE}").fetchone()[0]
+    return count, elapsed
+
+def main():
+    print("Plots Seed Generator")
+    print("====================")
+
+    usage = ("Usage: python map_seed.py <map.json> <seed.sql> [copy|insert] [batch_size] [map_id]\n"
+             "       python map_seed.py --verify <seed.sql>")
+    if len(sys.argv) < 3:
+        print(usage)
+        return
+
+    if sys.argv[1] == '--verify':
+        count, elapsed = load_seed_into_sqlite(sys.argv[2])
+        print(f"Loaded {count} plots into SQLite in {elapsed:.3f}s")
+        return
+
+    input_file, output_file = sys.argv[1], sys.argv[2]
+    mode = sys.argv[3] if len(sys.argv) > 3 else 'copy'
+    map_id = sys.argv[5] if len(sys.argv) > 5 else None
+
+    if not os.path.exists(input_file):
+        print(f"File not found: {input_file}")
+        return
+
+    try:
+        batch_size = int(sys.argv[4]) if len(sys.argv) > 4 else DEFAULT_BATCH_SIZE
+        count = emit_plot_seed(input_file, output_file, mode, batch_size, map_id)
+    except (MapParseError, ValueError, OSError) as e:
+        print(f"Seed generation failed: {e}")
+        return
+
+    print(f"Wrote {count} plots to {output_file} ({mode})")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,293 @@
+import hashlib
+import json
+import math
+import os
+import sys
+
+from map_overlaps import item_footprints
+from plots2 import MapParseError, iter_json_items, open_atomic
+
+TILE_FORMAT_VERSION = 1
+
+TILE_SCHEMES = ('grid', 'quadtree')
+
+# Side of a grid tile in map units; a 1000x800 map gives 10x8 tiles
+DEFAULT_TILE_SIZE = 100
+
+# Quadtree nodes with more items than this are split
+DEFAULT_MAX_ITEMS = 256
+
+MAX_QUADTREE_DEPTH = 12
+
+# Grid items whose box covers more tiles than this go to the shared tile
+DEFAULT_MAX_SPAN = 4
+
+# Categories always placed in the shared tile, whatever their size
+SHARED_CATEGORIES = frozenset({'ground'})
+
+MANIFEST_NAME = 'manifest.json'
+
+TILE_DIR = 'tiles'
+
+SHARED_KEY = 'shared'
+
+def _union(boxes):
+    boxes = list(boxes)
+    if not boxes:
+        return None
+    return [min(box[0] for box in boxes), min(box[1] for box in boxes),
+            max(box[2] for box in boxes), max(box[3] for box in boxes)]
+
+def _boxes(items):
+    """Axis-aligned bounding box [min x, min y, max x, max y] of each item's footprint."""
+    footprints = item_footprints(items, ignore_categories=())
+    return [
+        [cx - ex, cy - ey, cx + ex, cy + ey]
+        for cx, cy, ex, ey in zip(footprints['cx'], footprints['cy'], footprints['ex'], footprints['ey'])
+    ]
+
+def world_bounds(header, boxes):
+    """
+    Bounds of the tiled area: the map's width x height, grown to include
+    any item that lies outside it.
+
+    Args:
+        header (dict): The map's top-level keys.
+        boxes (list): Item boxes.
+
+    Returns:
+        list: [min x, min y, max x, max y]
+    """
+    width, height = header.get('width'), header.get('height')
+    extent = [[0, 0, width, height]] if width and height else []
+    return _union(extent + boxes) or [0, 0, 1, 1]
+
+def grid_tiles(items, boxes, bounds, tile_size=DEFAULT_TILE_SIZE, max_span=DEFAULT_MAX_SPAN):
+    """
+    Split items into fixed-size square tiles.
+
+    Each item belongs to the tile holding its centre. Items that cross a
+    tile border stay in that one tile, and the tile's content bounds
+    grow to cover them, so a client that tests content bounds against
+    the view still loads them. Items that cover more than `max_span`
+    tiles, and SHARED_CATEGORIES, go to the shared tile instead.
+
+    Args:
+        items (list): Item dictionaries.
+        boxes (list): Item boxes, parallel to items.
+        bounds (list): World bounds.
+        tile_size (float): Tile side in map units.
+        max_span (int): Most tiles an item may cover outside the shared tile.
+
+    Returns:
+        tuple: (shared item indices, {key: (tile bounds, item indices)})
+    """
+    shared = []
+    tiles = {}
+    origin_x, origin_y = bounds[0], bounds[1]
+    for index, (item, box) in enumerate(zip(items, boxes)):
+        span = (math.ceil((box[2] - box[0]) / tile_size) or 1) * (math.ceil((box[3] - box[1]) / tile_size) or 1)
+        if item.get('category') in SHARED_CATEGORIES or span > max_span:
+            shared.append(index)
+            continue
+        col = math.floor(((box[0] + box[2]) / 2 - origin_x) / tile_size)
+        row = math.floor(((box[1] + box[3]) / 2 - origin_y) / tile_size)
+        key = f"{col}-{row}"
+        if key not in tiles:
+            x, y = origin_x + col * tile_size, origin_y + row * tile_size
+            tiles[key] = ([x, y, x + tile_size, y + tile_size], [])
+        tiles[key][1].append(index)
+    return shared, tiles
+
+def quadtree_tiles(items, boxes, bounds, max_items=DEFAULT_MAX_ITEMS, max_depth=MAX_QUADTREE_DEPTH):
+    """
+    Split items into the nodes of a quadtree.
+
+    A node with more than `max_items` items is split into quarters, and
+    each item moves down to the quarter that fully contains its box. Items
+    that straddle a split line stay in the node above, so every item is
+    stored exactly once, in the smallest node that contains it, and every
+    tile's content stays within its bounds. Root items, and
+    SHARED_CATEGORIES, form the shared tile. Keys are quadkeys: one digit
+    per level, 0-3 for the top-left, top-right, bottom-left and
+    bottom-right quarter.
+
+    Args:
+        items (list): Item dictionaries.
+        boxes (list): Item boxes, parallel to items.
+        bounds (list): World bounds.
+        max_items (int): Items a node may hold before it is split.
+        max_depth (int): Deepest level.
+
+    Returns:
+        tuple: (shared item indices, {key: (node bounds, item indices)})
+    """
+    shared = [index for index, item in enumerate(items) if item.get('category') in SHARED_CATEGORIES]
+    shared_set = set(shared)
+    tiles = {}
+    pending = [('', bounds, [index for index in range(len(items)) if index not in shared_set])]
+    while pending:
+        key, (x0, y0, x1, y1), indices = pending.pop()
+        if len(indices) <= max_items or len(key) >= max_depth:
+            kept = indices
+        else:
+            mid_x, mid_y = (x0 + x1) / 2, (y0 + y1) / 2
+            quarters = ([x0, y0, mid_x, mid_y], [mid_x, y0, x1, mid_y], [x0, mid_y, mid_x, y1], [mid_x, mid_y, x1, y1])
+            children = ([], [], [], [])
+            kept = []
+            for index in indices:
+                box = boxes[index]
+                if box[2] <= mid_x:
+                    column = 0
+                elif box[0] >= mid_x:
+                    column = 1
+                else:
+                    kept.append(index)
+                    continue
+                if box[3] <= mid_y:
+                    children[column].append(index)
+                elif box[1] >= mid_y:
+                    children[2 + column].append(index)
+                else:
+                    kept.append(index)
+            for quarter, child in enumerate(children):
+                if child:
+                    pending.append((key + str(quarter), quarters[quarter], child))
+        if kept:
+            if key:
+                tiles[key] = ([x0, y0, x1, y1], kept)
+            else:
+                shared.extend(kept)
+    return shared, tiles
+
+def _tile_document(key, bounds, tile_items):
+    """Serialize one tile compactly and return (bytes, sha256 hex digest)."""
+    content = json.dumps({'key': key, 'bounds': bounds, 'items': tile_items}, separators=(',', ':'),
+                         ensure_ascii=False).encode('utf-8')
+    return content, hashlib.sha256(content).hexdigest()
+
+def export_tiles(input_path, output_dir, scheme='grid', tile_size=DEFAULT_TILE_SIZE,
+                 max_items=DEFAULT_MAX_ITEMS, max_span=DEFAULT_MAX_SPAN):
+    """
+    Split a map into tile files plus a manifest.
+
+    The output directory gets `manifest.json` and a `tiles` directory with
+    one compact JSON file per tile, named `<key>.<hash prefix>.json`. A
+    tile's name changes whenever its content does, so tile files can be
+    cached forever and the client only refetches tiles whose hash is new.
+    The manifest holds the map's other top-level keys and, per tile, its
+    bounds, the bounds of its items' footprints (`contentBounds`, what
+    the client should test against the view), the item count, byte size
+    and SHA-256 of the file. The shared tile holds items every view needs.
+    New tiles are written before the manifest is replaced, and only then
+    are tiles the new manifest no longer references removed, so a client
+    reading the manifest never finds its tiles missing.
+
+    Args:
+        input_path (str): Path to the map file (any format iter_json_items reads).
+        output_dir (str): Directory for the manifest and tiles.
+        scheme (str): 'grid' or 'quadtree'.
+        tile_size (float): Grid tile side in map units.
+        max_items (int): Quadtree node capacity.
+        max_span (int): Grid tiles an item may cover before it is shared.
+
+    Returns:
+        dict: The manifest.
+
+    Raises:
+        MapParseError: If the map file is malformed.
+        ValueError: For an unknown scheme or a non-positive tile size.
+    """
+    if scheme not in TILE_SCHEMES:
+        raise ValueError(f"Unknown tile scheme {scheme!r}; expected one of {', '.join(TILE_SCHEMES)}")
+    if tile_size <= 0 or max_items <= 0:
+        raise ValueError("Tile size and quadtree capacity must be positive")
+
+    header = {}
+    items = list(iter_json_items(input_path, header))
+    header.pop('items', None)
+    boxes = _boxes(items)
+    bounds = world_bounds(header, boxes)
+
+    if scheme == 'grid':
+        shared, tiles = grid_tiles(items, boxes, bounds, tile_size, max_span)
+        settings = {'tileSize': tile_size, 'maxSpan': max_span}
+    else:
+        shared, tiles = quadtree_tiles(items, boxes, bounds, max_items)
+        settings = {'maxItems': max_items}
+
+    tile_dir = os.path.join(output_dir, TILE_DIR)
+    os.makedirs(tile_dir, exist_ok=True)
+    written = set()
+
+    def write_tile(key, tile_bounds, indices):
+        content, digest = _tile_document(key, tile_bounds, [items[index] for index in indices])
+        name = f"{key}.{digest[:12]}.json"
+        path = os.path.join(tile_dir, name)
+        # Same name means same content, so an existing file is already right
+        if not os.path.exists(path):
+            with open_atomic(path) as file:
+                file.buffer.write(content)
+        written.add(name)
+        return {
+            'key': key,
+            'bounds': tile_bounds,
+            'contentBounds': _union(boxes[index] for index in indices),
+            'count': len(indices),
+            'bytes': len(content),
+            'hash': digest,
+            'file': f"{TILE_DIR}/{name}"
+        }
+
+    manifest = {
+        'version': TILE_FORMAT_VERSION,
+        'scheme': scheme,
+        **settings,
+        'bounds': bounds,
+        'itemCount': len(items),
+        'map': header,
+        'shared': write_tile(SHARED_KEY, bounds, shared) if shared else None,
+        'tiles': [write_tile(key, *tiles[key]) for key in sorted(tiles)]
+    }
+
+    with open_atomic(os.path.join(output_dir, MANIFEST_NAME)) as file:
+        json.dump(manifest, file, indent=2, ensure_ascii=False)
+
+    for name in os.listdir(tile_dir):
+        if name.endswith('.json') and name not in written:
+            os.remove(os.path.join(tile_dir, name))
+    return manifest
+
+def main():
+    print("Map Tile Exporter")
+    print("=================")
+
+    if len(sys.argv) < 3:
+        print(f"Usage: python map_tiles.py <map.json> <output_dir> [{'|'.join(TILE_SCHEMES)}] [tile size or max items]")
+        return
+
+    input_file, output_dir = sys.argv[1], sys.argv[2]
+    scheme = sys.argv[3] if len(sys.argv) > 3 else 'grid'
+    options = {}
+    if len(sys.argv) > 4:
+        if scheme == 'grid':
+            options['tile_size'] = float(sys.argv[4])
+        else:
+            options['max_items'] = int(sys.argv[4])
+
+    if not os.path.exists(input_file):
+        print(f"File not found: {input_file}")
+        return
+
+    try:
+        manifest = export_tiles(input_file, output_dir, scheme, **options)
+    except (MapParseError, ValueError, OSError) as e:
+        print(f"Export failed: {e}")
+        return
+
+    shared = manifest['shared']['count'] if manifest['shared'] else 0
+    print(f"Wrote {len(manifest['tiles'])} tiles and {shared} shared items "
+          f"for {manifest['itemCount']} items to {output_dir}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,566 @@
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import random
+import ssl
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, quote, urlsplit
+
+from map_cache import file_digest
+from map_seed import SEED_COLUMNS, plot_rows
+from map_validate import iter_validated_items
+from plots2 import MapParseError, iter_json_items, open_atomic
+
+UPLOAD_SOURCES = ('plots', 'items')
+
+# Default table per source; map_items needs the ITEM_COLUMNS columns
+DEFAULT_TABLES = {'plots': 'plots', 'items': 'map_items'}
+
+ITEM_COLUMNS = ('id', 'map_id', 'type', 'category', 'layer_id', 'x', 'y', 'data')
+
+DEFAULT_BATCH_SIZE = 500
+
+# Batches in flight at once, each on its own pooled connection
+DEFAULT_CONCURRENCY = 4
+
+DEFAULT_RETRIES = 5
+
+# First retry delay in seconds, doubled per attempt up to RETRY_MAX_DELAY
+RETRY_BASE_DELAY = 0.5
+RETRY_MAX_DELAY = 30
+
+# Statuses worth retrying; anything else outside 2xx fails the upload
+RETRY_STATUSES = frozenset({408, 429, 500, 502, 503, 504})
+
+REQUEST_TIMEOUT = 60
+
+# Least time between checkpoint writes, in seconds
+CHECKPOINT_INTERVAL = 1.0
+
+CHECKPOINT_VERSION = 1
+
+# plot_rows returns these columns as JSON text already
+_JSON_COLUMNS = frozenset({'position', 'map_position'})
+
+class UploadError(Exception):
+    """A batch was rejected, or could not be sent after all retries."""
+
+    def __init__(self, message, status=None, body=None):
+        super().__init__(message)
+        self.status = status
+        self.body = body
+
+def plot_row_objects(items, map_id=None):
+    """
+    Encode the plot items of a map as plots table rows.
+
+    Args:
+        items (iterable): Item dictionaries.
+        map_id (str): Optional community_maps id stored on every row.
+
+    Yields:
+        str: One JSON object per plot, with the SEED_COLUMNS keys.
+    """
+    for row in plot_rows(items, map_id):
+        yield '{' + ','.join(
+            f'"{column}":{value if column in _JSON_COLUMNS else json.dumps(value)}'
+            for column, value in zip(SEED_COLUMNS, row)
+        ) + '}'
+
+def item_row_objects(items, map_id=None):
+    """
+    Encode map items as rows with the ITEM_COLUMNS keys.
+
+    Every row has the same keys, as PostgREST bulk inserts require; the
+    whole item goes into the `data` column.
+
+    Args:
+        items (iterable): Item dictionaries.
+        map_id (str): Optional community_maps id stored on every row.
+
+    Yields:
+        str: One JSON object per item.
+    """
+    for item in items:
+        yield json.dumps({
+            'id': item.get('id'),
+            'map_id': map_id,
+            'type': item.get('type'),
+            'category': item.get('category'),
+            'layer_id': item.get('layerId', item.get('layer_id')),
+            'x': item.get('x'),
+            'y': item.get('y'),
+            'data': item
+        }, separators=(',', ':'))
+
+class ConnectionPool:
+    """
+    Keep-alive HTTP/1.1 connections to one host, shared by asyncio tasks.
+
+    At most `size` connections are open; a request waits for a free one.
+    A connection that fails or that the server closes is dropped and
+    replaced on the next request.
+    """
+
+    def __init__(self, url, size=DEFAULT_CONCURRENCY):
+        parts = urlsplit(url)
+        if parts.scheme not in ('http', 'https'):
+            raise ValueError(f"Unsupported URL scheme in {url!r}")
+        self.host = parts.hostname
+        self.port = parts.port or (443 if parts.scheme == 'https' else 80)
+        self.ssl = ssl.create_default_context() if parts.scheme == 'https' else None
+        self.host_header = parts.netloc.rpartition('@')[2]
+        self.size = size
+        self.idle = []
+        self.open = 0
+        self.available = asyncio.Semaphore(size)
+
+    async def request(self, method, target, headers, body=b''):
+        """
+        Send one request and read the whole response.
+
+        Args:
+            method (str): HTTP method.
+            target (str): Path and query.
+            headers (dict): Extra request headers.
+            body (bytes): Request body.
+
+        Returns:
+            tuple: (status, response headers with lower-case names, body)
+        """
+        async with self.available:
+            if self.idle:
+                reader, writer = self.idle.pop()
+            else:
+                reader, writer = await asyncio.open_connection(self.host, self.port, ssl=self.ssl)
+                self.open += 1
+            try:
+                lines = [f"{method} {target} HTTP/1.1", f"Host: {self.host_header}", f"Content-Length: {len(body)}"]
+                lines.extend(f"{name}: {value}" for name, value in headers.items())
+                writer.write(("\r\n".join(lines) + "\r\n\r\n").encode('latin-1') + body)
+                await writer.drain()
+                status, response_headers, response_body, keep = await asyncio.wait_for(
+                    self._read_response(reader), REQUEST_TIMEOUT
+                )
+            except BaseException:
+                self._discard(writer)
+                raise
+            if keep:
+                self.idle.append((reader, writer))
+            else:
+                self._discard(writer)
+            return status, response_headers, response_body
+
+    async def _read_response(self, reader):
+        status_line = await reader.readline()
+        if not status_line:
+            raise ConnectionResetError("Connection closed before the response")
+        version, status = status_line.split()[:2]
+        status = int(status)
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+
+        keep = version == b'HTTP/1.1' and headers.get('connection', '').lower() != 'close'
+        if headers.get('transfer-encoding', '').lower() == 'chunked':
+            chunks = []
+            while True:
+                size = int((await reader.readline()).split(b';')[0], 16)
+                if size == 0:
+                    # Trailers end with an empty line
+                    while (await reader.readline()) not in (b'\r\n', b'\n', b''):
+                        pass
+                    break
+                chunks.append(await reader.readexactly(size))
+                await reader.readexactly(2)
+            body = b''.join(chunks)
+        elif 'content-length' in headers:
+            body = await reader.readexactly(int(headers['content-length']))
+        elif status in (204, 304) or status < 200:
+            body = b''
+        else:
+            body = await reader.read()
+            keep = False
+        return status, headers, body, keep
+
+    def _discard(self, writer):
+        self.open -= 1
+        writer.close()
+
+    async def close(self):
+        """Close the idle connections."""
+        while self.idle:
+            _, writer = self.idle.pop()
+            self._discard(writer)
+            try:
+                await writer.wait_closed()
+            except OSError:
+                pass
+
+def _retry_delay(attempt, headers=None):
+    """Exponential backoff with jitter, or the server's Retry-After."""
+    retry_after = (headers or {}).get('retry-after')
+    if retry_after and retry_after.isdigit():
+        return min(RETRY_MAX_DELAY, int(retry_after))
+    return min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** attempt) * random.uniform(0.5, 1)
+
+async def upload_rows(rows, rest_url, table, api_key=None, on_conflict='id', batch_size=DEFAULT_BATCH_SIZE,
+                      concurrency=DEFAULT_CONCURRENCY, retries=DEFAULT_RETRIES, on_commit=None):
+    """
+    Upsert rows into a PostgREST table in concurrent batches.
+
+    Each batch is one `POST /<table>?on_conflict=...` with
+    `Prefer: resolution=merge-duplicates`, so sending a batch again is
+    harmless. At most `concurrency` batches are in flight, and rows are
+    read from `rows` only as batches are sent, so memory stays bounded.
+    Connection errors and RETRY_STATUSES are retried with exponential
+    backoff. Batches finish out of order, but `on_commit` is only told
+    about the longest run of rows that all finished, which is what a
+    checkpoint can safely record.
+
+    Args:
+        rows (iterable): Rows as JSON object text.
+        rest_url (str): PostgREST root, e.g. https://<project>.supabase.co/rest/v1
+        table (str): Target table.
+        api_key (str): Supabase key sent as apikey and bearer token.
+        on_conflict (str): Column(s) identifying existing rows.
+        batch_size (int): Rows per request.
+        concurrency (int): Requests in flight.
+        retries (int): Retries per batch.
+        on_commit (callable): Called with the number of leading rows that
+            are all stored, whenever it grows.
+
+    Returns:
+        int: Number of rows uploaded.
+
+    Raises:
+        UploadError: If a batch is rejected or keeps failing.
+    """
+    if batch_size <= 0 or concurrency <= 0:
+        raise ValueError("Batch size and concurrency must be positive")
+    target = f"{urlsplit(rest_url).path.rstrip('/')}/{quote(table)}?on_conflict={quote(on_conflict)}"
+    headers = {
+        'Content-Type': 'application/json',
+        'Prefer': 'resolution=merge-duplicates,return=minimal'
+    }
+    if api_key:
+        headers['apikey'] = api_key
+        headers['Authorization'] = f"Bearer {api_key}"
+
+    pool = ConnectionPool(rest_url, concurrency)
+
+    async def send(batch):
+        body = ('[' + ','.join(batch) + ']').encode('utf-8')
+        for attempt in range(retries + 1):
+            try:
+                status, response_headers, response_body = await pool.request('POST', target, headers, body)
+            except (OSError, EOFError, asyncio.TimeoutError, ValueError) as e:
+                if attempt == retries:
+                    raise UploadError(f"Could not send a batch of {len(batch)} rows: {e}") from e
+                await asyncio.sleep(_retry_delay(attempt))
+                continue
+            if 200 <= status < 300:
+                return
+            message = response_body.decode('utf-8', 'replace')[:500]
+            if status not in RETRY_STATUSES or attempt == retries:
+                raise UploadError(f"Batch rejected with HTTP {status}: {message}", status, message)
+            await asyncio.sleep(_retry_delay(attempt, response_headers))
+
+    sizes = []
+    finished = set()
+    committed = 0
+    next_commit = 0
+    pending = {}
+    rows = iter(rows)
+
+    def collect(done):
+        nonlocal committed, next_commit
+        for task in done:
+            index = pending.pop(task)
+            task.result()
+            finished.add(index)
+        advanced = False
+        while next_commit in finished:
+            finished.discard(next_commit)
+            committed += sizes[next_commit]
+            next_commit += 1
+            advanced = True
+        if advanced and on_commit:
+            on_commit(committed)
+
+    try:
+        while batch := list(itertools.islice(rows, batch_size)):
+            if len(pending) >= concurrency:
+                done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                collect(done)
+            sizes.append(len(batch))
+            pending[asyncio.create_task(send(batch))] = len(sizes) - 1
+        while pending:
+            done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            collect(done)
+    finally:
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+        await pool.close()
+    return committed
+
+def _load_checkpoint(path, identity):
+    try:
+        with open(path, 'r', encoding='utf-8') as file:
+            checkpoint = json.load(file)
+    except (OSError, ValueError):
+        return 0
+    if checkpoint.get('version') != CHECKPOINT_VERSION or checkpoint.get('identity') != identity:
+        return 0
+    return checkpoint.get('rows_done', 0)
+
+def _save_checkpoint(path, identity, rows_done):
+    with open_atomic(path) as file:
+        json.dump({'version': CHECKPOINT_VERSION, 'identity': identity, 'rows_done': rows_done}, file)
+
+def upload_map(input_path, rest_url, source='plots', table=None, map_id=None, api_key=None,
+               batch_size=DEFAULT_BATCH_SIZE, concurrency=DEFAULT_CONCURRENCY, retries=DEFAULT_RETRIES,
+               checkpoint_path=None, log=None, validate=False):
+    """
+    Stream a map file's plots or items to a PostgREST table.
+
+    With a checkpoint file, the number of leading rows known to be stored
+    is saved as the upload goes, together with the input's content hash
+    and the target. A later run with the same input and target skips
+    those rows. The checkpoint is removed once the upload completes.
+
+    Args:
+        input_path (str): Path to the map file.
+        rest_url (str): PostgREST root URL.
+        source (str): 'plots' (plots table rows, as map_seed writes them)
+            or 'items' (one row per item, see ITEM_COLUMNS).
+        table (str): Target table; defaults to DEFAULT_TABLES[source].
+        map_id (str): Optional community_maps id stored on every row.
+        api_key (str): Supabase key.
+        batch_size (int): Rows per request.
+        concurrency (int): Requests in flight.
+        retries (int): Retries per batch.
+        checkpoint_path (str): Optional checkpoint file.
+        log (callable): Progress output, or None.
+        validate (bool): Check items against the map schemas as they are
+            read, and stop at the first batch with errors.
+
+    Returns:
+        tuple: (rows uploaded by this run, rows skipped from the checkpoint)
+
+    Raises:
+        UploadError: If the upload fails; the checkpoint keeps the progress.
+        MapParseError: If the map file is malformed.
+        MapValidationError: If `validate` is set and the map is invalid.
+        ValueError: For an unknown source.
+    """
+    if source not in UPLOAD_SOURCES:
+        raise ValueError(f"Unknown source {source!r}; expected one of {', '.join(UPLOAD_SOURCES)}")
+    table = table or DEFAULT_TABLES[source]
+    encode = plot_row_objects if source == 'plots' else item_row_objects
+
+    skip = 0
+    identity = None
+    if checkpoint_path:
+        identity = [file_digest(input_path), rest_url, table, source, map_id]
+        skip = _load_checkpoint(checkpoint_path, identity)
+        if skip and log:
+            log(f"Resuming after {skip} rows from {checkpoint_path}")
+
+    last_saved = 0.0
+
+    def on_commit(done):
+        nonlocal last_saved
+        now = time.monotonic()
+        if checkpoint_path and now - last_saved >= CHECKPOINT_INTERVAL:
+            _save_checkpoint(checkpoint_path, identity, skip + done)
+            last_saved = now
+
+    items = iter_validated_items(input_path) if validate else iter_json_items(input_path)
+    rows = itertools.islice(encode(items, map_id), skip, None)
+    uploaded = 0
+
+    def record(done):
+        nonlocal uploaded
+        uploaded = done
+        on_commit(done)
+
+    try:
+        asyncio.run(upload_rows(rows, rest_url, table, api_key, batch_size=batch_size,
+                                concurrency=concurrency, retries=retries, on_commit=record))
+    except BaseException:
+        if checkpoint_path:
+            _save_checkpoint(checkpoint_path, identity, skip + uploaded)
+        raise
+    if checkpoint_path and os.path.exists(checkpoint_path):
+        os.remove(checkpoint_path)
+    return uploaded, skip
+
+class _StandInHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def _reply(self, status, body=b'', content_type='application/json'):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        server = self.server.stand_in
+        parts = urlsplit(self.path)
+        table = parts.path.rstrip('/').rpartition('/')[2]
+        key = parse_qs(parts.query).get('on_conflict', ['id'])[0]
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        with server.lock:
+            server.requests += 1
+            failing = server.fail_every and server.requests % server.fail_every == 0
+        if failing:
+            self._reply(503, b'{"message":"stand-in failure"}')
+            return
+        try:
+            rows = json.loads(body)
+        except ValueError:
+            self._reply(400, b'{"message":"invalid JSON"}')
+            return
+        if isinstance(rows, dict):
+            rows = [rows]
+        merge = 'resolution=merge-duplicates' in self.headers.get('Prefer', '')
+        with server.lock:
+            stored = server.tables.setdefault(table, {})
+            if not merge and any(row.get(key) in stored for row in rows):
+                conflict = True
+            else:
+                conflict = False
+                for row in rows:
+                    stored[row.get(key)] = row
+                server.rows_received += len(rows)
+        if conflict:
+            self._reply(409, b'{"message":"duplicate key value violates unique constraint"}')
+        else:
+            self._reply(201)
+
+    def do_GET(self):
+        table = urlsplit(self.path).path.rstrip('/').rpartition('/')[2]
+        with self.server.stand_in.lock:
+            rows = list(self.server.stand_in.tables.get(table, {}).values())
+        self._reply(200, json.dumps(rows).encode('utf-8'))
+
+class StandInServer:
+    """
+    Local PostgREST stand-in for trying uploads without a database.
+
+    Accepts `POST /<anything>/<table>?on_conflict=<column>` bulk upserts
+    (with `Prefer: resolution=merge-duplicates`; duplicate keys are a 409
+    without it) and `GET /<anything>/<table>` to list the stored rows.
+    With `fail_every`, every n-th POST answers 503, to exercise retries.
+    """
+
+    def __init__(self, host='127.0.0.1', port=0, fail_every=0):
+        self.tables = {}
+        self.requests = 0
+        self.rows_received = 0
+        self.fail_every = fail_every
+        self.lock = threading.Lock()
+        self.server = ThreadingHTTPServer((host, port), _StandInHandler)
+        self.server.daemon_threads = True
+        self.server.stand_in = self
+        self.thread = None
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}/rest/v1"
+
+    def start(self):
+        """Serve in a background thread."""
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+def main():
+    parser = argparse.ArgumentParser(description="Upload map plots or items to a PostgREST/Supabase endpoint.")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    upload = commands.add_parser('upload', help="stream a map file into a table")
+    upload.add_argument('input', help="map file")
+    upload.add_argument('--url', default=(os.environ.get('NEXT_PUBLIC_SUPABASE_URL', '').rstrip('/') + '/rest/v1'
+                                          if os.environ.get('NEXT_PUBLIC_SUPABASE_URL') else None),
+                        help="PostgREST root (default: $NEXT_PUBLIC_SUPABASE_URL/rest/v1)")
+    upload.add_argument('--key', default=os.environ.get('SUPABASE_SERVICE_ROLE_KEY'),
+                        help="API key (default: $SUPABASE_SERVICE_ROLE_KEY)")
+    upload.add_argument('--source', choices=UPLOAD_SOURCES, default='plots')
+    upload.add_argument('--table', help="target table (default: plots or map_items)")
+    upload.add_argument('--map-id', help="community_maps id stored on every row")
+    upload.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+    upload.add_argument('--concurrency', type=int, default=DEFAULT_CONCURRENCY)
+    upload.add_argument('--retries', type=int, default=DEFAULT_RETRIES)
+    upload.add_argument('--checkpoint', help="progress file for resuming an interrupted upload")
+    upload.add_argument('--validate', action='store_true', help="stop at items the app's map schemas reject")
+
+    serve = commands.add_parser('serve', help="run a local stand-in server")
+    serve.add_argument('--port', type=int, default=54321)
+    serve.add_argument('--fail-every', type=int, default=0, help="answer every n-th request with 503")
+
+    args = parser.parse_args()
+
+    print("Map Uploader")
+    print("============")
+
+    if args.command == 'serve':
+        stand_in = StandInServer(port=args.port, fail_every=args.fail_every)
+        print(f"Stand-in PostgREST listening on {stand_in.url}; press Ctrl+C to stop.")
+        try:
+            stand_in.server.serve_forever()
+        except KeyboardInterrupt:
+            print(f"Received {stand_in.rows_received} rows in {stand_in.requests} requests.")
+        return
+
+    if not args.url:
+        print("No endpoint: pass --url or set NEXT_PUBLIC_SUPABASE_URL.")
+        return
+    if not os.path.exists(args.input):
+        print(f"File not found: {args.input}")
+        return
+
+    started = time.perf_counter()
+    try:
+        uploaded, skipped = upload_map(
+            args.input, args.url, args.source, args.table, args.map_id, args.key,
+            args.batch_size, args.concurrency, args.retries, args.checkpoint, log=print, validate=args.validate
+        )
+    except (UploadError, MapParseError, ValueError, OSError) as e:
+        print(f"Upload failed: {e}")
+        if args.checkpoint:
+            print(f"Progress saved to {args.checkpoint}; run again to resume.")
+        sys.exit(1)
+
+    elapsed = time.perf_counter() - started
+    rate = f", {uploaded / elapsed:,.0f} rows/s" if elapsed > 0 else ""
+    print(f"Uploaded {uploaded} rows{f' (skipped {skipped} already stored)' if skipped else ''} in {elapsed:.2f}s{rate}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,571 @@
+import json
+import os
+import re
+import sys
+
+from map_normalize import to_snake_case_key
+from plots2 import MapParseError, iter_json_items
+
+# The schemas below mirror lib/types/map-schemas.ts. Each field maps to
+# (kind, required, minimum, maximum); kinds are 'string', 'uuid',
+# 'number', 'boolean' and 'json'. As with zod, unknown keys are allowed,
+# optional fields may be left out but not set to null, and numbers must
+# not be NaN. Database exports (map_data) use the same schemas with
+# snake_case keys, as the app converts them before parsing.
+
+# MapItemSchema
+MAP_ITEM_SCHEMA = {
+    'id': ('string', True, None, None),
+    'type': ('string', True, None, None),
+    'category': ('string', True, None, None),
+    'x': ('number', True, None, None),
+    'y': ('number', True, None, None),
+    'width': ('number', False, 0.1, None),
+    'height': ('number', False, 0.1, None),
+    'rotation': ('number', False, None, None),
+    'scale': ('number', False, 0.1, None),
+    'color': ('string', False, None, None),
+    'layerId': ('string', True, None, None),
+    'elevationOffset': ('number', False, None, None),
+    'properties': ('json', False, None, None)
+}
+
+# MapLayerSchema
+MAP_LAYER_SCHEMA = {
+    'id': ('uuid', True, None, None),
+    'name': ('string', True, None, None),
+    'zIndex': ('number', True, None, None),
+    'visible': ('boolean', False, None, None)
+}
+
+# MapEnvironmentSchema
+MAP_ENVIRONMENT_SCHEMA = {
+    'backgroundColor': ('string', False, None, None),
+    'starsIntensity': ('number', False, 0, 1),
+    'ambientLightColor': ('string', False, None, None),
+    'ambientLightIntensity': ('number', False, 0, 2),
+    'directionalLightColor': ('string', False, None, None),
+    'directionalLightIntensity': ('number', False, 0, 2)
+}
+
+# The scalar fields of MapDataSchema; environment, layers and items are checked separately
+MAP_DATA_SCHEMA = {
+    'id': ('uuid', False, None, None),
+    'name': ('string', True, None, None),
+    'description': ('string', False, None, None),
+    'width': ('number', True, 1, None),
+    'height': ('number', True, 1, None)
+}
+
+DEFAULT_BATCH_SIZE = 10000
+
+# Errors kept per validation; the rest are only counted
+DEFAULT_MAX_ERRORS = 1000
+
+# Same pattern as zod's uuid check
+_UUID = re.compile(r'[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}')
+
+_MISSING = object()
+
+# JSON values that need no recursive check
+_JSON_SCALAR_TYPES = frozenset({str, int, float, bool, type(None)})
+
+_compiled = {}
+
+_snake_case_schemas = {}
+
+class MapValidationError(ValueError):
+    """A map does not match the map schemas."""
+
+    def __init__(self, errors, error_count=None):
+        self.errors = errors
+        self.error_count = error_count if error_count is not None else len(errors)
+        shown = '; '.join(format_error(error) for error in errors[:3])
+        more = f" (and {self.error_count - 3} more)" if self.error_count > 3 else ""
+        super().__init__(f"{self.error_count} validation error(s): {shown}{more}")
+
+def format_error(error):
+    """One-line description of an error dict."""
+    label = f" (id {error['id']!r})" if error.get('id') is not None else ""
+    return f"{error['path']}{label}: {error['message']}"
+
+def schema_keys(schema, snake_case=False):
+    """
+    The schema itself, or the same schema with snake_case field names.
+
+    Args:
+        schema (dict): Field specs with camelCase names.
+        snake_case (bool): Whether the data uses snake_case keys.
+
+    Returns:
+        dict: Field specs; the same object on every call, so compiled
+            checks are reused.
+    """
+    if not snake_case:
+        return schema
+    converted = _snake_case_schemas.get(id(schema))
+    if converted is None or converted[0] is not schema:
+        converted = _snake_case_schemas[id(schema)] = (
+            schema, {to_snake_case_key(field): spec for field, spec in schema.items()}
+        )
+    return converted[1]
+
+def _received(value):
+    """Type name as zod reports it."""
+    if value is _MISSING:
+        return 'undefined'
+    if value is None:
+        return 'null'
+    if isinstance(value, bool):
+        return 'boolean'
+    if isinstance(value, (int, float)):
+        return 'nan' if value != value else 'number'
+    if isinstance(value, str):
+        return 'string'
+    if isinstance(value, (list, tuple)):
+        return 'array'
+    if isinstance(value, dict):
+        return 'object'
+    return type(value).__name__
+
+def _is_json(value):
+    # Loops rather than all() over generators: this runs for every item's properties
+    kind = type(value)
+    if kind is dict:
+        for key, element in value.items():
+            if type(key) is not str or (type(element) not in _JSON_SCALAR_TYPES and not _is_json(element)):
+                return False
+        return True
+    if kind is list:
+        for element in value:
+            if type(element) not in _JSON_SCALAR_TYPES and not _is_json(element):
+                return False
+        return True
+    return kind in _JSON_SCALAR_TYPES
+
+def _field_message(value, kind, required, minimum, maximum):
+    """Why a value does not match its field, or None if it does."""
+    if value is _MISSING:
+        return "Required" if required else None
+    if kind == 'json':
+        return None if _is_json(value) else f"Expected JSON, received {_received(value)}"
+    expected = 'string' if kind == 'uuid' else kind
+    received = _received(value)
+    if received != expected:
+        return f"Expected {expected}, received {received}"
+    if kind == 'uuid' and not _UUID.fullmatch(value):
+        return "Invalid uuid"
+    if minimum is not None and value < minimum:
+        return f"Number must be greater than or equal to {minimum}"
+    if maximum is not None and value > maximum:
+        return f"Number must be less than or equal to {maximum}"
+    return None
+
+def object_errors(value, schema, path):
+    """
+    Check one object against a schema, field by field.
+
+    This is the slow path, used to explain the objects compile_schema
+    rejected.
+
+    Args:
+        value: The object.
+        schema (dict): Field specs.
+        path (str): Dotted path of the object, used in the errors.
+
+    Returns:
+        list: Error dicts with 'path', 'id' and 'message'.
+    """
+    if type(value) is not dict:
+        return [{'path': path, 'id': None, 'message': f"Expected object, received {_received(value)}"}]
+    item_id = value.get('id')
+    errors = []
+    for field, spec in schema.items():
+        message = _field_message(value.get(field, _MISSING), *spec)
+        if message:
+            errors.append({'path': f"{path}.{field}" if path else field,
+                           'id': item_id if type(item_id) is str else None, 'message': message})
+    return errors
+
+def _condition(field, kind, required, minimum, maximum):
+    """Python expression that is true when `item` has a valid `field`."""
+    # A required field is read once, and only bound to `v` if it is needed again
+    reread = kind in ('number', 'uuid', 'json')
+    if not required:
+        value = 'v'
+    elif reread:
+        value = f"(v := item[{field!r}])"
+    else:
+        value = f"item[{field!r}]"
+    if kind == 'json':
+        # Containers get the same recursive check as the slow path
+        check = f'(type({value}) in _JSON_SCALAR_TYPES or _is_json(v))'
+    elif kind == 'number':
+        # Exact type tests are cheaper than a set lookup, and ints (which
+        # exclude bool) cannot be NaN
+        if minimum is None and maximum is None:
+            check = f'(type({value}) is int or type(v) is float and v == v)'
+        else:
+            # The comparisons reject NaN
+            check = f'(type({value}) is int or type(v) is float)'
+            if minimum is not None:
+                check += f' and v >= {minimum!r}'
+            if maximum is not None:
+                check += f' and v <= {maximum!r}'
+    elif kind == 'uuid':
+        check = f'type({value}) is str and _uuid(v) is not None'
+    elif kind == 'boolean':
+        check = f'type({value}) is bool'
+    elif kind == 'string':
+        check = f'type({value}) is str'
+    else:
+        raise ValueError(f"Unknown field kind {kind!r} for {field!r}")
+    if required:
+        return f"({check})"
+    return f"((v := item.get({field!r}, _MISSING)) is _MISSING or {check})"
+
+def compile_schema(schema):
+    """
+    Compile a schema into a function that checks a batch of objects.
+
+    The schema becomes the source of one Python function with all field
+    checks inlined into a single expression per object, so checking a
+    valid object costs a handful of dict lookups and type tests; the only
+    call is the recursive check of 'json' fields holding an object or
+    array, which gives the same verdict as the slow path. Compiled
+    functions are cached per schema object.
+
+    Args:
+        schema (dict): Field specs.
+
+    Returns:
+        callable: check(objects, start) returning the indices (counted
+            from start) of the objects that do not match.
+    """
+    compiled = _compiled.get(id(schema))
+    if compiled is not None and compiled[0] is schema:
+        return compiled[1]
+    conditions = [_condition(field, *spec) for field, spec in schema.items()]
+    source = (
+        # Constants are bound as defaults so the loop reads them as locals
+        "def check(objects, start, _MISSING=_MISSING, _JSON_SCALAR_TYPES=_JSON_SCALAR_TYPES,\n"
+        "          _is_json=_is_json, _uuid=_uuid, type=type, dict=dict, str=str, bool=bool, int=int,\n"
+        "          float=float):\n"
+        "    bad = []\n"
+        "    for index, item in enumerate(objects, start):\n"
+        "        try:\n"
+        f"            if type(item) is dict and {' and '.join(conditions) or 'True'}:\n"
+        "                continue\n"
+        "        except KeyError:\n"
+        "            pass\n"
+        "        bad.append(index)\n"
+        "    return bad\n"
+    )
+    namespace = {'_MISSING': _MISSING, '_JSON_SCALAR_TYPES': _JSON_SCALAR_TYPES,
+                 '_is_json': _is_json, '_uuid': _UUID.fullmatch}
+    exec(compile(source, f"<schema {len(schema)} fields>", 'exec'), namespace)
+    _compiled[id(schema)] = (schema, namespace['check'])
+    return namespace['check']
+
+class ItemValidator:
+    """
+    Validate the items of a map in batches, across calls.
+
+    Besides the MapItemSchema checks, ids must be unique over all items
+    seen, and every layerId must name one of the map's layers. Layers may
+    be given late, since map files can list them after the items; unknown
+    layers are reported by finish().
+    """
+
+    def __init__(self, layer_ids=None, snake_case=False, max_errors=DEFAULT_MAX_ERRORS):
+        """
+        Args:
+            layer_ids (iterable): Ids of the map's layers, or None to skip
+                the layer check unless finish() gets them.
+            snake_case (bool): Whether items use snake_case keys.
+            max_errors (int): Errors kept; later ones are only counted.
+        """
+        self.layer_ids = set(layer_ids) if layer_ids is not None else None
+        self.schema = schema = schema_keys(MAP_ITEM_SCHEMA, snake_case)
+        self.layer_field = 'layer_id' if snake_case else 'layerId'
+        self.max_errors = max_errors
+        self.errors = []
+        self.error_count = 0
+        self.count = 0
+        self._check = compile_schema(schema)
+        self._ids = set()
+        # First item index of every layerId referenced so far
+        self._layers_used = {}
+
+    def _record(self, errors):
+        self.error_count += len(errors)
+        room = self.max_errors - len(self.errors)
+        if room > 0:
+            self.errors.extend(errors[:room])
+        return errors
+
+    def check_batch(self, items):
+        """
+        Validate the next batch of items.
+
+        Args:
+            items (list): Item dictionaries.
+
+        Returns:
+            list: Error dicts for this batch (paths are 'items.<index>.<field>').
+        """
+        start = self.count
+        self.count += len(items)
+        bad = self._check(items, start)
+        errors = []
+        if not bad:
+            ids = [item['id'] for item in items]
+            unique = set(ids)
+            if len(unique) == len(ids) and self._ids.isdisjoint(unique):
+                self._ids |= unique
+            else:
+                errors.extend(self._duplicate_ids(items, start))
+            layer_field = self.layer_field
+            layers = {item[layer_field] for item in items}
+            if not layers.issubset(self._layers_used):
+                for index, item in enumerate(items, start):
+                    self._layers_used.setdefault(item[layer_field], index)
+        else:
+            bad_set = set(bad)
+            for index in bad:
+                errors.extend(object_errors(items[index - start], self.schema, f"items.{index}"))
+            errors.extend(self._duplicate_ids(items, start))
+            for index, item in enumerate(items, start):
+                if index not in bad_set:
+                    self._layers_used.setdefault(item[self.layer_field], index)
+        if self.layer_ids is not None:
+            errors.extend(self._unknown_layers(self.layer_ids, start))
+        return self._record(errors)
+
+    def _duplicate_ids(self, items, start):
+        errors = []
+        for index, item in enumerate(items, start):
+            item_id = item.get('id') if type(item) is dict else None
+            if type(item_id) is not str:
+                continue
+            if item_id in self._ids:
+                errors.append({'path': f"items.{index}.id", 'id': item_id, 'message': "Duplicate id"})
+            else:
+                self._ids.add(item_id)
+        return errors
+
+    def _unknown_layers(self, layer_ids, since=0):
+        """One error per unknown layerId first used at or after `since`."""
+        return [
+            {'path': f"items.{index}.{self.layer_field}", 'id': None, 'message': f"Unknown layer {layer!r}"}
+            for layer, index in self._layers_used.items()
+            if index >= since and layer not in layer_ids
+        ]
+
+    def finish(self, layer_ids=None):
+        """
+        Check the layer references once all items have been seen.
+
+        Args:
+            layer_ids (iterable): The map's layer ids, if they were not
+                known when the validator was created.
+
+        Returns:
+            list: Errors for layers referenced but not defined.
+        """
+        if layer_ids is None or self.layer_ids is not None:
+            return []
+        return self._record(self._unknown_layers(set(layer_ids)))
+
+def header_errors(header, snake_case=False):
+    """
+    Check the top-level keys of a map against MapDataSchema.
+
+    A header with no keys besides `items` (a bare item list, as
+    plots2 writes in leading-comma mode) has nothing to check.
+
+    Args:
+        header (dict): The map's top-level keys.
+        snake_case (bool): Whether the map uses snake_case keys.
+
+    Returns:
+        tuple: (errors, layer ids or None if the map has no layers array)
+    """
+    if not set(header) - {'items'}:
+        return [], None
+    errors = object_errors(header, schema_keys(MAP_DATA_SCHEMA, snake_case), '')
+    environment = header.get('environment', _MISSING)
+    if environment is not _MISSING:
+        errors.extend(object_errors(environment, schema_keys(MAP_ENVIRONMENT_SCHEMA, snake_case), 'environment'))
+    layers = header.get('layers', _MISSING)
+    if layers is _MISSING:
+        return errors, None
+    if type(layers) is not list:
+        errors.append({'path': 'layers', 'id': None, 'message': f"Expected array, received {_received(layers)}"})
+        return errors, None
+    for index, layer in enumerate(layers):
+        errors.extend(object_errors(layer, schema_keys(MAP_LAYER_SCHEMA, snake_case), f"layers.{index}"))
+    return errors, {layer.get('id') for layer in layers if type(layer) is dict}
+
+def validate_map(data, snake_case=None, max_errors=DEFAULT_MAX_ERRORS, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Validate a loaded map.
+
+    Args:
+        data (dict): The map, with an `items` list (or MapItems).
+        snake_case (bool): Whether the map uses snake_case keys; by
+            default, whether its first item has `layer_id` but no `layerId`.
+        max_errors (int): Errors kept; later ones are only counted.
+        batch_size (int): Items checked per batch.
+
+    Returns:
+        tuple: (errors, total error count)
+    """
+    items = data.get('items', _MISSING)
+    if snake_case is None:
+        first = next(iter(items), None) if items is not _MISSING else None
+        snake_case = type(first) is dict and 'layer_id' in first and 'layerId' not in first
+    errors, layer_ids = header_errors(data, snake_case)
+    if items is _MISSING:
+        errors.append({'path': 'items', 'id': None, 'message': "Required"})
+        return errors, len(errors)
+    validator = ItemValidator(layer_ids, snake_case, max(0, max_errors - len(errors)))
+    if type(items) is list:
+        for start in range(0, len(items), batch_size):
+            validator.check_batch(items[start:start + batch_size])
+    else:
+        batch = []
+        for item in items:
+            batch.append(item)
+            if len(batch) == batch_size:
+                validator.check_batch(batch)
+                batch = []
+        if batch:
+            validator.check_batch(batch)
+    return errors + validator.errors, len(errors) + validator.error_count
+
+def iter_validated_items(file_path, header=None, batch_size=DEFAULT_BATCH_SIZE, strict=True, report=None):
+    """
+    Stream the items of a map file like iter_json_items, validating them on the way.
+
+    Items are checked a batch at a time before the batch is yielded. In
+    strict mode the first batch with errors raises, before any of its
+    items are yielded; the header and the layer references (layers may
+    come after the items) raise once the file is done. Items of map_data
+    exports are checked with snake_case keys.
+
+    Args:
+        file_path (str): Path to the map file.
+        header (dict): Optional dict that receives the other top-level keys.
+        batch_size (int): Items per batch.
+        strict (bool): Raise MapValidationError on errors instead of only
+            collecting them.
+        report (dict): Optional dict that receives 'items', 'errors' and
+            'error_count' once the file is done (or validation fails).
+
+    Yields:
+        dict: Each item.
+
+    Raises:
+        MapValidationError: In strict mode, if the map is invalid.
+        MapParseError: If the file is malformed.
+    """
+    if header is None:
+        header = {}
+    if report is None:
+        report = {}
+    wrapper = {}
+    validator = None
+    batch = []
+
+    def flush():
+        errors = validator.check_batch(batch)
+        report.update(items=validator.count, errors=validator.errors, error_count=validator.error_count)
+        if errors and strict:
+            raise MapValidationError(validator.errors, validator.error_count)
+
+    for item in iter_json_items(file_path, header, wrapper=wrapper):
+        if validator is None:
+            # Keys before the items are known by now
+            layers = header.get('layers')
+            validator = ItemValidator({layer.get('id') for layer in layers if type(layer) is dict}
+                                      if type(layers) is list else None, 'map_data' in wrapper)
+        batch.append(item)
+        if len(batch) == batch_size:
+            flush()
+            yield from batch
+            batch = []
+    if validator is None:
+        validator = ItemValidator(snake_case='map_data' in wrapper)
+    if batch:
+        flush()
+        yield from batch
+
+    errors, layer_ids = header_errors(header, 'map_data' in wrapper)
+    if 'items' not in header:
+        errors.append({'path': 'items', 'id': None, 'message': "Required"})
+    validator.finish(layer_ids)
+    errors.extend(validator.errors)
+    error_count = len(errors) - len(validator.errors) + validator.error_count
+    report.update(items=validator.count, errors=errors, error_count=error_count)
+    if errors and strict:
+        raise MapValidationError(errors, error_count)
+
+def validate_map_file(file_path, batch_size=DEFAULT_BATCH_SIZE):
+    """
+    Validate a map file without loading it whole.
+
+    Args:
+        file_path (str): Path to the map file.
+        batch_size (int): Items per batch.
+
+    Returns:
+        dict: 'items' (count), 'errors' (up to DEFAULT_MAX_ERRORS) and
+            'error_count'.
+
+    Raises:
+        MapParseError: If the file is malformed.
+    """
+    report = {}
+    for _ in iter_validated_items(file_path, batch_size=batch_size, strict=False, report=report):
+        pass
+    return report
+
+def main():
+    print("Map Validator")
+    print("=============")
+
+    if len(sys.argv) < 2:
+        print("Usage: python map_validate.py <map.json> [report.json]")
+        return
+
+    input_file = sys.argv[1]
+    report_file = sys.argv[2] if len(sys.argv) > 2 else None
+
+    if not os.path.exists(input_file):
+        print(f"File not found: {input_file}")
+        return
+
+    try:
+        report = validate_map_file(input_file)
+    except (MapParseError, OSError) as e:
+        print(f"Validation failed: {e}")
+        sys.exit(1)
+
+    if report_file:
+        with open(report_file, 'w', encoding='utf-8') as file:
+            json.dump(report, file, indent=2)
+        print(f"Saved validation report to {report_file}")
+
+    if not report['error_count']:
+        print(f"All {report['items']} items are valid.")
+        return
+    print(f"{report['error_count']} error(s) in {report['items']} items:")
+    for error in report['errors'][:20]:
+        print(f"  - {format_error(error)}")
+    if report['error_count'] > 20:
+        print(f"  ... and {report['error_count'] - 20} more")
+    sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,573 @@
+import bisect
+import json
+import os
+import sys
+import time
+from collections import defaultdict
+
+from plots2 import (
+    MapParseError, analyze_group, generate_missing_items, id_sort_key,
+    open_atomic, parse_item_id, text_tokenizer
+)
+
+# Seconds between polls of the watched files
+WATCH_INTERVAL = 0.1
+
+# A file must keep the same size and mtime this long before it is processed,
+# so an editor's multi-step save is handled once
+WATCH_DEBOUNCE = 0.05
+
+# Compared at a time when looking for the changed part of a file
+_COMPARE_CHUNK = 1 << 16
+
+# Smallest rank gap before ranks are renumbered
+_MIN_RANK_GAP = 1e-6
+
+class _Entry:
+    """One item of the merged output, with everything needed to place it."""
+
+    __slots__ = ('item', 'key', 'chunk', 'parsed', 'rank')
+
+    def __init__(self, item, key, parsed=None, rank=None):
+        self.item = item
+        self.key = key
+        self.parsed = parsed
+        self.rank = rank
+        # What write_leading_comma_items writes for the item, encoded
+        self.chunk = json.dumps(item, indent=2).replace("\n", "\n    ").encode('utf-8')
+
+def _common_prefix(a, b):
+    """Length of the common prefix of two byte strings."""
+    limit = min(len(a), len(b))
+    low = 0
+    while low < limit:
+        high = min(low + _COMPARE_CHUNK, limit)
+        if a[low:high] != b[low:high]:
+            break
+        low = high
+    else:
+        return limit
+    # Bisect within the first differing chunk
+    while high - low > 1:
+        middle = (low + high) // 2
+        if a[low:middle] == b[low:middle]:
+            low = middle
+        else:
+            high = middle
+    return low
+
+def _common_suffix(a, b, limit):
+    """Length of the common suffix of two byte strings, at most `limit`."""
+    length_a, length_b = len(a), len(b)
+    low = 0
+    while low < limit:
+        high = min(low + _COMPARE_CHUNK, limit)
+        if a[length_a - high:length_a - low] != b[length_b - high:length_b - low]:
+            break
+        low = high
+    else:
+        return limit
+    while high - low > 1:
+        middle = (low + high) // 2
+        if a[length_a - middle:length_a - low] == b[length_b - middle:length_b - low]:
+            low = middle
+        else:
+            high = middle
+    return low
+
+def _byte_offsets(text, positions):
+    """Convert ascending character offsets in text to UTF-8 byte offsets."""
+    if text.isascii():
+        return positions
+    offsets = []
+    previous = total = 0
+    for position in positions:
+        total += len(text[previous:position].encode('utf-8'))
+        previous = position
+        offsets.append(total)
+    return offsets
+
+def _read_items(tokenizer, need_separator, items, spans):
+    """
+    Read array elements up to ']' or the end of the text.
+
+    Returns whether a separator is still needed before a following item.
+    """
+    while True:
+        if tokenizer.gap():
+            need_separator = False
+        char = tokenizer.buf[tokenizer.pos:tokenizer.pos + 1]
+        if char in (']', ''):
+            return need_separator
+        if need_separator:
+            raise tokenizer.error("Expected ',' between items")
+        start = tokenizer.pos
+        items.append(tokenizer.read_value())
+        spans.append(start)
+        spans.append(tokenizer.pos)
+        need_separator = True
+
+def parse_item_spans(text):
+    """
+    Parse a map document and locate each item in the text.
+
+    Accepts the same dialect as iter_json_items, for documents whose top
+    level is an object.
+
+    Args:
+        text (str): The document.
+
+    Returns:
+        tuple: (header dict, items, start and end offset of each item as one
+            flat list, and the offsets just inside the items array's
+            brackets), or None for other documents, such as map_data
+            exports.
+
+    Raises:
+        MapParseError: If the document is malformed.
+    """
+    tokenizer = text_tokenizer(text)
+    if tokenizer.peek() != '{':
+        return None
+    tokenizer.pos += 1
+    header = {}
+    items, spans, bounds = [], [], None
+    need_separator = False
+    while True:
+        if tokenizer.separators():
+            need_separator = False
+        if tokenizer.peek() == '}':
+            tokenizer.pos += 1
+            break
+        if need_separator:
+            raise tokenizer.error("Expected ',' between members")
+        key = tokenizer.read_key()
+        tokenizer.expect(':')
+        if key == 'items' and bounds is None and tokenizer.peek() == '[':
+            tokenizer.pos += 1
+            header['items'] = []
+            start = tokenizer.pos
+            _read_items(tokenizer, False, items, spans)
+            if not tokenizer.buf[tokenizer.pos:tokenizer.pos + 1]:
+                raise tokenizer.error("Unexpected end of file inside items array")
+            bounds = (start, tokenizer.pos)
+            tokenizer.pos += 1
+        else:
+            header[key] = tokenizer.read_value()
+        need_separator = True
+    if tokenizer.peek():
+        raise tokenizer.error("Unexpected data after the top-level object")
+    if bounds is None:
+        return None
+    return header, items, spans, bounds
+
+class WatchedMap:
+    """
+    Incrementally maintained gap-filled output of one map file.
+
+    Keeps what a plots2 run computes (items, ID groups, patterns,
+    generated items and the merged, sorted output) and updates only what
+    an edit touches. The changed part of the file is found by comparing
+    the new text with the previous one, and only the items overlapping it
+    are parsed again. Patterns are recomputed only for the ID prefixes of
+    those items, plus the grids those prefixes belong to. Generated items
+    and the output order are then patched by bisection. The output is
+    byte-identical to a non-interactive plots2 run on the same file.
+    Edits outside the items array, and map_data exports, take a full
+    rebuild. Like a plots2 run, each output can be checked for generated
+    items that overlap others and against the map schemas before it is
+    saved.
+    """
+
+    def __init__(self, input_path, output_path=None, overlaps=None, validate=False):
+        """
+        Args:
+            input_path (str): The map file.
+            output_path (str): Defaults to '<name>_complete.json'.
+            overlaps (str): None, 'report' or 'strict' (see plots2's
+                --check-overlaps and --strict-overlaps).
+            validate (bool): Whether to refuse to save output that does not
+                match the map schemas (see plots2's --validate).
+        """
+        self.input_path = input_path
+        self.output_path = output_path or f"{os.path.splitext(input_path)[0]}_complete.json"
+        self.overlaps = overlaps
+        self.validate = validate
+        self.data = None
+
+    def _reset(self):
+        # Raw file content; item positions are byte offsets into it
+        self.data = None
+        self.header = {}
+        self.entries = []
+        self.starts = []
+        self.ends = []
+        self.bounds = None
+        self.id_counts = defaultdict(int)
+        # ID prefix -> entries, and grid template -> {coordinates: prefix}
+        self.prefixes = defaultdict(list)
+        self.cells = defaultdict(dict)
+        self.patterns = {}
+        self.generated = {}
+        self.order_keys = []
+        self.order_chunks = []
+        # Output moves ('place' or 'unplace', entry) not yet applied
+        self.moves = []
+
+    def refresh(self):
+        """
+        Bring the output up to date with the input file.
+
+        Returns:
+            dict: What was done: 'mode' ('full', 'incremental' or
+                'unchanged'), 'parsed' (items parsed), 'patterns',
+                'generated', 'items', 'saved' and 'seconds', plus
+                'conflicts' when checking overlaps; or with an 'error' if
+                the file could not be processed or the output failed its
+                checks (the previous output is kept).
+        """
+        started = time.perf_counter()
+        try:
+            with open(self.input_path, 'rb') as file:
+                data = file.read()
+        except OSError as e:
+            return {'error': f"Failed to read {self.input_path}: {e}"}
+        data = data.removeprefix(b'\xef\xbb\xbf')
+
+        try:
+            if self.data is None:
+                summary = self._rebuild(data)
+            elif data == self.data:
+                summary = {'mode': 'unchanged', 'parsed': 0}
+            else:
+                summary = self._update(data)
+                if summary is None:
+                    summary = self._rebuild(data)
+        except (MapParseError, UnicodeDecodeError) as e:
+            # The previous output stays; the next change is parsed in full
+            self.data = None
+            return {'error': f"Failed to parse {self.input_path}: {e}"}
+
+        summary['patterns'] = len(self.patterns)
+        summary['generated'] = sum(len(entries) for entries in self.generated.values())
+        summary['items'] = len(self.order_chunks)
+        summary['saved'] = False
+        if summary['mode'] != 'unchanged':
+            if not self.entries:
+                summary['error'] = "No items found in the JSON data."
+            elif not self.patterns:
+                summary['error'] = "No patterns detected in the existing items."
+            else:
+                problem = self._check(summary)
+                if problem:
+                    summary['error'] = problem
+                else:
+                    self.save()
+                    summary['saved'] = True
+        summary['seconds'] = time.perf_counter() - started
+        return summary
+
+    def save(self):
+        """Write the merged items in the leading-comma format, atomically."""
+        with open_atomic(self.output_path) as file:
+            # The items are already encoded, so write bytes under the text layer
+            file.flush()
+            raw = file.buffer
+            raw.write(b'{\n  "items": [')
+            if self.order_chunks:
+                raw.write(b'\n    ')
+                raw.write(b'\n    ,'.join(self.order_chunks))
+            raw.write(b'\n  ]\n}')
+
+    def _check(self, summary):
+        """Run the requested overlap and schema checks; returns why not to save, or None."""
+        if not self.overlaps and not self.validate:
+            return None
+        generated = [entry.item for entries in self.generated.values() for entry in entries]
+        items = [entry.item for entry in self.entries] + generated
+        if self.overlaps:
+            from map_overlaps import validate_overlaps
+            conflicts = validate_overlaps(items, involving={item.get('id') for item in generated})
+            summary['conflicts'] = len(conflicts)
+            if conflicts and self.overlaps == 'strict':
+                return (f"Not saving: {len(conflicts)} overlapping pair(s) involve generated items "
+                        f"(--strict-overlaps), e.g. {conflicts[0]['ids'][0]} <-> {conflicts[0]['ids'][1]}")
+        if self.validate:
+            from map_validate import format_error, validate_map
+            errors, error_count = validate_map(dict(self.header, items=items))
+            if errors:
+                return (f"Not saving: {error_count} validation error(s) (--validate), "
+                        f"e.g. {format_error(errors[0])}")
+        return None
+
+    def _rebuild(self, data):
+        self._reset()
+        text = data.decode('utf-8')
+        parsed = parse_item_spans(text)
+        if parsed is None:
+            # Not a plain map object; fall back to the streaming parser
+            from plots2 import iter_json_items
+            items = list(iter_json_items(self.input_path, self.header))
+            offsets = [0, 0] * len(items)
+        else:
+            self.header, items, spans, bounds = parsed
+            offsets = _byte_offsets(text, spans + list(bounds))
+            self.bounds = tuple(offsets[-2:])
+            self.data = data
+        added = [self._entry(item, float(rank)) for rank, item in enumerate(items, 1)]
+        self.entries = added
+        self.starts = offsets[0:2 * len(items):2]
+        self.ends = offsets[1:2 * len(items):2]
+        self._regroup([], added)
+        self._reorder()
+        return {'mode': 'full', 'parsed': len(items)}
+
+    def _update(self, data):
+        """Splice in the items of the changed region, or return None to rebuild."""
+        old = self.data
+        prefix = _common_prefix(old, data)
+        suffix = _common_suffix(old, data, min(len(old), len(data)) - prefix)
+        old_end = len(old) - suffix
+        array_start, array_end = self.bounds
+        if prefix < array_start or old_end > array_end:
+            return None
+
+        first = bisect.bisect_right(self.ends, prefix)
+        last = bisect.bisect_left(self.starts, old_end, first)
+        delta = len(data) - len(old)
+        region_start = self.ends[first - 1] if first else array_start
+        region_end = (self.starts[last] if last < len(self.starts) else array_end) + delta
+
+        region = data[region_start:region_end].decode('utf-8')
+        tokenizer = text_tokenizer(region)
+        items, spans = [], []
+        need_separator = _read_items(tokenizer, first > 0, items, spans)
+        spans = [region_start + offset for offset in _byte_offsets(region, spans)]
+        if tokenizer.pos < len(tokenizer.buf):
+            # A ']' inside the region: the array itself changed shape
+            return None
+        if need_separator and last < len(self.entries):
+            raise tokenizer.error("Expected ',' between items")
+
+        # New items get ranks between their neighbours, keeping file order
+        low = self.entries[first - 1].rank if first else 0.0
+        high = self.entries[last].rank if last < len(self.entries) else low + len(items) + 1
+        step = (high - low) / (len(items) + 1)
+        if items and step < _MIN_RANK_GAP:
+            # Too many edits at one spot; renumber everything
+            return None
+        removed = self.entries[first:last]
+        added = [self._entry(item, low + step * (position + 1)) for position, item in enumerate(items)]
+
+        self.entries[first:last] = added
+        self.starts[first:last] = spans[0::2]
+        self.ends[first:last] = spans[1::2]
+        if delta:
+            tail = first + len(added)
+            self.starts[tail:] = [start + delta for start in self.starts[tail:]]
+            self.ends[tail:] = [end + delta for end in self.ends[tail:]]
+        self.bounds = (array_start, array_end + delta)
+        self.data = data
+        self._regroup(removed, added)
+        self._apply_moves()
+        return {'mode': 'incremental', 'parsed': len(items)}
+
+    def _entry(self, item, rank):
+        item_id = item.get('id')
+        return _Entry(item, (id_sort_key(item_id or ''), 0, rank), parse_item_id(item_id), rank)
+
+    def _regroup(self, removed, added):
+        """Update groups for the removed and added entries, then their patterns."""
+        touched_prefixes = set()
+        touched_templates = set()
+        for entry in removed:
+            self.id_counts[entry.item.get('id')] -= 1
+            self.moves.append(('unplace', entry))
+            if entry.parsed:
+                prefix, _, template, coordinates = entry.parsed
+                members = self.prefixes[prefix]
+                members.remove(entry)
+                touched_prefixes.add(prefix)
+                if coordinates:
+                    touched_templates.add(template)
+                    if not members:
+                        del self.cells[template][coordinates]
+        for entry in added:
+            self.id_counts[entry.item.get('id')] += 1
+            self.moves.append(('place', entry))
+            if entry.parsed:
+                prefix, _, template, coordinates = entry.parsed
+                self.prefixes[prefix].append(entry)
+                touched_prefixes.add(prefix)
+                if coordinates:
+                    touched_templates.add(template)
+                    self.cells[template][coordinates] = prefix
+
+        for template in touched_templates:
+            # Cells in order of first appearance, as analyze_patterns sees them
+            cells = sorted(self.cells[template].items(),
+                           key=lambda cell: min(entry.rank for entry in self.prefixes[cell[1]]))
+            prefixes = [prefix for _, prefix in cells]
+            touched_prefixes.difference_update(prefixes)
+            group, rows = self._group_members(prefixes)
+            pattern = analyze_group(template, {coordinates: rows[prefix] for coordinates, prefix in cells}, group)
+            rank = min((entry.rank for prefix in prefixes for entry in self.prefixes[prefix]), default=0.0)
+            self._set_pattern(template, pattern, (0, rank))
+            for prefix in prefixes:
+                self._update_row(prefix, None if pattern else prefix)
+            if not cells:
+                del self.cells[template]
+
+        for prefix in touched_prefixes:
+            self._update_row(prefix, prefix)
+
+    def _group_members(self, prefixes):
+        """Local item list and (prefix, sorted (number, index)) rows, in file order."""
+        group = []
+        rows = {}
+        for prefix in prefixes:
+            entries = sorted(self.prefixes[prefix], key=lambda entry: entry.rank)
+            members = []
+            for entry in entries:
+                members.append((entry.parsed[1], len(group)))
+                group.append(entry.item)
+            members.sort()
+            rows[prefix] = (prefix, members)
+        return group, rows
+
+    def _update_row(self, prefix, key):
+        """Recompute the row pattern of a prefix (or drop it when key is None)."""
+        entries = self.prefixes.get(prefix)
+        pattern = None
+        rank = 0.0
+        if key is not None and entries:
+            group, rows = self._group_members([prefix])
+            pattern = analyze_group(prefix, {(): rows[prefix]}, group)
+            rank = min(entry.rank for entry in entries)
+        self._set_pattern(prefix, pattern, (1, rank))
+        if entries is not None and not entries:
+            del self.prefixes[prefix]
+
+    def _set_pattern(self, key, pattern, rank):
+        for entry in self.generated.pop(key, ()):
+            self.moves.append(('unplace', entry))
+        self.patterns.pop(key, None)
+        if not pattern:
+            return
+        self.patterns[key] = pattern
+        entries = []
+        for position, item in enumerate(generate_missing_items({key: pattern})):
+            item_id = item.get('id')
+            if self.id_counts.get(item_id):
+                continue
+            entry = _Entry(item, (id_sort_key(item_id or ''), 1, rank, position))
+            entries.append(entry)
+            self.moves.append(('place', entry))
+        self.generated[key] = entries
+
+    def _apply_moves(self):
+        """Patch the output order by bisection, or sort it again after large changes."""
+        moves, self.moves = self.moves, []
+        if len(moves) * 8 >= len(self.order_keys):
+            self._reorder()
+            return
+        keys, chunks = self.order_keys, self.order_chunks
+        for move, entry in moves:
+            if move == 'place':
+                position = bisect.bisect_right(keys, entry.key)
+                keys.insert(position, entry.key)
+                chunks.insert(position, entry.chunk)
+            else:
+                position = bisect.bisect_left(keys, entry.key)
+                del keys[position]
+                del chunks[position]
+
+    def _reorder(self):
+        """Sort the whole output again."""
+        self.moves = []
+        placed = [entry for entries in self.generated.values() for entry in entries]
+        placed.extend(self.entries)
+        placed.sort(key=lambda entry: entry.key)
+        self.order_keys = [entry.key for entry in placed]
+        self.order_chunks = [entry.chunk for entry in placed]
+
+def watch_files(paths, interval=WATCH_INTERVAL, debounce=WATCH_DEBOUNCE, log=print, overlaps=None, validate=False):
+    """
+    Regenerate `<name>_complete.json` whenever a watched map is saved.
+
+    Files are polled by size and modification time. A change is handled
+    once the file has stayed the same for `debounce` seconds. Runs until
+    interrupted.
+
+    Args:
+        paths (list): Map files to watch.
+        interval (float): Seconds between polls.
+        debounce (float): Quiet time before a change is processed.
+        log (callable): Progress output.
+        overlaps (str): None, 'report' or 'strict' (see WatchedMap).
+        validate (bool): Whether to check outputs against the map schemas.
+    """
+    maps = {path: WatchedMap(path, overlaps=overlaps, validate=validate) for path in paths}
+    handled = {}
+    pending = {}
+
+    def stat(path):
+        try:
+            info = os.stat(path)
+        except OSError:
+            return None
+        return info.st_mtime_ns, info.st_size
+
+    def process(path):
+        summary = maps[path].refresh()
+        if summary.get('error'):
+            log(f"{path}: {summary['error']}")
+        elif summary['mode'] != 'unchanged':
+            log(f"{path}: {summary['mode']} update, {summary['parsed']} items parsed, "
+                f"{summary['patterns']} patterns, {summary['generated']} generated "
+                f"-> {maps[path].output_path} in {summary['seconds'] * 1000:.1f} ms")
+            if summary.get('conflicts'):
+                log(f"{path}: {summary['conflicts']} overlapping pair(s) involve generated items")
+
+    for path in paths:
+        handled[path] = stat(path)
+        if handled[path] is not None:
+            process(path)
+    log(f"Watching {len(paths)} file(s); press Ctrl+C to stop.")
+
+    try:
+        while True:
+            time.sleep(interval)
+            now = time.monotonic()
+            for path in paths:
+                signature = stat(path)
+                if signature is None or signature == handled[path]:
+                    pending.pop(path, None)
+                    continue
+                if path not in pending or pending[path][0] != signature:
+                    pending[path] = (signature, now)
+                elif now - pending[path][1] >= debounce:
+                    del pending[path]
+                    handled[path] = signature
+                    process(path)
+    except KeyboardInterrupt:
+        log("Stopped watching.")
+
+def main():
+    print("Map Watcher")
+    print("===========")
+
+    if len(sys.argv) < 2:
+        print("Usage: python map_watch.py <map.json> [more maps...]")
+        return
+
+    paths = sys.argv[1:]
+    for path in paths:
+        if not os.path.exists(path):
+            print(f"File not found: {path}")
+            return
+
+    watch_files(paths)
+
+if __name__ == "__main__":
+    main()
@@ -1,69 +1,163 @@
 import random
 import json
+import itertools
 import uuid
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
 
-def generate_items(layer_id, constant_axis="y", constant_value=39, start_value=10, end_value=571, num_items=52,
-                  item_type="plot-standard", category="plot", width_range=(8, 15), height_range=(8, 15),
-                  rotation=0, scale=1, color="#d5e8d4", elevation_offset=0, prefix="uuid-plot-h1n"):
+from plots2 import open_atomic
+
+def _rng_stream(seed, stream):
     """
-    Generate a list of items with specified attributes.
+    Create an independent random stream derived from a seed.
+    
+    Args:
+        seed: Base seed, or None for a non-reproducible stream.
+        stream (str): Name of the stream (e.g. 'width').
+        
+    Returns:
+        random.Random: The random number generator for the stream.
+    """
+    if seed is None:
+        return random.Random()
+    return random.Random(f"{seed}:{stream}")
+
+def _uniform_tenths(rng, value_range, count):
+    """
+    Draw `count` uniform values from a range, rounded to one decimal place.
+    
+    Works in tenths so each value costs one integer round instead of the
+    much slower round(value, 1).
+    
+    Args:
+        rng (random.Random): The random stream to draw from.
+        value_range (tuple): Range for the values (min, max).
+        count (int): Number of values to draw.
+        
+    Returns:
+        list: The drawn values.
+    """
+    draw = rng.random
+    low = value_range[0] * 10
+    span = (value_range[1] - value_range[0]) * 10
+    return [tenths / 10 for tenths in map(round, [low + span * draw() for _ in range(count)])]
+
+# Items per chunk for the lazy generation and formatting functions
+ITEM_CHUNK_SIZE = 10000
+
+def iter_item_columns(constant_axis="y", constant_value=39, start_value=10, end_value=571, num_items=52,
+                      width_range=(8, 15), height_range=(8, 15), seed=None, chunk_size=ITEM_CHUNK_SIZE):
+    """
+    Compute the numeric columns for a row of items, one chunk at a time.
+    
+    The random streams carry over from chunk to chunk, so the chunks put
+    together are exactly what generate_item_columns returns for the same
+    arguments, whatever the chunk size.
     
     Args:
-        layer_id (str): The layer ID for all items.
         constant_axis (str): The axis that remains constant ('x' or 'y').
         constant_value (int): The value for the constant axis.
         start_value (int): The starting value for the variable axis.
         end_value (int): The ending value for the variable axis.
         num_items (int): Number of items to generate.
-        item_type (str): Type of item to generate.
-        category (str): Category of the item.
         width_range (tuple): Range for random width (min, max).
         height_range (tuple): Range for random height (min, max).
-        rotation (int): Rotation value for all items.
-        scale (int): Scale value for all items.
-        color (str): Color value for all items.
-        elevation_offset (int): Elevation offset for all items.
-        prefix (str): Prefix for the ID and name.
+        seed: Seed for reproducible output, or None.
+        chunk_size (int): Most items per chunk.
         
-    Returns:
-        list: List of generated item dictionaries.
+    Yields:
+        dict: Lists 'x', 'y', 'width' and 'height' for the next chunk.
     """
-    items = []
-    
-    # Calculate the step between each item on the variable axis
     step = (end_value - start_value) / (num_items - 1) if num_items > 1 else 0
+    constant_value = round(constant_value)
+    width_rng = _rng_stream(seed, "width")
+    height_rng = _rng_stream(seed, "height")
     
-    for i in range(1, num_items + 1):
-        # Calculate the position on the variable axis
-        variable_value = start_value + (i - 1) * step
+    for first in range(0, num_items, chunk_size):
+        count = min(chunk_size, num_items - first)
+        variable = list(map(round, [start_value + i * step for i in range(first, first + count)]))
+        constant = [constant_value] * count
         
-        # Assign values to x and y based on which axis is constant
-        x = variable_value if constant_axis == "y" else constant_value
-        y = constant_value if constant_axis == "y" else variable_value
+        widths = _uniform_tenths(width_rng, width_range, count)
+        heights = _uniform_tenths(height_rng, height_range, count)
         
-        # Generate random width and height within specified ranges
-        width = random.uniform(width_range[0], width_range[1])
-        height = random.uniform(height_range[0], height_range[1])
+        if constant_axis == "y":
+            x, y = variable, constant
+        else:
+            x, y = constant, variable
         
-        # Round to desired precision
-        x = round(x)
-        y = round(y)
-        width = round(width, 1)
-        height = round(height, 1)
+        yield {"x": x, "y": y, "width": widths, "height": heights}
+
+def generate_item_columns(constant_axis="y", constant_value=39, start_value=10, end_value=571, num_items=52,
+                          width_range=(8, 15), height_range=(8, 15), seed=None):
+    """
+    Compute the numeric columns for a row of items in one batch.
+    
+    Positions are evenly spaced along the variable axis; widths and heights
+    are drawn from separate random streams so the same seed always yields the
+    same row, and changing one range does not shift the other column.
+    
+    Args:
+        constant_axis (str): The axis that remains constant ('x' or 'y').
+        constant_value (int): The value for the constant axis.
+        start_value (int): The starting value for the variable axis.
+        end_value (int): The ending value for the variable axis.
+        num_items (int): Number of items to generate.
+        width_range (tuple): Range for random width (min, max).
+        height_range (tuple): Range for random height (min, max).
+        seed: Seed for reproducible output, or None.
         
-        # Create the name for the item based on the prefix
-        prefix_parts = prefix.split('-')
-        if len(prefix_parts) >= 3:
-            name = f"{prefix_parts[1].capitalize()} {prefix_parts[2].upper()}-{i}"
-        else:
-            name = f"{prefix}-{i}"
+    Returns:
+        dict: Lists 'x', 'y', 'width' and 'height', each num_items long.
+    """
+    chunks = iter_item_columns(constant_axis, constant_value, start_value, end_value, num_items,
+                               width_range, height_range, seed, chunk_size=max(num_items, 1))
+    return next(chunks, {"x": [], "y": [], "width": [], "height": []})
+
+def item_name_prefix(prefix):
+    """
+    Derive the display name prefix from an ID prefix ('uuid-plot-h1n' -> 'Plot H1N').
+    
+    Args:
+        prefix (str): Prefix for the ID.
         
-        # Properties dictionary - add any specific properties here
-        properties = {"name": name} if "plot" in category else {}
+    Returns:
+        str: The name prefix, to be followed by '-<number>'.
+    """
+    prefix_parts = prefix.split('-')
+    if len(prefix_parts) >= 3:
+        return f"{prefix_parts[1].capitalize()} {prefix_parts[2].upper()}"
+    return prefix
+
+def build_items(columns, layer_id, item_type="plot-standard", category="plot", rotation=0, scale=1,
+                color="#d5e8d4", elevation_offset=0, prefix="uuid-plot-h1n", first_number=1, name_prefix=None):
+    """
+    Turn precomputed columns into item dictionaries.
+    
+    Args:
+        columns (dict): Output of generate_item_columns.
+        layer_id (str): The layer ID for all items.
+        item_type (str): Type of item to generate.
+        category (str): Category of the item.
+        rotation (int): Rotation value for all items.
+        scale (int): Scale value for all items.
+        color (str): Color value for all items.
+        elevation_offset (int): Elevation offset for all items.
+        prefix (str): Prefix for the ID and name.
+        first_number (int): Number of the first item in the ID.
+        name_prefix (str): Prefix for the names, if not derived from prefix.
         
-        # Create the item dictionary
-        item = {
-            "id": f"{prefix}-{i}",
+    Returns:
+        list: List of generated item dictionaries.
+    """
+    if name_prefix is None:
+        name_prefix = item_name_prefix(prefix)
+    with_name = "plot" in category
+    
+    return [
+        {
+            "id": f"{prefix}-{number}",
             "type": item_type,
             "category": category,
             "x": x,
@@ -75,26 +169,143 @@ def generate_items(layer_id, constant_axis="y", constant_value=39, start_value=1
             "color": color,
             "layerId": layer_id,
             "elevationOffset": elevation_offset,
-            "properties": properties
+            "properties": {"name": f"{name_prefix}-{number}"} if with_name else {}
         }
+        for number, x, y, width, height in zip(
+            range(first_number, first_number + len(columns["x"])),
+            columns["x"], columns["y"], columns["width"], columns["height"]
+        )
+    ]
+
+def iter_item_chunks(layer_id, constant_axis="y", constant_value=39, start_value=10, end_value=571, num_items=52,
+                     item_type="plot-standard", category="plot", width_range=(8, 15), height_range=(8, 15),
+                     rotation=0, scale=1, color="#d5e8d4", elevation_offset=0, prefix="uuid-plot-h1n", seed=None,
+                     chunk_size=ITEM_CHUNK_SIZE, name_prefix=None):
+    """
+    Generate a row of items lazily, in lists of at most chunk_size items.
+    
+    Only one chunk is in memory at a time, so memory use does not grow
+    with num_items. The items are the same as generate_items returns.
+    
+    Args:
+        layer_id (str): The layer ID for all items.
+        constant_axis (str): The axis that remains constant ('x' or 'y').
+        constant_value (int): The value for the constant axis.
+        start_value (int): The starting value for the variable axis.
+        end_value (int): The ending value for the variable axis.
+        num_items (int): Number of items to generate.
+        item_type (str): Type of item to generate.
+        category (str): Category of the item.
+        width_range (tuple): Range for random width (min, max).
+        height_range (tuple): Range for random height (min, max).
+        rotation (int): Rotation value for all items.
+        scale (int): Scale value for all items.
+        color (str): Color value for all items.
+        elevation_offset (int): Elevation offset for all items.
+        prefix (str): Prefix for the ID and name.
+        seed: Seed for reproducible widths and heights, or None.
+        chunk_size (int): Most items per chunk.
+        name_prefix (str): Prefix for the names, if not derived from prefix.
         
-        items.append(item)
+    Yields:
+        list: The next chunk of item dictionaries.
+    """
+    first_number = 1
+    for columns in iter_item_columns(constant_axis, constant_value, start_value, end_value, num_items,
+                                     width_range, height_range, seed, chunk_size):
+        chunk = build_items(
+            columns,
+            layer_id,
+            item_type=item_type,
+            category=category,
+            rotation=rotation,
+            scale=scale,
+            color=color,
+            elevation_offset=elevation_offset,
+            prefix=prefix,
+            first_number=first_number,
+            name_prefix=name_prefix
+        )
+        first_number += len(chunk)
+        yield chunk
+
+def iter_items(layer_id, chunk_size=ITEM_CHUNK_SIZE, **kwargs):
+    """
+    Generate a row of items lazily, one item at a time.
     
-    return items
+    Args:
+        layer_id (str): The layer ID for all items.
+        chunk_size (int): Items generated per batch behind the iterator.
+        **kwargs: Any other generate_items parameter.
+        
+    Yields:
+        dict: The next item.
+    """
+    for chunk in iter_item_chunks(layer_id, chunk_size=chunk_size, **kwargs):
+        yield from chunk
 
-def format_json_items(items, use_commas=True):
+def generate_items(layer_id, constant_axis="y", constant_value=39, start_value=10, end_value=571, num_items=52,
+                  item_type="plot-standard", category="plot", width_range=(8, 15), height_range=(8, 15),
+                  rotation=0, scale=1, color="#d5e8d4", elevation_offset=0, prefix="uuid-plot-h1n", seed=None,
+                  name_prefix=None):
     """
-    Format a list of items into JSON-like strings.
+    Generate a list of items with specified attributes.
     
     Args:
-        items (list): List of item dictionaries.
-        use_commas (bool): Whether to add a comma at the beginning of each line.
+        layer_id (str): The layer ID for all items.
+        constant_axis (str): The axis that remains constant ('x' or 'y').
+        constant_value (int): The value for the constant axis.
+        start_value (int): The starting value for the variable axis.
+        end_value (int): The ending value for the variable axis.
+        num_items (int): Number of items to generate.
+        item_type (str): Type of item to generate.
+        category (str): Category of the item.
+        width_range (tuple): Range for random width (min, max).
+        height_range (tuple): Range for random height (min, max).
+        rotation (int): Rotation value for all items.
+        scale (int): Scale value for all items.
+        color (str): Color value for all items.
+        elevation_offset (int): Elevation offset for all items.
+        prefix (str): Prefix for the ID and name.
+        seed: Seed for reproducible widths and heights, or None.
+        name_prefix (str): Prefix for the names, if not derived from prefix.
         
     Returns:
-        str: Formatted JSON-like string with items.
+        list: List of generated item dictionaries.
+    """
+    chunks = iter_item_chunks(
+        layer_id,
+        constant_axis=constant_axis,
+        constant_value=constant_value,
+        start_value=start_value,
+        end_value=end_value,
+        num_items=num_items,
+        item_type=item_type,
+        category=category,
+        width_range=width_range,
+        height_range=height_range,
+        rotation=rotation,
+        scale=scale,
+        color=color,
+        elevation_offset=elevation_offset,
+        prefix=prefix,
+        seed=seed,
+        chunk_size=max(num_items, 1),
+        name_prefix=name_prefix
+    )
+    return next(chunks, [])
+
+def iter_json_lines(items, use_commas=True):
     """
-    lines = []
+    Format items one by one into single-line JSON-like strings.
     
+    Args:
+        items (iterable): Item dictionaries.
+        use_commas (bool): Whether to add a comma at the beginning of each line.
+        
+    Yields:
+        str: One formatted line per item, without a newline.
+    """
     for item in items:
         item_str = json.dumps(item, indent=4)
         # Format the string to be on a single line
@@ -102,17 +313,231 @@ def format_json_items(items, use_commas=True):
         
         # Add comma if needed
         if use_commas:
-            lines.append(f",{item_str}")
+            yield f",{item_str}"
         else:
-            lines.append(f"{item_str}")
+            yield item_str
+
+def write_json_items(items, file, use_commas=True, chunk_size=ITEM_CHUNK_SIZE):
+    """
+    Stream items to a file handle in the format_json_items format.
+    
+    Lines are written in batches of chunk_size, so memory use stays flat
+    however many items the iterable produces. The output is the same text
+    format_json_items returns: lines joined by newlines, with no newline
+    after the last one.
+    
+    Args:
+        items (iterable): Item dictionaries, e.g. from iter_items.
+        file: Writable text file handle.
+        use_commas (bool): Whether to add a comma at the beginning of each line.
+        chunk_size (int): Lines per write.
+        
+    Returns:
+        int: Number of items written.
+    """
+    lines = iter_json_lines(items, use_commas)
+    count = 0
+    while True:
+        batch = list(itertools.islice(lines, chunk_size))
+        if not batch:
+            return count
+        if count:
+            file.write('\n')
+        file.write('\n'.join(batch))
+        count += len(batch)
+
+def format_json_items(items, use_commas=True):
+    """
+    Format a list of items into JSON-like strings.
+    
+    Args:
+        items (list): List of item dictionaries.
+        use_commas (bool): Whether to add a comma at the beginning of each line.
+        
+    Returns:
+        str: Formatted JSON-like string with items.
+    """
+    return '\n'.join(iter_json_lines(items, use_commas))
+
+# generate_items parameters a layout spec entry may set
+SPEC_FIELDS = ("layer_id", "constant_axis", "constant_value", "start_value", "end_value", "num_items",
+               "item_type", "category", "width_range", "height_range", "rotation", "scale", "color",
+               "elevation_offset", "prefix", "seed", "name_prefix")
+
+def expand_layout_spec(spec):
+    """
+    Expand a layout spec into one generate_items call per row.
+    
+    A spec is a JSON object with optional "defaults" (shared parameters),
+    "seed" (base seed) and two lists:
+    
+    - "rows": each entry is a set of generate_items parameters.
+    - "blocks": each entry is a row plus "rows" (count) and "row_spacing";
+      it expands into parallel rows whose constant value moves by
+      row_spacing, with prefixes '<prefix>-r1', '<prefix>-r2', ... and
+      names 'Plot BLK R1-1', 'Plot BLK R2-1', ... so no two rows share
+      a name.
+    
+    Rows without an explicit seed get one derived from the base seed and
+    their position, so a spec always compiles to the same layout.
+    
+    Args:
+        spec (dict): The layout spec.
+        
+    Returns:
+        list: Keyword-argument dicts for generate_items.
+        
+    Raises:
+        ValueError: If an entry has unknown fields, lacks a layer_id or
+            prefix, or reuses a prefix.
+    """
+    defaults = spec.get("defaults", {})
+    base_seed = spec.get("seed")
+    entries = []
+    
+    for row in spec.get("rows", []):
+        entries.append(dict(defaults, **row))
+    
+    for block in spec.get("blocks", []):
+        block = dict(defaults, **block)
+        count = block.pop("rows", 1)
+        spacing = block.pop("row_spacing", 0)
+        prefix = block.get("prefix", "")
+        name_prefix = block.get("name_prefix", item_name_prefix(prefix))
+        for number in range(1, count + 1):
+            row = dict(block, prefix=f"{prefix}-r{number}", name_prefix=f"{name_prefix} R{number}")
+            row["constant_value"] = block.get("constant_value", 0) + (number - 1) * spacing
+            if "seed" in block:
+                row["seed"] = f"{block['seed']}:{number}"
+            entries.append(row)
+    
+    calls = []
+    prefixes = set()
+    for position, entry in enumerate(entries):
+        unknown = set(entry) - set(SPEC_FIELDS)
+        if unknown:
+            raise ValueError(f"Spec entry {position + 1} has unknown fields: {', '.join(sorted(unknown))}")
+        for field in ("layer_id", "prefix"):
+            if field not in entry:
+                raise ValueError(f"Spec entry {position + 1} is missing '{field}'")
+        if entry["prefix"] in prefixes:
+            raise ValueError(f"Spec entry {position + 1} reuses prefix '{entry['prefix']}'")
+        prefixes.add(entry["prefix"])
+        
+        call = dict(entry)
+        for field in ("width_range", "height_range"):
+            if field in call:
+                call[field] = tuple(call[field])
+        if "seed" not in call and base_seed is not None:
+            call["seed"] = f"{base_seed}:{position}"
+        calls.append(call)
+    
+    return calls
+
+def _compile_row(params, as_map=False):
+    """Generate and format one spec row; runs in a worker process."""
+    items = generate_items(**params)
+    if as_map:
+        return ',\n'.join(iter_json_lines(items, use_commas=False))
+    return format_json_items(items)
+
+def compile_layout_spec(spec, workers=None, as_map=False):
+    """
+    Generate every row of a layout spec, spreading rows over a process pool.
+    
+    Args:
+        spec (dict): The layout spec.
+        workers (int): Number of worker processes (default: CPU count).
+            1 compiles in this process.
+        as_map (bool): Whether to format the rows for a JSON map document
+            (commas after each item) rather than with leading commas.
+        
+    Returns:
+        tuple: (number of items, list of formatted row chunks in spec order).
+    """
+    calls = expand_layout_spec(spec)
+    total = sum(call.get("num_items", 52) for call in calls)
     
-    return '\n'.join(lines)
+    if workers is None:
+        workers = spec.get("workers") or os.cpu_count() or 1
+    
+    if workers <= 1 or len(calls) <= 1:
+        return total, [_compile_row(call, as_map) for call in calls]
+    
+    with ProcessPoolExecutor(max_workers=min(workers, len(calls))) as pool:
+        return total, list(pool.map(_compile_row, calls, itertools.repeat(as_map)))
+
+def is_map_output(file_path):
+    """Whether layout output goes in a JSON map document rather than bare '.txt' item lines."""
+    return not file_path.endswith('.txt')
+
+def write_layout_output(chunks, file_path):
+    """
+    Write compiled rows to a single file, replacing it atomically.
+    
+    '.txt' files get the bare leading-comma item lines, as in interactive
+    mode; anything else is a standard JSON {"items": [...]} map document,
+    for which the rows must have been compiled with as_map=True.
+    
+    Args:
+        chunks (list): Formatted row chunks from compile_layout_spec.
+        file_path (str): Path to save the file.
+    """
+    as_map = is_map_output(file_path)
+    with open_atomic(file_path) as file:
+        if as_map:
+            # Rows without items would leave a dangling comma
+            chunks = [chunk for chunk in chunks if chunk]
+            file.write('{\n  "items": [\n')
+        file.write((',\n' if as_map else '\n').join(chunks))
+        if as_map:
+            file.write('\n  ]\n}\n')
+
+def run_layout_spec(spec_path, output_path=None, workers=None):
+    """
+    Compile a layout spec file and write the merged output.
+    
+    Args:
+        spec_path (str): Path to the JSON spec.
+        output_path (str): Output file; defaults to the spec's "output" or
+            '<spec>_items.json'.
+        workers (int): Number of worker processes.
+        
+    Returns:
+        bool: True if successful, False otherwise.
+    """
+    try:
+        with open(spec_path) as file:
+            spec = json.load(file)
+        output_path = output_path or spec.get("output") or f"{os.path.splitext(spec_path)[0]}_items.json"
+        total, chunks = compile_layout_spec(spec, workers, as_map=is_map_output(output_path))
+        write_layout_output(chunks, output_path)
+    except (OSError, ValueError, TypeError) as e:
+        print(f"Error compiling layout spec: {e}")
+        return False
+    
+    print(f"Generated {total} items in {len(chunks)} rows.")
+    print(f"Output saved to {output_path}")
+    return True
 
 def main():
     
     print("Plot/Item Generator")
     print("==================")
     
+    # Batch mode: python plots.py --spec layout.json [output] [workers]
+    if len(sys.argv) > 2 and sys.argv[1] == "--spec":
+        output_path = sys.argv[3] if len(sys.argv) > 3 else None
+        workers = None
+        if len(sys.argv) > 4:
+            try:
+                workers = int(sys.argv[4])
+            except ValueError:
+                print(f"Error compiling layout spec: workers must be a whole number, got '{sys.argv[4]}'")
+                return
+        run_layout_spec(sys.argv[2], output_path, workers)
+        return
+    
     # Get user input
     layer_id = input("Enter layer ID (e.g., 9b7e32b3-0f4f-43a5-a73d-93d73a5206cf): ")
     
@@ -139,6 +564,7 @@ def main():
     
     color = input("Enter color (e.g., #d5e8d4): ")
     prefix = input("Enter ID prefix (e.g., uuid-plot-h1n): ")
+    seed = input("Enter random seed (leave blank for a random layout): ") or None
     
     # Generate the items
     items = generate_items(
@@ -153,7 +579,8 @@ def main():
         width_range=(width_min, width_max),
         height_range=(height_min, height_max),
         color=color,
-        prefix=prefix
+        prefix=prefix,
+        seed=seed
     )
     
     # Format and print the items
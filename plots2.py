@@ -1,337 +1,1150 @@
 import random
 import json
 import uuid
+import bisect
+import contextlib
+import glob
+import gzip
+import hashlib
+import heapq
+import io
+import itertools
 import os
 import re
+import tempfile
+import time
+from array import array
 from collections import defaultdict
+from collections.abc import Iterator
+from concurrent.futures import ProcessPoolExecutor, as_completed
 
-def load_json_file(file_path):
+from map_items import MapItems
+
+# Size of each read from disk while streaming a map file
+STREAM_CHUNK_SIZE = 1 << 16
+
+# Largest distance (in map units) between a predicted and an actual position
+# for items to count as following the same grid
+GRID_TOLERANCE = 0.5
+
+# Bump when the pattern dicts change so cached analyses are not reused
+PATTERN_CACHE_VERSION = 1
+
+# Files a batch worker process handles before it is replaced by a fresh
+# one, so memory held after a large map goes back to the system
+BATCH_TASKS_PER_WORKER = 4
+
+# Marks a cache miss, since None is a valid cached result
+_MISSING = object()
+
+_WHITESPACE_RE = re.compile(r'\s*')
+# Whitespace, complete comments and commas between items; group 1 is set if a comma was seen
+_GAP_RE = re.compile(r'(?:\s+|//[^\n]*\n|/\*.*?\*/|(,))*', re.S)
+_NUMBER_RE = re.compile(r'-?(?:0|[1-9]\d*)(\.\d+)?([eE][-+]?\d+)?')
+_STRUCTURAL_RE = re.compile(r'["{}\[\]/]')
+_STRING_TAIL_RE = re.compile(r'(?:[^"\\]|\\.)*"', re.S)
+_SCALAR_END_RE = re.compile(r'[\s,\]}/]')
+_LITERALS = {'true': True, 'false': False, 'null': None}
+
+_scan_once = json.JSONDecoder().scan_once
+
+class MapParseError(ValueError):
+    """
+    Raised when a map file cannot be parsed.
+
+    Attributes:
+        lineno (int): 1-based line of the offending character.
+        colno (int): 1-based column of the offending character.
+    """
+
+    def __init__(self, message, lineno, colno):
+        super().__init__(f"{message} (line {lineno}, column {colno})")
+        self.message = message
+        self.lineno = lineno
+        self.colno = colno
+
+class _MapTokenizer:
+    """
+    Single-pass tokenizer for map files in the leading-comma dialect.
+
+    The file is read in fixed-size chunks and consumed text is dropped as soon
+    as an item has been decoded, so memory stays proportional to the largest
+    item rather than the file. Besides standard JSON it accepts `//` and
+    `/* */` comments and redundant commas before, between or after array
+    elements and object members.
+    """
+
+    def __init__(self, file, chunk_size=STREAM_CHUNK_SIZE):
+        self.file = file
+        self.chunk_size = chunk_size
+        self.buf = ""
+        self.pos = 0
+        self.eof = False
+        # Line number and column of buf[0], used for error positions
+        self.line = 0
+        self.col = 0
+        self.chars_read = 0
+        # Values decoded by each approach: the C scanner on the buffer as
+        # is, the C scanner on a value bounded by value_end, the tolerant parser
+        self.approaches = [0, 0, 0]
+
+    def fill(self):
+        """Append the next chunk to the buffer. Returns False at end of file."""
+        if self.eof:
+            return False
+        chunk = self.file.read(self.chunk_size)
+        if not chunk:
+            self.eof = True
+            return False
+        self.chars_read += len(chunk)
+        self.buf += chunk
+        return True
+
+    def compact(self):
+        """Drop the consumed part of the buffer, keeping line/column bookkeeping."""
+        pos = self.pos
+        if pos < self.chunk_size:
+            return
+        newlines = self.buf.count('\n', 0, pos)
+        if newlines:
+            self.line += newlines
+            self.col = pos - self.buf.rfind('\n', 0, pos) - 1
+        else:
+            self.col += pos
+        self.buf = self.buf[pos:]
+        self.pos = 0
+
+    def location(self, index):
+        """Return the 1-based (line, column) of a buffer index."""
+        last_newline = self.buf.rfind('\n', 0, index)
+        line = self.line + self.buf.count('\n', 0, index) + 1
+        if last_newline >= 0:
+            return line, index - last_newline
+        return line, self.col + index + 1
+
+    def error(self, message, index=None):
+        line, col = self.location(self.pos if index is None else index)
+        return MapParseError(message, line, col)
+
+    def skip(self):
+        """Skip whitespace and comments, reading ahead as needed."""
+        while True:
+            self.pos = _WHITESPACE_RE.match(self.buf, self.pos).end()
+            if self.pos >= len(self.buf):
+                if self.fill():
+                    continue
+                return
+            if self.buf[self.pos] != '/':
+                return
+            if self.pos + 1 >= len(self.buf) and self.fill():
+                continue
+            marker = self.buf[self.pos:self.pos + 2]
+            if marker == '//':
+                terminator, width = '\n', 1
+            elif marker == '/*':
+                terminator, width = '*/', 2
+            else:
+                return
+            end = self.buf.find(terminator, self.pos + 2)
+            while end < 0 and self.fill():
+                end = self.buf.find(terminator, self.pos + 2)
+            if end < 0:
+                if width == 2:
+                    raise self.error("Unterminated comment")
+                self.pos = len(self.buf)
+            else:
+                self.pos = end + width
+
+    def peek(self):
+        """Skip to the next significant character and return it ('' at EOF)."""
+        self.skip()
+        return self.buf[self.pos] if self.pos < len(self.buf) else ''
+
+    def expect(self, char):
+        if self.peek() != char:
+            found = repr(self.buf[self.pos]) if self.pos < len(self.buf) else "end of file"
+            raise self.error(f"Expected {char!r}, found {found}")
+        self.pos += 1
+
+    def separators(self):
+        """Consume any run of commas and return how many there were."""
+        count = 0
+        while self.peek() == ',':
+            self.pos += 1
+            count += 1
+        return count
+
+    def gap(self):
+        """
+        Skip everything up to the next element and report whether a comma was seen.
+
+        A single regex handles the common case; comments or commas split
+        across chunk boundaries fall back to `skip`.
+        """
+        match = _GAP_RE.match(self.buf, self.pos)
+        end = match.end()
+        if end < len(self.buf) and self.buf[end] != '/':
+            self.pos = end
+            return match.group(1) is not None
+        self.pos = end
+        return self.separators() > 0 or match.group(1) is not None
+
+    def read_key(self):
+        if self.peek() != '"':
+            raise self.error("Expected a string key")
+        self.value_end(self.pos)
+        try:
+            key, self.pos = json.decoder.scanstring(self.buf, self.pos + 1)
+        except json.JSONDecodeError as e:
+            raise self.error(e.msg, e.pos)
+        return key
+
+    def value_end(self, start):
+        """
+        Return the buffer index just past the value starting at `start`.
+
+        Brackets are matched while skipping strings and comments; more of the
+        file is read only until the value is complete.
+        """
+        if self.buf[start] not in '{["':
+            match = _SCALAR_END_RE.search(self.buf, start)
+            while match is None and self.fill():
+                match = _SCALAR_END_RE.search(self.buf, start)
+            return match.start() if match else len(self.buf)
+
+        depth = 0
+        index = start
+        while True:
+            match = _STRUCTURAL_RE.search(self.buf, index)
+            if match is None:
+                if not self.fill():
+                    raise self.error("Unexpected end of file inside value", start)
+                continue
+            char = match.group()
+            index = match.end()
+            if char == '"':
+                tail = _STRING_TAIL_RE.match(self.buf, index)
+                while tail is None and self.fill():
+                    tail = _STRING_TAIL_RE.match(self.buf, index)
+                if tail is None:
+                    raise self.error("Unterminated string", match.start())
+                index = tail.end()
+                if depth == 0:
+                    return index
+            elif char == '/':
+                if index >= len(self.buf):
+                    self.fill()
+                nxt = self.buf[index:index + 1]
+                if nxt in ('/', '*'):
+                    terminator = '\n' if nxt == '/' else '*/'
+                    end = self.buf.find(terminator, index + 1)
+                    while end < 0 and self.fill():
+                        end = self.buf.find(terminator, index + 1)
+                    if end < 0:
+                        if nxt == '*':
+                            raise self.error("Unterminated comment", match.start())
+                        end = len(self.buf)
+                    index = end + len(terminator)
+            elif char in '{[':
+                depth += 1
+            else:
+                depth -= 1
+                if depth == 0:
+                    return index
+
+    def read_value(self):
+        """
+        Decode the value at the current position.
+
+        Standard JSON goes straight through the C decoder; anything it
+        rejects (comments, stray commas, genuine errors) is re-parsed by the
+        tolerant parser, which reports the exact line and column of problems.
+        """
+        if not self.peek():
+            raise self.error("Unexpected end of file")
+        start = self.pos
+        try:
+            value, end = _scan_once(self.buf, start)
+            if end < len(self.buf) or self.eof:
+                self.pos = end
+                self.approaches[0] += 1
+                return value
+        except (StopIteration, json.JSONDecodeError):
+            pass
+        end = self.value_end(start)
+        try:
+            value, decoded_end = _scan_once(self.buf, start)
+            if decoded_end == end:
+                self.pos = end
+                self.approaches[1] += 1
+                return value
+        except (StopIteration, json.JSONDecodeError):
+            pass
+        value = _TolerantParser(self, start, end).parse()
+        self.pos = end
+        self.approaches[2] += 1
+        return value
+
+def text_tokenizer(text):
+    """
+    Create a map tokenizer over text already held in memory.
+
+    The whole text is loaded as a single chunk and never dropped, so the
+    tokenizer's `pos` and the positions it reports are offsets into `text`.
+
+    Args:
+        text (str): The map document.
+
+    Returns:
+        The tokenizer, positioned at the start of the text.
+    """
+    return _MapTokenizer(io.StringIO(text), len(text) + 1)
+
+class _TolerantParser:
+    """
+    Recursive-descent parser for one complete value of the map dialect.
+
+    Only used for values the standard decoder rejects, so speed matters less
+    than precise error positions.
+    """
+
+    def __init__(self, tokenizer, start, end):
+        self.tokenizer = tokenizer
+        self.text = tokenizer.buf
+        self.pos = start
+        self.end = end
+
+    def error(self, message, index=None):
+        return self.tokenizer.error(message, self.pos if index is None else index)
+
+    def skip(self):
+        text = self.text
+        while True:
+            self.pos = _WHITESPACE_RE.match(text, self.pos, self.end).end()
+            if text.startswith('//', self.pos):
+                newline = text.find('\n', self.pos, self.end)
+                self.pos = self.end if newline < 0 else newline + 1
+            elif text.startswith('/*', self.pos):
+                close = text.find('*/', self.pos, self.end)
+                if close < 0:
+                    raise self.error("Unterminated comment")
+                self.pos = close + 2
+            else:
+                return
+
+    def peek(self):
+        self.skip()
+        return self.text[self.pos] if self.pos < self.end else ''
+
+    def parse(self):
+        value = self.parse_value()
+        if self.peek():
+            raise self.error("Unexpected trailing data")
+        return value
+
+    def parse_value(self):
+        char = self.peek()
+        if char == '{':
+            return self.parse_container('}')
+        if char == '[':
+            return self.parse_container(']')
+        if char == '"':
+            return self.parse_string()
+        if not char:
+            raise self.error("Unexpected end of value")
+        match = _NUMBER_RE.match(self.text, self.pos, self.end)
+        if match and match.end() > self.pos:
+            self.pos = match.end()
+            number = match.group()
+            return float(number) if match.group(1) or match.group(2) else int(number)
+        for literal, value in _LITERALS.items():
+            if self.text.startswith(literal, self.pos):
+                self.pos += len(literal)
+                return value
+        raise self.error(f"Unexpected character {char!r}")
+
+    def parse_string(self):
+        try:
+            value, self.pos = json.decoder.scanstring(self.text, self.pos + 1)
+        except json.JSONDecodeError as e:
+            raise self.error(e.msg, e.pos)
+        return value
+
+    def parse_container(self, closer):
+        is_object = closer == '}'
+        result = {} if is_object else []
+        self.pos += 1
+        need_separator = False
+        while True:
+            char = self.peek()
+            if char == ',':
+                self.pos += 1
+                need_separator = False
+                continue
+            if char == closer:
+                self.pos += 1
+                return result
+            if not char:
+                raise self.error(f"Expected {closer!r} before end of value")
+            if need_separator:
+                raise self.error("Expected ',' between elements")
+            if is_object:
+                if char != '"':
+                    raise self.error("Expected a string key")
+                key = self.parse_string()
+                if self.peek() != ':':
+                    raise self.error("Expected ':' after key")
+                self.pos += 1
+                result[key] = self.parse_value()
+            else:
+                result.append(self.parse_value())
+            need_separator = True
+
+def _iter_object_items(tokenizer, header):
+    """Stream the `items` array of an object whose '{' has been consumed."""
+    need_separator = False
+    while True:
+        if tokenizer.separators():
+            need_separator = False
+        if tokenizer.peek() == '}':
+            tokenizer.pos += 1
+            return
+        if need_separator:
+            raise tokenizer.error("Expected ',' between members")
+        key = tokenizer.read_key()
+        tokenizer.expect(':')
+        if key != 'items':
+            header[key] = tokenizer.read_value()
+            need_separator = True
+            continue
+
+        header['items'] = []
+        tokenizer.expect('[')
+        need_item_separator = False
+        while True:
+            tokenizer.compact()
+            if tokenizer.gap():
+                need_item_separator = False
+            char = tokenizer.buf[tokenizer.pos:tokenizer.pos + 1]
+            if char == ']':
+                tokenizer.pos += 1
+                break
+            if not char:
+                raise tokenizer.error("Unexpected end of file inside items array")
+            if need_item_separator:
+                raise tokenizer.error("Expected ',' between items")
+            yield tokenizer.read_value()
+            need_item_separator = True
+        need_separator = True
+
+def _iter_wrapped_items(tokenizer, header, wrapper):
+    """Stream the items of a `[{"map_data": {...}}]` export."""
+    tokenizer.expect('[')
+    tokenizer.expect('{')
+    need_separator = False
+    while True:
+        if tokenizer.separators():
+            need_separator = False
+        if tokenizer.peek() == '}':
+            tokenizer.pos += 1
+            break
+        if need_separator:
+            raise tokenizer.error("Expected ',' between members")
+        key = tokenizer.read_key()
+        tokenizer.expect(':')
+        if key == 'map_data' and tokenizer.peek() == '{':
+            wrapper[key] = None
+            tokenizer.pos += 1
+            yield from _iter_object_items(tokenizer, header)
+        else:
+            wrapper[key] = tokenizer.read_value()
+        need_separator = True
+    tokenizer.separators()
+    if tokenizer.peek() != ']':
+        raise tokenizer.error("Expected a single map_data record")
+    tokenizer.pos += 1
+    if 'map_data' not in wrapper:
+        raise tokenizer.error("Missing map_data object")
+
+def iter_json_items(file_path, header=None, chunk_size=STREAM_CHUNK_SIZE, wrapper=None, stats=None):
+    """
+    Stream the items of a map file one at a time.
+
+    The file is read once, in chunks, and each element of the top-level
+    `items` array is yielded as soon as it has been decoded. Leading commas,
+    trailing commas and `//` or `/* */` comments are accepted anywhere.
+    map_data exports (`[{"map_data": {...}}]`) are also accepted; their
+    items are those of the map_data object.
+
+    Args:
+        file_path (str): Path to the JSON file.
+        header (dict): Optional dict that receives the other top-level keys
+            in file order. The `items` key is set to an empty list placeholder.
+            Keys that follow the items array are only present once the
+            generator is exhausted.
+        chunk_size (int): Number of characters read from disk at a time.
+        wrapper (dict): Optional dict that receives the outer keys of a
+            map_data export, with `map_data` itself set to None. It stays
+            empty for plain map files.
+        stats (dict): Optional dict that receives parse statistics once the
+            generator finishes: `bytes_read` (file size on disk),
+            `chars_read` and `approaches`, the number of values decoded by
+            the C scanner directly ('scanner'), by the C scanner after
+            bounding the value ('bounded') and by the tolerant parser
+            ('tolerant').
+
+    Yields:
+        dict: Each item of the `items` array.
+
+    Raises:
+        MapParseError: If the file is malformed, with the line and column.
+    """
+    if header is None:
+        header = {}
+    if wrapper is None:
+        wrapper = {}
+    with _open_text(file_path, 'r') as file:
+        tokenizer = _MapTokenizer(file, chunk_size)
+        try:
+            if tokenizer.peek() == '[':
+                yield from _iter_wrapped_items(tokenizer, header, wrapper)
+            else:
+                tokenizer.expect('{')
+                yield from _iter_object_items(tokenizer, header)
+
+            if tokenizer.peek():
+                raise tokenizer.error("Unexpected data after the top-level object")
+        finally:
+            if stats is not None:
+                stats['bytes_read'] = os.path.getsize(file_path)
+                stats['chars_read'] = tokenizer.chars_read
+                stats['approaches'] = dict(zip(('scanner', 'bounded', 'tolerant'), tokenizer.approaches))
+
+def load_json_file(file_path, columnar=False, stats=None, raise_errors=False):
     """
     Load a JSON file and return its contents, with special handling for files with leading commas.
     
+    The file is parsed in a single streaming pass (see `iter_json_items`), so
+    standard JSON and the leading-comma/comment dialect take the same path.
+    
     Args:
         file_path (str): Path to the JSON file.
+        columnar (bool): Whether to stream the items into a MapItems container
+            instead of a list of dicts.
+        stats (dict): Optional dict that receives parse statistics (see
+            `iter_json_items`).
+        raise_errors (bool): Whether to raise read and parse errors instead
+            of printing them and returning None.
         
     Returns:
-        dict: The JSON contents.
+        dict: The JSON contents, or None if the file could not be parsed.
     """
+    data = {}
     try:
-        # First try standard JSON loading
-        with open(file_path, 'r') as file:
-            data = json.loads(file.read())
-            return data
-    except json.JSONDecodeError:
-        print("Standard JSON parsing failed. Attempting to fix the format...")
-        
-        # Try to fix the format by handling leading commas
-        with open(file_path, 'r') as file:
-            content = file.read()
-        
-        # Approach 1: Try replacing the first comma in the items array
-        fixed_content = content.replace('"items": [,', '"items": [')
-        try:
-            data = json.loads(fixed_content)
-            print("Fixed JSON successfully using approach 1!")
-            return data
-        except json.JSONDecodeError:
-            print("Approach 1 failed. Trying approach 2...")
-        
-        # Approach 2: More aggressive cleaning - replace all leading commas in the items array
-        lines = content.split('\n')
-        cleaned_lines = []
-        in_items_array = False
-        first_item = True
-        
-        for line in lines:
-            stripped = line.strip()
-            
-            # Check if we're entering the items array
-            if '"items"' in stripped and '[' in stripped:
-                in_items_array = True
-                cleaned_lines.append(line)
-                continue
-            
-            # Check if we're exiting the items array
-            if in_items_array and ']' in stripped and not '{' in stripped:
-                in_items_array = False
-                first_item = True
-                cleaned_lines.append(line)
-                continue
-            
-            # Handle items in the array
-            if in_items_array and stripped.startswith(',{'):
-                if first_item:
-                    # Remove the leading comma for the first item
-                    cleaned_lines.append(line.replace(',{', '{', 1))
-                    first_item = False
-                else:
-                    cleaned_lines.append(line)
-            else:
-                cleaned_lines.append(line)
+        stream = iter_json_items(file_path, data, stats=stats)
+        items = MapItems.from_items(stream) if columnar else list(stream)
+    except MapParseError as e:
+        if raise_errors:
+            raise
+        print(f"Failed to parse {file_path}: {e}")
+        return None
+    except (OSError, UnicodeDecodeError) as e:
+        if raise_errors:
+            raise
+        print(f"Failed to read {file_path}: {e}")
+        return None
+    if 'items' in data:
+        data['items'] = items
+    return data
+
+def parse_item_id(item_id):
+    """
+    Split an item ID into its pattern parts.
+    
+    The trailing number is the item number within its row. Other purely
+    numeric hyphen-separated parts (e.g. the 3 and 1 in 'square-3-1-plot-2')
+    are grid coordinates; they are replaced with '*' in the template.
+    
+    Args:
+        item_id (str): The item ID.
         
-        fixed_content = '\n'.join(cleaned_lines)
+    Returns:
+        tuple: (prefix, number, template, coordinates), or None if the ID
+            does not end in '-<number>'.
+    """
+    if not isinstance(item_id, str):
+        return None
+    parts = item_id.split('-')
+    if len(parts) < 2 or not (parts[-1].isascii() and parts[-1].isdigit()):
+        return None
+    head = parts[:-1]
+    coordinates = []
+    template = []
+    for part in head:
+        if part.isascii() and part.isdigit():
+            coordinates.append(int(part))
+            template.append('*')
+        else:
+            template.append(part)
+    return '-'.join(head), int(parts[-1]), '-'.join(template), tuple(coordinates)
+
+def _item_template(item):
+    """
+    Extract the attributes shared by the items of a pattern.
+    
+    Args:
+        item (dict): The item to copy attributes from.
         
-        try:
-            data = json.loads(fixed_content)
-            print("Fixed JSON successfully using approach 2!")
-            return data
-        except json.JSONDecodeError:
-            print("Approach 2 failed. Trying approach 3...")
+    Returns:
+        dict: Pattern attributes.
+    """
+    # Extract name pattern from properties if available
+    properties = item.get('properties', {})
+    name_pattern = None
+    if 'name' in properties:
+        # Extract the part before the number
+        name_match = re.match(r'(.*)\s*-\s*\d+$', properties['name'])
+        if name_match:
+            name_pattern = name_match.group(1)
+    
+    return {
+        'item_type': item['type'],
+        'category': item['category'],
+        'layer_id': item['layerId'],
+        'color': item['color'],
+        'width': item['width'],
+        'height': item['height'],
+        'rotation': item.get('rotation', 0),
+        'scale': item.get('scale', 1),
+        'elevation_offset': item.get('elevationOffset', 0),
+        'name_pattern': name_pattern,
+        'properties': properties
+    }
+
+def _row_pattern(prefix, members, items):
+    """
+    Build a row pattern from the items sharing one ID prefix.
+    
+    Every existing item is an anchor; missing numbers between two anchors
+    are interpolated linearly, so rows may run in any direction and have
+    several gaps.
+    
+    Args:
+        prefix (str): The ID prefix.
+        members (list): Sorted (number, index) pairs.
+        items (list or MapItems): All items.
         
-        # Approach 3: Most aggressive - manually reconstruct the JSON
-        try:
-            # Split by commas at the beginning of lines
-            items = []
-            in_items = False
-            current_item = ""
-            
-            for line in content.split('\n'):
-                stripped = line.strip()
-                
-                if '"items": [' in stripped:
-                    in_items = True
-                    continue
-                elif in_items and stripped.startswith(',{'):
-                    if current_item:
-                        items.append(current_item)
-                    current_item = stripped[1:]  # Remove leading comma
-                elif in_items and (stripped.startswith('{') or stripped.startswith('"')):
-                    if current_item:
-                        items.append(current_item)
-                    current_item = stripped
-                elif in_items and stripped == ']':
-                    if current_item:
-                        items.append(current_item)
-                    in_items = False
-                    break
-                elif in_items:
-                    current_item += " " + stripped
-            
-            # Manually construct proper JSON
-            reconstructed_json = '{\n  "items": [\n    '
-            reconstructed_json += ',\n    '.join(items)
-            reconstructed_json += '\n  ]\n}'
-            
-            data = json.loads(reconstructed_json)
-            print("Fixed JSON successfully using approach 3!")
-            return data
-        except Exception as e:
-            print(f"Approach 3 failed with error: {e}")
+    Returns:
+        dict: The pattern, or None if the row does not move.
+    """
+    anchors = []
+    for number, index in members:
+        if anchors and anchors[-1][0] == number:
+            continue
+        item = items[index]
+        anchors.append((number, item['x'], item['y']))
+    
+    first_num, first_x, first_y = anchors[0]
+    last_num, last_x, last_y = anchors[-1]
+    if len(anchors) < 2 or all(x == first_x and y == first_y for _, x, y in anchors):
+        return None
+    
+    # Describe axis-aligned rows the way they are entered in plots.py
+    constant_axis = constant_value = start_value = end_value = None
+    if all(y == first_y for _, _, y in anchors):
+        constant_axis, constant_value, start_value, end_value = 'y', first_y, first_x, last_x
+    elif all(x == first_x for _, x, _ in anchors):
+        constant_axis, constant_value, start_value, end_value = 'x', first_x, first_y, last_y
+    
+    pattern = {
+        'kind': 'row',
+        'prefix': prefix,
+        'first_num': first_num,
+        'last_num': last_num,
+        'anchors': anchors,
+        'constant_axis': constant_axis,
+        'constant_value': constant_value,
+        'start_value': start_value,
+        'end_value': end_value
+    }
+    pattern.update(_item_template(items[members[0][1]]))
+    return pattern
+
+def _median_vector(vectors):
+    """Component-wise median of a list of (x, y) pairs."""
+    xs = sorted(v[0] for v in vectors)
+    ys = sorted(v[1] for v in vectors)
+    return xs[len(xs) // 2], ys[len(ys) // 2]
+
+def _close(a, b):
+    return abs(a[0] - b[0]) <= GRID_TOLERANCE and abs(a[1] - b[1]) <= GRID_TOLERANCE
+
+def _grid_pattern(template, rows, items):
+    """
+    Build a grid pattern from rows whose IDs differ only in grid coordinates.
+    
+    Each cell (one set of coordinates) must repeat the same arrangement of
+    item numbers, and cells must sit on a regular lattice; otherwise the
+    rows are not treated as a grid.
+    
+    Args:
+        template (str): ID template with '*' for each coordinate.
+        rows (dict): {coordinates: (prefix, sorted (number, index) pairs)}.
+        items (list or MapItems): All items.
         
-        # Approach 4: Custom parser for this specific format
-        try:
-            print("Trying custom parser for this specific format...")
-            
-            # Create a custom parser for the specific format in paste.txt
-            items = []
-            with open(file_path, 'r') as f:
-                lines = f.readlines()
-                
-                # Skip the first two lines (opening brace and "items": [)
-                i = 2
-                while i < len(lines):
-                    line = lines[i].strip()
-                    
-                    # Skip comment lines
-                    if line.startswith('//'):
-                        i += 1
-                        continue
-                    
-                    # If line starts with a comma and opening brace
-                    if line.startswith(',{'):
-                        # This is the start of an item
-                        item_json = line[1:]  # Remove leading comma
-                        
-                        # Check if the item spans multiple lines
-                        while not item_json.endswith('}') and i + 1 < len(lines):
-                            i += 1
-                            next_line = lines[i].strip()
-                            if not next_line.startswith('//'):  # Skip comments
-                                item_json += " " + next_line
-                        
-                        try:
-                            item = json.loads(item_json)
-                            items.append(item)
-                        except json.JSONDecodeError:
-                            print(f"Failed to parse item: {item_json}")
-                    
-                    i += 1
-            
-            if items:
-                print(f"Custom parser found {len(items)} items!")
-                return {"items": items}
-        except Exception as e:
-            print(f"Custom parser failed with error: {e}")
+    Returns:
+        dict: The pattern, or None if the rows do not form a grid.
+    """
+    positions = {}
+    count_by_number = defaultdict(int)
+    for coordinates, (_, members) in rows.items():
+        cell = {}
+        for number, index in members:
+            if number not in cell:
+                item = items[index]
+                cell[number] = (item['x'], item['y'])
+                count_by_number[number] += 1
+        positions[coordinates] = cell
+    
+    # Offsets of each item number from the most common one
+    reference = min(count_by_number, key=lambda number: (-count_by_number[number], number))
+    offsets = {}
+    origins = {}
+    for coordinates, cell in positions.items():
+        if reference not in cell:
+            continue
+        origin = cell[reference]
+        origins[coordinates] = origin
+        for number, (x, y) in cell.items():
+            offset = (x - origin[0], y - origin[1])
+            if number not in offsets:
+                offsets[number] = offset
+            elif not _close(offsets[number], offset):
+                return None
+    if len(origins) < 2:
+        return None
+    
+    # Lattice step of each coordinate axis, from cells that differ only on that axis
+    dimensions = len(next(iter(rows)))
+    steps = []
+    for axis in range(dimensions):
+        lines = defaultdict(list)
+        for coordinates in origins:
+            lines[coordinates[:axis] + coordinates[axis + 1:]].append(coordinates)
+        estimates = []
+        for line in lines.values():
+            line.sort(key=lambda coordinates: coordinates[axis])
+            for a, b in zip(line, line[1:]):
+                span = b[axis] - a[axis]
+                estimates.append(((origins[b][0] - origins[a][0]) / span, (origins[b][1] - origins[a][1]) / span))
+        if not estimates:
+            steps.append(None)
+            continue
+        step = _median_vector(estimates)
+        if not all(_close(step, estimate) for estimate in estimates):
+            return None
+        steps.append(step)
+    
+    # Predict cells without the reference item from the lattice; this also
+    # checks that known cells agree with it
+    base = min(origins)
+    if all(step is not None for step in steps):
+        for coordinates in origins:
+            if not _close(origins[coordinates], _lattice_origin(base, origins[base], steps, coordinates)):
+                return None
+    
+    ranges = [
+        (min(coordinates[axis] for coordinates in rows), max(coordinates[axis] for coordinates in rows))
+        for axis in range(dimensions)
+    ]
+    first_prefix, first_members = rows[min(rows)]
+    
+    pattern = {
+        'kind': 'grid',
+        'prefix': template,
+        'first_num': min(offsets),
+        'last_num': max(offsets),
+        'offsets': offsets,
+        'origins': origins,
+        'steps': steps,
+        'ranges': ranges,
+        'base': base,
+        'existing': {coordinates: set(cell) for coordinates, cell in positions.items()},
+        'constant_axis': None,
+        'constant_value': None,
+        'start_value': None,
+        'end_value': None
+    }
+    pattern.update(_item_template(items[first_members[0][1]]))
+    return pattern
+
+def _lattice_origin(base, base_origin, steps, coordinates):
+    """Origin of a grid cell predicted from a known cell and the lattice steps."""
+    x, y = base_origin
+    for axis, step in enumerate(steps):
+        x += (coordinates[axis] - base[axis]) * step[0]
+        y += (coordinates[axis] - base[axis]) * step[1]
+    return x, y
+
+def _group_key(name, rows, items):
+    """
+    Content hash of everything a row or grid analysis reads.
+    
+    That is the (number, x, y) of each member and the whole first item of
+    each row, which the pattern template is copied from.
+    
+    Args:
+        name (str): Row prefix or grid template.
+        rows (iterable): (prefix, sorted (number, index) pairs) per row.
+        items (list or MapItems): All items.
         
-        # If all approaches fail, print the first few lines of the file for debugging
-        with open(file_path, 'r') as file:
-            first_lines = [next(file) for _ in range(10)]
-            print("\nFirst 10 lines of the file for debugging:")
-            for i, line in enumerate(first_lines):
-                print(f"{i+1}: {line.rstrip()}")
+    Returns:
+        bytes: The key.
+    """
+    digest = hashlib.blake2b(repr((PATTERN_CACHE_VERSION, GRID_TOLERANCE, name)).encode('utf-8'), digest_size=16)
+    columnar = isinstance(items, MapItems)
+    if columnar:
+        xs, ys, shape_ids, extras = items.numeric['x'], items.numeric['y'], items.shape_ids, items.extras
+    for prefix, members in rows:
+        first = items[members[0][1]]
+        numbers = [number for number, _ in members]
+        indices = [index for _, index in members]
+        digest.update(repr((prefix, sorted(first.items()), numbers)).encode('utf-8'))
+        if columnar:
+            # Raw column bytes, plus the shapes and extras that say how the
+            # values were stored, so equal keys still mean equal content
+            digest.update(array('d', [xs[index] for index in indices]).tobytes())
+            digest.update(array('d', [ys[index] for index in indices]).tobytes())
+            member_shapes = {shape_ids[index] for index in indices}
+            if len(member_shapes) == 1 and not any(index in extras for index in indices):
+                digest.update(repr(items.shapes[member_shapes.pop()]).encode('utf-8'))
+            else:
+                digest.update(repr([(items.shapes[shape_ids[index]], extras.get(index)) for index in indices]).encode('utf-8'))
+        else:
+            digest.update(repr([(items[index].get('x'), items[index].get('y')) for index in indices]).encode('utf-8'))
+    return digest.digest()
+
+def analyze_group(name, rows, items, group_cache=None):
+    """
+    Detect the pattern of one row or grid of items.
+    
+    This is the per-group step of analyze_patterns, for callers that keep
+    their own ID groups up to date. A group whose only row has `name` as
+    its prefix is a row; any other group is a grid named by its template.
+    Rows need at least two items and grids at least two rows.
+    
+    Args:
+        name (str): The row's ID prefix or the grid's template, as returned
+            by parse_item_id.
+        rows (dict): {coordinates: (prefix, members)} for each row, where
+            members are the row's (number, index) pairs sorted by number.
+            A row is passed as {(): (prefix, members)}.
+        items (list or MapItems): The items the indices refer to.
+        group_cache: Optional group pattern cache, as for analyze_patterns.
         
+    Returns:
+        dict or None: The pattern, or None if the group has none.
+    """
+    if len(rows) == 1:
+        prefix, members = next(iter(rows.values()))
+        if prefix != name or len(members) < 2:
+            return None
+        analyze = lambda: _row_pattern(prefix, members, items)
+    elif rows:
+        analyze = lambda: _grid_pattern(name, rows, items)
+    else:
         return None
+    if group_cache is None:
+        return analyze()
+    key = _group_key(name, (rows[coordinates] for coordinates in sorted(rows)), items)
+    pattern = group_cache.get(key, _MISSING)
+    if pattern is _MISSING:
+        pattern = group_cache[key] = analyze()
+    return pattern
 
-def analyze_patterns(items):
+def analyze_patterns(items, group_cache=None):
     """
     Analyze the patterns in the existing items to detect groups.
     
+    IDs ending in '-<number>' are grouped by prefix into rows. Rows whose
+    prefixes differ only in numeric parts (e.g. 'square-0-1-plot' and
+    'square-2-1-plot') are combined into a grid pattern when their
+    positions sit on a regular lattice. Each ID is parsed once and each
+    group sorted once, so the analysis is O(n log n).
+    
+    With a `group_cache`, the result for each row or grid is looked up by a
+    hash of its members' content first, so only groups that changed since
+    a previous run are analysed again.
+    
     Args:
-        items (list): List of item dictionaries.
+        items (list or MapItems): Item dictionaries or columnar items.
+        group_cache: Optional mapping from group keys to patterns (or None
+            for groups without one) supporting `get` and item assignment,
+            e.g. map_cache.GroupPatternCache.
         
     Returns:
         dict: Dictionary of detected patterns and their properties.
     """
-    # Group items by their ID prefix
+    ids = items.ids if isinstance(items, MapItems) else [item['id'] for item in items]
+    
+    # Group item indices by their ID prefix, parsing each ID once
     prefix_groups = defaultdict(list)
+    templates = defaultdict(dict)
     
-    for item in items:
-        # Extract the prefix from the ID (everything before the last hyphen and number)
-        match = re.match(r'(.*)-\d+$', item['id'])
-        if match:
-            prefix = match.group(1)
-            prefix_groups[prefix].append(item)
+    for index, item_id in enumerate(ids):
+        parsed = parse_item_id(item_id)
+        if parsed:
+            prefix, number, template, coordinates = parsed
+            prefix_groups[prefix].append((number, index))
+            if coordinates:
+                templates[template][coordinates] = prefix
+    
+    for members in prefix_groups.values():
+        # Sort items by their number
+        members.sort()
     
-    # For each group, identify the first and last item to determine the range
     patterns = {}
+    in_grid = set()
     
-    for prefix, group_items in prefix_groups.items():
-        # Sort items by their number
-        sorted_items = sorted(group_items, key=lambda x: int(re.search(r'-(\d+)$', x['id']).group(1)))
-        
-        if len(sorted_items) >= 2:
-            first_item = sorted_items[0]
-            last_item = sorted_items[-1]
-            
-            # Determine which axis changes
-            first_num = int(re.search(r'-(\d+)$', first_item['id']).group(1))
-            last_num = int(re.search(r'-(\d+)$', last_item['id']).group(1))
-            
-            # Extract properties from the first item
-            item_type = first_item['type']
-            category = first_item['category']
-            layer_id = first_item['layerId']
-            color = first_item['color']
-            rotation = first_item.get('rotation', 0)
-            scale = first_item.get('scale', 1)
-            elevation_offset = first_item.get('elevationOffset', 0)
-            
-            # Determine if x or y is changing
-            if first_item['x'] != last_item['x'] and first_item['y'] == last_item['y']:
-                constant_axis = 'y'
-                constant_value = first_item['y']
-                start_value = first_item['x']
-                end_value = last_item['x']
-            elif first_item['y'] != last_item['y'] and first_item['x'] == last_item['x']:
-                constant_axis = 'x'
-                constant_value = first_item['x']
-                start_value = first_item['y']
-                end_value = last_item['y']
-            else:
-                # If both x and y change, or neither change, skip this group
-                continue
-            
-            # Get width and height
-            width = first_item['width']
-            height = first_item['height']
-            
-            # Extract name pattern from properties if available
-            properties = first_item.get('properties', {})
-            name_pattern = None
-            if 'name' in properties:
-                name = properties['name']
-                # Extract the part before the number
-                name_match = re.match(r'(.*)\s*-\s*\d+$', name)
-                if name_match:
-                    name_pattern = name_match.group(1)
-            
-            # Store the pattern details
-            patterns[prefix] = {
-                'prefix': prefix,
-                'first_num': first_num,
-                'last_num': last_num,
-                'item_type': item_type,
-                'category': category,
-                'layer_id': layer_id,
-                'constant_axis': constant_axis,
-                'constant_value': constant_value,
-                'start_value': start_value,
-                'end_value': end_value,
-                'width': width,
-                'height': height,
-                'rotation': rotation,
-                'scale': scale,
-                'color': color,
-                'elevation_offset': elevation_offset,
-                'name_pattern': name_pattern,
-                'properties': properties
-            }
+    for template, cells in templates.items():
+        rows = {coordinates: (prefix, prefix_groups[prefix]) for coordinates, prefix in cells.items()}
+        pattern = analyze_group(template, rows, items, group_cache)
+        if pattern:
+            patterns[template] = pattern
+            in_grid.update(cells.values())
+    
+    for prefix, members in prefix_groups.items():
+        if prefix in in_grid:
+            continue
+        pattern = analyze_group(prefix, {(): (prefix, members)}, items, group_cache)
+        if pattern:
+            patterns[prefix] = pattern
     
     return patterns
 
-def generate_missing_items(patterns):
+def describe_pattern(pattern):
+    """
+    Summarize a detected pattern in one line.
+    
+    Args:
+        pattern (dict): A pattern from analyze_patterns.
+        
+    Returns:
+        str: The description.
+    """
+    if pattern['kind'] == 'grid':
+        ranges = ' x '.join(f"{low}..{high}" for low, high in pattern['ranges'])
+        return f"grid {ranges}, items {pattern['first_num']} to {pattern['last_num']} per cell"
+    if pattern['constant_axis']:
+        location = f"{pattern['constant_axis']} = {pattern['constant_value']}"
+    else:
+        location = "diagonal"
+    gaps = len(pattern['anchors']) - 1
+    return f"Items {pattern['first_num']} to {pattern['last_num']} ({location}, {gaps} segment{'s' if gaps != 1 else ''})"
+
+def _position(value, integral):
+    # Round to integers if original values were integers
+    return round(value) if integral else round(value, 3)
+
+def _pattern_item(pattern, item_id, number, x, y):
+    """
+    Create one generated item from a pattern.
+    
+    Args:
+        pattern (dict): The pattern.
+        item_id (str): ID of the new item.
+        number (int): Item number used in its name.
+        x (float): X position.
+        y (float): Y position.
+        
+    Returns:
+        dict: The item.
+    """
+    # Prepare properties
+    properties = {}
+    if pattern['name_pattern']:
+        properties = {"name": f"{pattern['name_pattern']}-{number}"}
+    elif 'properties' in pattern and pattern['properties']:
+        properties = pattern['properties'].copy()
+    
+    return {
+        "id": item_id,
+        "type": pattern['item_type'],
+        "category": pattern['category'],
+        "x": x,
+        "y": y,
+        "width": pattern['width'],
+        "height": pattern['height'],
+        "rotation": pattern['rotation'],
+        "scale": pattern['scale'],
+        "color": pattern['color'],
+        "layerId": pattern['layer_id'],
+        "elevationOffset": pattern['elevation_offset'],
+        "properties": properties
+    }
+
+def _missing_row_items(pattern):
+    """Yield the items missing between consecutive anchors of a row pattern."""
+    prefix = pattern['prefix']
+    anchors = pattern['anchors']
+    for (n0, x0, y0), (n1, x1, y1) in zip(anchors, anchors[1:]):
+        integral = all(isinstance(v, int) for v in (x0, y0, x1, y1))
+        for i in range(n0 + 1, n1):
+            x = _position(x0 + (i - n0) * (x1 - x0) / (n1 - n0), integral)
+            y = _position(y0 + (i - n0) * (y1 - y0) / (n1 - n0), integral)
+            yield _pattern_item(pattern, f"{prefix}-{i}", i, x, y)
+
+def _missing_grid_items(pattern):
+    """Yield the items missing from the cells of a grid pattern."""
+    offsets = pattern['offsets']
+    origins = pattern['origins']
+    existing = pattern['existing']
+    steps = pattern['steps']
+    complete_lattice = all(step is not None for step in steps)
+    integral = all(
+        isinstance(v, int) for origin in origins.values() for v in origin
+    ) and all(float(v).is_integer() for offset in offsets.values() for v in offset)
+    template = pattern['prefix'].split('-')
+    base = pattern['base']
+    
+    for coordinates in itertools.product(*(range(low, high + 1) for low, high in pattern['ranges'])):
+        origin = origins.get(coordinates)
+        if origin is None:
+            if not complete_lattice:
+                continue
+            origin = _lattice_origin(base, origins[base], steps, coordinates)
+        present = existing.get(coordinates, ())
+        values = iter(coordinates)
+        prefix = '-'.join(str(next(values)) if part == '*' else part for part in template)
+        for number in sorted(offsets):
+            if number in present:
+                continue
+            dx, dy = offsets[number]
+            x = _position(origin[0] + dx, integral)
+            y = _position(origin[1] + dy, integral)
+            yield _pattern_item(pattern, f"{prefix}-{number}", number, x, y)
+
+def generate_missing_items(patterns, columnar=False):
     """
     Generate the missing items based on the detected patterns.
     
     Args:
         patterns (dict): Dictionary of detected patterns.
+        columnar (bool): Whether to collect the items in a MapItems container.
         
     Returns:
-        list: List of generated items.
+        list or MapItems: The generated items.
     """
-    all_items = []
+    all_items = MapItems() if columnar else []
     
-    for prefix, pattern in patterns.items():
-        # Generate all items in the range
-        for i in range(pattern['first_num'], pattern['last_num'] + 1):
-            # Skip existing items (first and last)
-            if i == pattern['first_num'] or i == pattern['last_num']:
-                continue
-            
-            # Calculate position based on the pattern
-            if pattern['constant_axis'] == 'y':
-                x = pattern['start_value'] + (i - pattern['first_num']) * (pattern['end_value'] - pattern['start_value']) / (pattern['last_num'] - pattern['first_num'])
-                y = pattern['constant_value']
-            else:
-                x = pattern['constant_value']
-                y = pattern['start_value'] + (i - pattern['first_num']) * (pattern['end_value'] - pattern['start_value']) / (pattern['last_num'] - pattern['first_num'])
-            
-            # Round to integers if original values were integers
-            x = round(x)
-            y = round(y)
-            
-            # Prepare properties
-            properties = {}
-            if pattern['name_pattern']:
-                properties = {"name": f"{pattern['name_pattern']}-{i}"}
-            elif 'properties' in pattern and pattern['properties']:
-                properties = pattern['properties'].copy()
+    for pattern in patterns.values():
+        if pattern['kind'] == 'grid':
+            all_items.extend(_missing_grid_items(pattern))
+        else:
+            all_items.extend(_missing_row_items(pattern))
+    
+    return all_items
+
+class ItemIndex:
+    """
+    Items kept in merge order, for applying many small patches cheaply.
+    
+    Each item's sort key is computed once when it is added. New items are
+    placed by bisection, or by one linear merge when a batch is large, so
+    applying a patch never re-sorts the whole map. Ties keep arrival order,
+    which matches the stable sort merge_items has always used.
+    """
+    
+    def __init__(self, items=()):
+        keyed = [(id_sort_key(item.get('id', '')), seq, item) for seq, item in enumerate(items)]
+        keyed.sort(key=lambda entry: entry[:2])
+        self.keys = [entry[:2] for entry in keyed]
+        self.items = [entry[2] for entry in keyed]
+        self.ids = set(item.get('id') for item in self.items)
+        self._seq = len(keyed)
+    
+    def __len__(self):
+        return len(self.items)
+    
+    def __iter__(self):
+        return iter(self.items)
+    
+    def __contains__(self, item_id):
+        return item_id in self.ids
+    
+    def add(self, item):
+        """
+        Insert one item unless its ID is already present.
+        
+        Args:
+            item (dict): The item to insert.
             
-            # Create the item
-            item = {
-                "id": f"{prefix}-{i}",
-                "type": pattern['item_type'],
-                "category": pattern['category'],
-                "x": x,
-                "y": y,
-                "width": pattern['width'],
-                "height": pattern['height'],
-                "rotation": pattern['rotation'],
-                "scale": pattern['scale'],
-                "color": pattern['color'],
-                "layerId": pattern['layer_id'],
-                "elevationOffset": pattern['elevation_offset'],
-                "properties": properties
-            }
+        Returns:
+            bool: True if the item was inserted.
+        """
+        item_id = item.get('id')
+        if item_id in self.ids:
+            return False
+        key = (id_sort_key(item_id or ''), self._seq)
+        self._seq += 1
+        position = bisect.bisect_right(self.keys, key)
+        self.keys.insert(position, key)
+        self.items.insert(position, item)
+        self.ids.add(item_id)
+        return True
+    
+    def update(self, items):
+        """
+        Insert many items, skipping IDs that are already present.
+        
+        Small batches are bisected in; large ones are sorted on their own
+        and merged in a single linear pass.
+        
+        Args:
+            items (iterable): The items to insert.
             
-            all_items.append(item)
+        Returns:
+            int: Number of items inserted.
+        """
+        batch = []
+        batch_ids = set()
+        for item in items:
+            item_id = item.get('id')
+            if item_id not in self.ids and item_id not in batch_ids:
+                batch_ids.add(item_id)
+                batch.append(item)
+        
+        if len(batch) * 8 < len(self.items):
+            for item in batch:
+                self.add(item)
+            return len(batch)
+        
+        self.ids.update(batch_ids)
+        keyed = []
+        for item in batch:
+            keyed.append(((id_sort_key(item.get('id') or ''), self._seq), item))
+            self._seq += 1
+        keyed.sort(key=lambda entry: entry[0])
+        merged = list(heapq.merge(zip(self.keys, self.items), keyed, key=lambda entry: entry[0]))
+        self.keys = [entry[0] for entry in merged]
+        self.items = [entry[1] for entry in merged]
+        return len(batch)
     
-    return all_items
+    def to_list(self):
+        """
+        Return the items in merge order.
+        
+        Returns:
+            list: The items.
+        """
+        return list(self.items)
 
 def merge_items(original_data, new_items):
     """
     Merge the original data with new items, keeping the structure.
     
+    The original data and its items list are never modified.
+    
     Args:
         original_data (dict): Original JSON data.
         new_items (list): List of new items to add.
@@ -339,33 +1152,205 @@ def merge_items(original_data, new_items):
     Returns:
         dict: Merged data.
     """
-    # Make a deep copy of the original data
+    # Copy the top level so the original keeps its own items
     merged_data = {key: value for key, value in original_data.items()}
     
     # Extract existing items
     existing_items = merged_data.get('items', [])
     
-    # Get existing IDs to avoid duplicates
-    existing_ids = set(item.get('id') for item in existing_items)
+    if isinstance(existing_items, MapItems):
+        return _merge_columnar(merged_data, existing_items, new_items)
+    
+    # Sort existing items once, then add new items that don't already exist
+    index = ItemIndex(existing_items)
+    index.update(new_items)
+    
+    # Update the items in the merged data
+    merged_data['items'] = index.to_list()
+    
+    return merged_data
+
+def merge_patch_files(original_data, patch_paths):
+    """
+    Merge the items of several patch files into the original data in one pass.
+    
+    Each source is sorted on its own and the sorted streams are combined
+    with a k-way merge. The result is the same as calling merge_items with
+    each patch in turn: every original item is kept, duplicates and items
+    without an ID included, and a patch item is only added if no earlier
+    item (original, earlier patch or earlier in its own patch) has its ID.
+    
+    Args:
+        original_data (dict): Original JSON data.
+        patch_paths (list): Paths of map files whose items should be added.
+        
+    Returns:
+        dict: Merged data.
+        
+    Raises:
+        MapParseError: If a patch file is malformed.
+    """
+    merged_data = {key: value for key, value in original_data.items()}
+    existing_items = merged_data.get('items', [])
+    
+    sources = [existing_items]
+    for path in patch_paths:
+        sources.append(list(iter_json_items(path)))
+    
+    def keyed(source, rank):
+        keys = [(id_sort_key(item.get('id') or ''), rank, seq) for seq, item in enumerate(source)]
+        order = sorted(range(len(keys)), key=keys.__getitem__)
+        return ((keys[i], source[i]) for i in order)
+    
+    # As in ItemIndex, the original's IDs (None included) are taken up front
+    taken = set(existing_items.ids) if isinstance(existing_items, MapItems) else {item.get('id') for item in existing_items}
+    merged = []
+    for key, item in heapq.merge(*(keyed(source, rank) for rank, source in enumerate(sources)), key=lambda entry: entry[0]):
+        if key[1] == 0:
+            merged.append(item)
+            continue
+        item_id = item.get('id')
+        if item_id not in taken:
+            taken.add(item_id)
+            merged.append(item)
+    
+    merged_data['items'] = MapItems.from_items(merged) if isinstance(existing_items, MapItems) else merged
+    return merged_data
+
+def id_sort_key(item_id):
+    """
+    Sort key used to order merged items by ID.
+    
+    Args:
+        item_id (str): The item ID.
+        
+    Returns:
+        tuple: (prefix, section, number).
+    """
+    parts = item_id.split('-')
+    last = parts[-1]
+    return (
+        parts[0],  # Sort by prefix
+        parts[1] if len(parts) > 1 else '',  # Then by section
+        int(last) if len(parts) > 1 and last.isascii() and last.isdigit() else 0  # Then by number
+    )
+
+def _merge_columnar(merged_data, existing_items, new_items):
+    """
+    merge_items for columnar data: append to a copy, then reorder by index.
+    
+    Args:
+        merged_data (dict): Shallow copy of the original data.
+        existing_items (MapItems): The original items.
+        new_items (iterable): Items to add.
+        
+    Returns:
+        dict: Merged data.
+    """
+    merged = existing_items.copy()
+    existing_ids = set(merged.ids)
     
-    # Add new items if they don't already exist
     for new_item in new_items:
         if new_item.get('id') not in existing_ids:
-            existing_items.append(new_item)
+            merged.append(new_item)
             existing_ids.add(new_item.get('id'))
     
-    # Sort items by their ID for better organization
-    sorted_items = sorted(existing_items, key=lambda x: (
-        x.get('id', '').split('-')[0],  # Sort by prefix
-        x.get('id', '').split('-')[1] if len(x.get('id', '').split('-')) > 1 else '',  # Then by section
-        int(re.search(r'-(\d+)$', x.get('id', '')).group(1)) if re.search(r'-(\d+)$', x.get('id', '')) else 0  # Then by number
-    ))
-    
-    # Update the items in the merged data
-    merged_data['items'] = sorted_items
+    keys = [id_sort_key(item_id or '') for item_id in merged.ids]
+    order = sorted(range(len(merged)), key=keys.__getitem__)
+    merged_data['items'] = merged.take(order)
     
     return merged_data
 
+def write_leading_comma_items(items, file):
+    """
+    Stream items to a file handle in the leading-comma format.
+    
+    Only one item is serialized at a time, so memory does not grow with the
+    number of items.
+    
+    Args:
+        items (iterable): The items to write.
+        file: Writable text file handle.
+    """
+    write = file.write
+    write("{\n  \"items\": [")
+    
+    separator = "\n    "
+    for item in items:
+        # Indent every line of the item and add the comma before all but the first
+        write(separator)
+        write(json.dumps(item, indent=2).replace("\n", "\n    "))
+        separator = "\n    ,"
+    
+    write("\n  ]\n}")
+
+def write_json(data, file, margin=""):
+    """
+    Stream data to a file handle as standard JSON with indent=2.
+    
+    The output is identical to json.dump(data, file, indent=2), but the
+    items are serialized one at a time and may be any iterable, including
+    MapItems or a generator.
+    
+    Args:
+        data (dict): The data to write, or an iterable of (key, value) pairs.
+        file: Writable text file handle.
+        margin (str): Indentation added to every line after the first, for
+            writing the object nested inside a larger document.
+    """
+    write = file.write
+    write("{")
+    
+    member_indent = "\n" + margin + "  "
+    item_indent = member_indent + "  "
+    separator = member_indent
+    for key, value in (data.items() if isinstance(data, dict) else data):
+        write(separator)
+        write(json.dumps(key))
+        write(": ")
+        separator = "," + member_indent
+        
+        if key != 'items' or not isinstance(value, (list, tuple, MapItems, Iterator)):
+            write(json.dumps(value, indent=2, default=_json_default).replace("\n", member_indent))
+            continue
+        
+        item_separator = "[" + item_indent
+        for item in value:
+            write(item_separator)
+            write(json.dumps(item, indent=2).replace("\n", item_indent))
+            item_separator = "," + item_indent
+        write("[]" if item_separator == "[" + item_indent else member_indent + "]")
+    
+    write("\n" + margin + "}" if separator != member_indent else "}")
+
+def stream_members(data, overrides=None):
+    """
+    Yield the (key, value) pairs of a dict that is still being filled.
+    
+    Meant for the header dict of `iter_json_items`: keys that follow the
+    items array only appear once the items have been consumed. The dict is
+    re-read after each pair, so such keys are still yielded, in file order,
+    when the consumer (e.g. `write_json`) reaches them.
+    
+    Args:
+        data (dict): The dict being filled.
+        overrides (dict): Values to yield instead of those in `data`, e.g.
+            an item iterator for 'items'.
+    
+    Yields:
+        tuple: (key, value) pairs.
+    """
+    if overrides is None:
+        overrides = {}
+    position = 0
+    while True:
+        keys = list(data)
+        if position >= len(keys):
+            return
+        key = keys[position]
+        position += 1
+        yield key, overrides[key] if key in overrides else data[key]
+
 def format_output_file(data):
     """
     Format the output file with leading commas for each item (no trailing commas).
@@ -376,69 +1361,329 @@ def format_output_file(data):
     Returns:
         str: Formatted string.
     """
-    # First convert to pretty JSON
-    json_str = json.dumps(data, indent=2)
+    buffer = io.StringIO()
+    write_leading_comma_items(data["items"], buffer)
+    return buffer.getvalue()
+
+def _json_default(value):
+    """Serialize MapItems containers as plain item lists."""
+    if isinstance(value, MapItems):
+        return value.to_items()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+def _open_text(file_path, mode):
+    """Open a text file, transparently (de)compressing '.gz' paths."""
+    encoding = 'utf-8-sig' if mode == 'r' else 'utf-8'
+    if file_path.endswith('.gz'):
+        return gzip.open(file_path, mode + 't', encoding=encoding)
+    return open(file_path, mode, encoding=encoding)
+
+@contextlib.contextmanager
+def open_atomic(file_path, compress=None):
+    """
+    Open a text file for writing that only appears once it is complete.
     
-    # Now reformat to match the specific style needed
-    formatted_output = "{\n  \"items\": ["
+    Output goes to a temporary file in the same directory, which replaces
+    the target in one rename when the block exits without an error, so a
+    crash never leaves a half-written file behind.
     
-    first_item = True
-    for item in data["items"]:
-        item_json = json.dumps(item, indent=2)
-        
-        # Format with indentation
-        indented_item = "\n    "
-        lines = item_json.split("\n")
-        indented_item += "\n    ".join(lines)
-        
-        # Add comma in the right place (before each item except the first)
-        if first_item:
-            formatted_output += indented_item
-            first_item = False
-        else:
-            formatted_output += f"\n    ,{indented_item[5:]}"  # Skip the initial indentation
+    Args:
+        file_path (str): Path of the file to write.
+        compress (bool): Whether to gzip the output. Defaults to True for
+            paths ending in '.gz'.
     
-    formatted_output += "\n  ]\n}"
+    Yields:
+        Writable text file handle.
+    """
+    if compress is None:
+        compress = file_path.endswith('.gz')
     
-    return formatted_output
+    directory = os.path.dirname(os.path.abspath(file_path))
+    descriptor, temp_path = tempfile.mkstemp(
+        prefix=f".{os.path.basename(file_path)}.", suffix=".tmp", dir=directory
+    )
+    try:
+        with os.fdopen(descriptor, 'wb') as raw:
+            stream = gzip.GzipFile(fileobj=raw, mode='wb') if compress else raw
+            file = io.TextIOWrapper(stream, encoding='utf-8')
+            yield file
+            file.flush()
+            file.detach()
+            if compress:
+                # Writes the gzip trailer without closing the underlying file
+                stream.close()
+            raw.flush()
+            os.fsync(raw.fileno())
+        
+        # mkstemp creates the file as 0600; give it the usual permissions
+        umask = os.umask(0)
+        os.umask(umask)
+        os.chmod(temp_path, 0o666 & ~umask)
+        os.replace(temp_path, file_path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
 
-def save_file(data, file_path, use_leading_commas=True):
+def save_file(data, file_path, use_leading_commas=True, compress=None):
     """
     Save the data to a file.
     
+    Items are streamed through `open_atomic`, so a crash never leaves a
+    half-written map behind.
+    
     Args:
         data (dict): The data to save.
         file_path (str): Path to save the file.
         use_leading_commas (bool): Whether to use leading commas for items.
+        compress (bool): Whether to gzip the output. Defaults to True for
+            paths ending in '.gz'.
         
     Returns:
         bool: True if successful, False otherwise.
     """
     try:
-        if use_leading_commas:
-            # Format with leading commas
-            formatted_data = format_output_file(data)
-            with open(file_path, 'w') as file:
-                file.write(formatted_data)
-        else:
-            # Standard JSON formatting
-            with open(file_path, 'w') as file:
-                json.dump(data, file, indent=2)
-        
+        with open_atomic(file_path, compress) as file:
+            if use_leading_commas:
+                # Format with leading commas
+                write_leading_comma_items(data["items"], file)
+            else:
+                # Standard JSON formatting
+                write_json(data, file)
         return True
     except Exception as e:
         print(f"Error saving file: {e}")
         return False
 
+def _pop_option(args, name):
+    """Remove `name value` from a list of command-line arguments and return the value."""
+    if name not in args:
+        return None
+    position = args.index(name)
+    if position + 1 >= len(args):
+        raise SystemExit(f"{name} needs a value")
+    value = args[position + 1]
+    del args[position:position + 2]
+    return value
+
+def expand_input_paths(patterns):
+    """
+    Expand command-line paths and glob patterns into map files.
+    
+    Files matched by a glob whose name ends in `_complete` (the output of
+    an earlier run) are skipped, so a batch never reprocesses its own
+    results. Plain paths are kept even if missing, to be reported.
+    
+    Args:
+        patterns (list): Paths or glob patterns ('**' matches directories
+            recursively).
+    
+    Returns:
+        list: Unique paths in argument order.
+    """
+    paths = []
+    for pattern in patterns:
+        if any(char in pattern for char in '*?['):
+            matches = sorted(
+                path for path in glob.glob(pattern, recursive=True)
+                if os.path.isfile(path) and not os.path.splitext(path)[0].endswith('_complete')
+            )
+        else:
+            matches = [pattern]
+        for path in matches:
+            if path not in paths:
+                paths.append(path)
+    return paths
+
+def _process_batch_file(input_file, use_cache, overlaps, validate=False):
+    """Run one file of a batch non-interactively and summarize the run."""
+    from map_instrument import Instrumentation
+    
+    instrumentation = Instrumentation()
+    output = io.StringIO()
+    result = {'input': input_file}
+    try:
+        with contextlib.redirect_stdout(output):
+            summary = _run(input_file, [input_file], use_cache, instrumentation, overlaps, validate,
+                           raise_load_errors=True)
+    except Exception as e:
+        summary = None
+        result['error'] = f"{type(e).__name__}: {e}"
+    if summary:
+        result.update(summary)
+    elif 'error' not in result:
+        # _run prints why it stopped as its last line
+        lines = output.getvalue().strip().splitlines()
+        result['error'] = lines[-1] if lines else "Nothing was saved"
+    total = instrumentation.report()['total']
+    result['seconds'] = total['wall_seconds']
+    result['cpu_seconds'] = total['cpu_seconds']
+    result['stages'] = {record['stage']: record['wall_seconds'] for record in instrumentation.stages}
+    return result
+
+def run_batch(paths, jobs=None, use_cache=True, overlaps=None, on_result=None, validate=False):
+    """
+    Fill the gaps of many map files across a pool of processes.
+    
+    Each file is processed like a single-file command-line run and saved
+    atomically next to its input as `<name>_complete.json`. A worker
+    handles one file at a time with the streaming loader, and is replaced
+    after BATCH_TASKS_PER_WORKER files, so memory per worker stays bounded
+    by the largest map rather than growing over the batch. A failure in
+    one file is recorded in its result and does not stop the others.
+    
+    Args:
+        paths (list): Map files.
+        jobs (int): Worker processes; defaults to the number of CPUs. With
+            one job the files are processed in this process.
+        use_cache (bool): Whether to use the parse and pattern cache.
+        overlaps (str): None, 'report' or 'strict' (see --check-overlaps).
+        on_result (callable): Called with each result as it completes.
+        validate (bool): Whether to check each output against the map
+            schemas before saving (see --validate).
+    
+    Returns:
+        list: One result dict per path, in input order, with 'input',
+            'seconds', 'stages' and either the counts returned by a
+            successful run or an 'error'.
+    """
+    jobs = max(1, min(jobs or os.cpu_count() or 1, len(paths)))
+    results = [None] * len(paths)
+    
+    def finish(position, result):
+        results[position] = result
+        if on_result:
+            on_result(result)
+    
+    if jobs == 1:
+        for position, path in enumerate(paths):
+            finish(position, _process_batch_file(path, use_cache, overlaps, validate))
+        return results
+    
+    with ProcessPoolExecutor(max_workers=jobs, max_tasks_per_child=BATCH_TASKS_PER_WORKER) as pool:
+        futures = {
+            pool.submit(_process_batch_file, path, use_cache, overlaps, validate): position
+            for position, path in enumerate(paths)
+        }
+        for future in as_completed(futures):
+            position = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                # The worker itself died, e.g. killed for running out of memory
+                result = {'input': paths[position], 'error': f"{type(e).__name__}: {e}",
+                          'seconds': 0, 'cpu_seconds': 0, 'stages': {}}
+            finish(position, result)
+    return results
+
+def print_batch_report(results, wall_seconds):
+    """
+    Print one line per file of a batch, then the batch totals.
+    
+    Args:
+        results (list): Output of run_batch.
+        wall_seconds (float): Elapsed time of the whole batch.
+    """
+    width = max([len(result['input']) for result in results] + [4])
+    print(f"\n{'File':<{width}}  {'Patterns':>8}  {'Generated':>9}  {'Items':>9}  {'Seconds':>8}")
+    for result in results:
+        if 'error' in result:
+            print(f"{result['input']:<{width}}  failed: {result['error']}")
+        else:
+            print(f"{result['input']:<{width}}  {result['patterns']:>8}  {result['generated']:>9}  "
+                  f"{result['total_items']:>9}  {result['seconds']:>8.2f}")
+    
+    succeeded = [result for result in results if 'error' not in result]
+    items = sum(result['items'] for result in succeeded)
+    cpu_seconds = sum(result['cpu_seconds'] for result in results)
+    print(f"\n{len(succeeded)} of {len(results)} files saved: "
+          f"{sum(result['patterns'] for result in succeeded)} patterns, "
+          f"{sum(result['generated'] for result in succeeded)} items generated")
+    if wall_seconds > 0:
+        print(f"Batch took {wall_seconds:.2f}s for {cpu_seconds:.2f}s of CPU time "
+              f"({cpu_seconds / wall_seconds:.1f}x parallel), {items / wall_seconds:,.0f} input items/s")
+
 def main():
     import sys
+    from map_instrument import Instrumentation
     
     print("JSON Layout Analyzer & Gap Filler")
     print("=================================")
     
+    args = [arg for arg in sys.argv[1:] if arg != '--no-cache']
+    use_cache = len(args) == len(sys.argv) - 1
+    
+    # --check-overlaps reports generated items that collide; --strict-overlaps
+    # also refuses to save them
+    overlaps = 'strict' if '--strict-overlaps' in args else 'report' if '--check-overlaps' in args else None
+    args = [arg for arg in args if arg not in ('--check-overlaps', '--strict-overlaps')]
+    
+    # --validate refuses to save output that the app's map schemas would reject
+    validate = '--validate' in args
+    args = [arg for arg in args if arg != '--validate']
+    report_file = _pop_option(args, '--report')
+    profile_file = _pop_option(args, '--profile')
+    jobs = _pop_option(args, '--jobs')
+    
+    # Keep the outputs of the given maps up to date as they are edited
+    if '--watch' in args:
+        from map_watch import watch_files
+        paths = expand_input_paths([arg for arg in args if arg != '--watch'])
+        if not paths:
+            print("No input files matched.")
+            return
+        watch_files(paths, overlaps=overlaps, validate=validate)
+        return
+    
+    # Add the items of patch files to a map in one k-way merge
+    if '--merge' in args:
+        paths = [arg for arg in args if arg != '--merge']
+        if len(paths) < 2:
+            print("Usage: python plots2.py --merge <map.json> <patch.json> [more patches...]")
+            return
+        input_file, patch_files = paths[0], paths[1:]
+        data = load_json_file(input_file, columnar=True)
+        if not data:
+            print("Failed to load JSON data. Please check the file format.")
+            return
+        try:
+            merged_data = merge_patch_files(data, patch_files)
+        except (MapParseError, OSError) as e:
+            print(f"Merge failed: {e}")
+            return
+        output_file = f"{os.path.splitext(input_file)[0]}_merged.json"
+        if save_file(merged_data, output_file):
+            added = len(merged_data['items']) - len(data.get('items', []))
+            print(f"Merged {len(patch_files)} patch file(s) into {output_file}")
+            print(f"Added {added} items, total items: {len(merged_data['items'])}")
+        return
+    
+    # Several paths, a glob or --jobs: process the files as a batch
+    if jobs is not None or len(args) > 1 or (args and any(char in args[0] for char in '*?[')):
+        paths = expand_input_paths(args)
+        if not paths:
+            print("No input files matched.")
+            return
+        print(f"Processing {len(paths)} files...")
+        started = time.perf_counter()
+        results = run_batch(
+            paths, int(jobs) if jobs else None, use_cache, overlaps,
+            on_result=lambda result: print(f"  {'failed' if 'error' in result else 'done'}: {result['input']}"),
+            validate=validate
+        )
+        wall_seconds = time.perf_counter() - started
+        print_batch_report(results, wall_seconds)
+        if report_file:
+            with open(report_file, 'w', encoding='utf-8') as file:
+                json.dump({'wall_seconds': wall_seconds, 'files': results}, file, indent=2)
+            print(f"Saved batch report to {report_file}")
+        if profile_file:
+            print("--profile only applies to single-file runs.")
+        return
+    
     # Get input file from command-line arguments or prompt
-    if len(sys.argv) > 1:
-        input_file = sys.argv[1]
+    if args:
+        input_file = args[0]
     else:
         input_file = input("Enter the path to your JSON file: ")
     
@@ -446,8 +1691,42 @@ def main():
         print(f"File not found: {input_file}")
         return
     
-    # Load the JSON data
-    data = load_json_file(input_file)
+    instrumentation = Instrumentation(profile=profile_file is not None)
+    try:
+        _run(input_file, args, use_cache, instrumentation, overlaps, validate)
+    finally:
+        if report_file and instrumentation.save_report(report_file):
+            print(f"Saved run report to {report_file}")
+        if profile_file and instrumentation.save_profile(profile_file):
+            print(f"Saved profile to {profile_file}")
+
+def _run(input_file, args, use_cache, instrumentation, overlaps=None, validate=False, raise_load_errors=False):
+    """
+    Load, analyze, fill and save one map, timing each stage.
+    
+    With raise_load_errors, a file that cannot be read or parsed raises
+    its MapParseError (with line and column) or OSError instead of being
+    reported on stdout, so batch runs can record it.
+    
+    Returns:
+        dict: Counts of the run ('output', 'items', 'patterns', 'generated',
+            'total_items'), or None if nothing was saved.
+    """
+    stage = instrumentation.stage
+    
+    # Load the JSON data, reusing the parse and analysis of unchanged input
+    with stage('load', input=input_file, cached=False) as record:
+        stats = {}
+        if use_cache:
+            from map_cache import MapCache, analyze_patterns_cached, load_map_cached
+            cache = MapCache()
+            data, digest = load_map_cached(input_file, cache, stats, raise_load_errors)
+            record['cached'] = data is not None and not stats
+        else:
+            data = load_json_file(input_file, columnar=True, stats=stats, raise_errors=raise_load_errors)
+        record['bytes_read'] = os.path.getsize(input_file)
+        record.update(stats)
+        record['items'] = len(data.get('items', [])) if data else 0
     if not data:
         print("Failed to load JSON data. Please check the file format.")
         return
@@ -461,7 +1740,12 @@ def main():
     print(f"Loaded {len(items)} items from the file.")
     
     # Analyze patterns
-    patterns = analyze_patterns(items)
+    with stage('analyze_patterns', items=len(items)) as record:
+        if use_cache:
+            patterns = analyze_patterns_cached(items, digest, cache)
+        else:
+            patterns = analyze_patterns(items)
+        record['patterns'] = len(patterns)
     
     if not patterns:
         print("No patterns detected in the existing items.")
@@ -469,18 +1753,20 @@ def main():
     
     print(f"Detected {len(patterns)} patterns:")
     for prefix, pattern in patterns.items():
-        print(f"  - {prefix}: Items {pattern['first_num']} to {pattern['last_num']} ({pattern['constant_axis']} = {pattern['constant_value']})")
+        print(f"  - {prefix}: {describe_pattern(pattern)}")
     
     # Generate missing items
     print("\nGenerating missing items...")
-    new_items = generate_missing_items(patterns)
+    with stage('generate_missing_items', patterns=len(patterns)) as record:
+        new_items = generate_missing_items(patterns, columnar=True)
+        record['items'] = len(new_items)
     print(f"Generated {len(new_items)} missing items.")
     
     # Create default output filename
     default_output_file = f"{os.path.splitext(input_file)[0]}_complete.json"
     
     # Determine if we're in non-interactive mode (command-line usage)
-    non_interactive = len(sys.argv) > 1
+    non_interactive = bool(args)
     
     # In non-interactive mode, use defaults without prompting
     if non_interactive:
@@ -510,12 +1796,57 @@ def main():
         use_commas = input("Use leading commas for each item? (y/n, default: y): ").lower() != 'n'
     
     # Merge with original data
-    merged_data = merge_items(data, new_items)
+    with stage('merge_items', items=len(items) + len(new_items)) as record:
+        merged_data = merge_items(data, new_items)
+        record['items'] = len(merged_data['items'])
+    
+    # Check the generated items against everything else on the map
+    if overlaps:
+        from map_overlaps import summarize_conflicts, validate_overlaps
+        with stage('check_overlaps', items=len(merged_data['items'])) as record:
+            generated_ids = {item.get('id') for item in new_items}
+            conflicts = validate_overlaps(merged_data['items'], involving=generated_ids)
+            record['conflicts'] = len(conflicts)
+        if conflicts:
+            print(f"\n{len(conflicts)} overlapping pair(s) involve generated items:")
+            for pair, count in summarize_conflicts(conflicts).items():
+                print(f"  - {pair}: {count}")
+            for conflict in conflicts[:5]:
+                print(f"    {conflict['ids'][0]} <-> {conflict['ids'][1]}")
+            if overlaps == 'strict':
+                print("Not saving because of overlapping items (--strict-overlaps).")
+                return
+        else:
+            print("No generated items overlap other items.")
+    
+    # Check the output against the map schemas the app parses it with
+    if validate:
+        from map_validate import format_error, validate_map
+        with stage('validate', items=len(merged_data['items'])) as record:
+            errors, error_count = validate_map(merged_data)
+            record['errors'] = error_count
+        if errors:
+            print(f"\n{error_count} validation error(s):")
+            for error in errors[:10]:
+                print(f"  - {format_error(error)}")
+            print("Not saving because the output does not match the map schemas (--validate).")
+            return
+        print("Output matches the map schemas.")
     
     # Save the merged data
-    if save_file(merged_data, output_file, use_commas):
+    with stage('save_file', output=output_file) as record:
+        saved = save_file(merged_data, output_file, use_commas)
+        record['bytes_written'] = os.path.getsize(output_file) if saved else 0
+    if saved:
         print(f"Successfully saved complete data to {output_file}")
         print(f"Added {len(new_items)} items, total items: {len(merged_data['items'])}")
+        return {
+            'output': output_file,
+            'items': len(items),
+            'patterns': len(patterns),
+            'generated': len(new_items),
+            'total_items': len(merged_data['items'])
+        }
     else:
         print("Failed to save the output file.")
 